@@ -0,0 +1,185 @@
+import os
+import threading
+from datetime import date, timedelta
+
+# Rollup key of a raw row; NULL dates, services and statuses get sentinels so they can be keyed
+ROLLUP_KEY = "coalesce(date, '-infinity'::date), coalesce(service, ''), coalesce(status, '')"
+ROLLUP_FROM_RAW = f'SELECT {ROLLUP_KEY}, count(*) FROM appointments GROUP BY 1, 2, 3'
+# Appointments past their day that were never completed or cancelled
+NO_SHOW_STATUSES = ('scheduled', 'confirmed')
+
+# Idempotent schema for the rollups, part of server.SCHEMA_STATEMENTS: applied once per schema
+# version by the first worker to start, so the trigger swaps below do not run on every restart.
+# Statement-level triggers see every changed row at once through transition tables,
+# so a booking, a batch UPDATE or a million-row import each cost one grouped upsert.
+ROLLUP_SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS appointment_rollup_daily (
+        date DATE NOT NULL,
+        service TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total BIGINT NOT NULL,
+        PRIMARY KEY (date, service, status)
+    )""",
+    f"""CREATE OR REPLACE FUNCTION appointments_rollup() RETURNS trigger AS $$
+    BEGIN
+        -- Keys are upserted in order, so concurrent writers lock rollup rows in the same order
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO appointment_rollup_daily AS r (date, service, status, total)
+            SELECT {ROLLUP_KEY}, count(*) FROM new_rows GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+            ON CONFLICT (date, service, status) DO UPDATE SET total = r.total + EXCLUDED.total;
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO appointment_rollup_daily AS r (date, service, status, total)
+            SELECT date, service, status, sum(delta) FROM (
+                SELECT {ROLLUP_KEY}, -1 AS delta FROM old_rows
+                UNION ALL
+                SELECT {ROLLUP_KEY}, 1 FROM new_rows
+            ) AS changes (date, service, status, delta)
+            GROUP BY 1, 2, 3 HAVING sum(delta) <> 0 ORDER BY 1, 2, 3
+            ON CONFLICT (date, service, status) DO UPDATE SET total = r.total + EXCLUDED.total;
+        ELSE
+            INSERT INTO appointment_rollup_daily AS r (date, service, status, total)
+            SELECT {ROLLUP_KEY}, -count(*) FROM old_rows GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+            ON CONFLICT (date, service, status) DO UPDATE SET total = r.total + EXCLUDED.total;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    # A trigger with transition tables may only handle one event, hence three
+    'DROP TRIGGER IF EXISTS appointments_rollup_insert ON appointments',
+    'CREATE TRIGGER appointments_rollup_insert AFTER INSERT ON appointments '
+    'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION appointments_rollup()',
+    'DROP TRIGGER IF EXISTS appointments_rollup_update ON appointments',
+    'CREATE TRIGGER appointments_rollup_update AFTER UPDATE ON appointments '
+    'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION appointments_rollup()',
+    'DROP TRIGGER IF EXISTS appointments_rollup_delete ON appointments',
+    'CREATE TRIGGER appointments_rollup_delete AFTER DELETE ON appointments '
+    'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION appointments_rollup()',
+    # First start: fill the rollups from history. The triggers above hold off writers
+    # until the schema transaction commits, so no change is missed or counted twice
+    f"""DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM appointment_rollup_daily) THEN
+            INSERT INTO appointment_rollup_daily (date, service, status, total) {ROLLUP_FROM_RAW};
+        END IF;
+    END
+    $$""",
+]
+
+class AppointmentAnalytics:
+    """Dashboard numbers read from appointment_rollup_daily instead of the appointments table.
+
+    The rollup holds one count per (day, service, status), kept current by
+    the triggers in ROLLUP_SCHEMA_STATEMENTS inside each writing transaction,
+    so reads cost the number of days asked for, not the number of
+    appointments. There is deliberately no all-time counter row: every
+    booking would queue on that one row lock until commit. check() recomputes
+    the counts from raw rows and rebuild() rewrites the rollup from them.
+    """
+
+    def __init__(self, default_days=30, max_days=366, max_mismatches=100):
+        self.default_days = default_days
+        self.max_days = max_days
+        self.max_mismatches = max_mismatches
+        self._lock = threading.Lock()
+        self.reports = self.checks = self.mismatches_found = self.rebuilds = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(default_days=int(os.getenv('ANALYTICS_DEFAULT_DAYS', 30)))
+
+    def window(self, date_from, date_to, today):
+        """(first, last) day of a report; defaults to the default_days ending today; raises ValueError"""
+        try:
+            last = date.fromisoformat(date_to) if date_to else today
+            first = date.fromisoformat(date_from) if date_from else last - timedelta(days=self.default_days - 1)
+        except ValueError:
+            raise ValueError('date_from and date_to must be YYYY-MM-DD dates')
+        if first > last:
+            raise ValueError('date_from must not be after date_to')
+        if (last - first).days >= self.max_days:
+            raise ValueError(f'A report covers at most {self.max_days} days')
+        return first, last
+
+    def summary(self, cur, first, last, today):
+        """Totals for the dashboard cards: appointments by status for first..last, and today's count"""
+        cur.execute(
+            'SELECT status, sum(total) AS total FROM appointment_rollup_daily '
+            'WHERE date BETWEEN %s AND %s GROUP BY status HAVING sum(total) <> 0',
+            (first, last)
+        )
+        by_status = {row['status'] or None: int(row['total']) for row in cur.fetchall()}
+        cur.execute('SELECT coalesce(sum(total), 0) AS total FROM appointment_rollup_daily WHERE date = %s', (today,))
+        return {'date_from': first, 'date_to': last, 'total': sum(by_status.values()),
+                'today': int(cur.fetchone()['total']), 'by_status': by_status}
+
+    def report(self, cur, first, last, today):
+        """Bookings per day and per service, status mix and no-show rate for first..last"""
+        cur.execute(
+            'SELECT date, service, status, total FROM appointment_rollup_daily '
+            'WHERE date BETWEEN %s AND %s AND total <> 0 ORDER BY date',
+            (first, last)
+        )
+        per_day, per_service, status_mix = {}, {}, {}
+        no_shows = attended = 0
+        for row in cur.fetchall():
+            service, status, total = row['service'] or None, row['status'] or None, int(row['total'])
+            day = per_day.setdefault(row['date'], {'date': row['date'], 'total': 0, 'by_status': {}})
+            day['total'] += total
+            day['by_status'][status] = day['by_status'].get(status, 0) + total
+            per_service[service] = per_service.get(service, 0) + total
+            status_mix[status] = status_mix.get(status, 0) + total
+            if row['date'] < today:
+                if status in NO_SHOW_STATUSES:
+                    no_shows += total
+                elif status == 'completed':
+                    attended += total
+        with self._lock:
+            self.reports += 1
+        return {
+            'date_from': first,
+            'date_to': last,
+            'total': sum(status_mix.values()),
+            'per_day': list(per_day.values()),
+            'per_service': per_service,
+            'status_mix': status_mix,
+            # Past appointments still scheduled/confirmed, out of those not cancelled
+            'no_show_rate': round(no_shows / (no_shows + attended), 4) if no_shows + attended else None,
+            'no_shows': no_shows
+        }
+
+    def check(self, cur):
+        """Compare the rollup with counts recomputed from raw rows; one consistent snapshot"""
+        cur.execute(
+            f"""SELECT coalesce(raw.date, r.date) AS date, coalesce(raw.service, r.service) AS service,
+                coalesce(raw.status, r.status) AS status, coalesce(raw.total, 0) AS actual, coalesce(r.total, 0) AS rolled_up
+            FROM ({ROLLUP_FROM_RAW}) AS raw (date, service, status, total)
+            FULL JOIN appointment_rollup_daily AS r
+                ON r.date = raw.date AND r.service = raw.service AND r.status = raw.status
+            WHERE coalesce(raw.total, 0) <> coalesce(r.total, 0)
+            ORDER BY 1, 2, 3"""
+        )
+        mismatches = cur.fetchall()
+        with self._lock:
+            self.checks += 1
+            self.mismatches_found += len(mismatches)
+        return {'consistent': not mismatches, 'mismatches': len(mismatches),
+                'examples': mismatches[:self.max_mismatches]}
+
+    def rebuild(self, cur):
+        """Rewrite the rollup from raw rows; writers wait until the caller's transaction ends"""
+        cur.execute('LOCK TABLE appointments IN SHARE MODE')
+        cur.execute('DELETE FROM appointment_rollup_daily')
+        cur.execute(f'INSERT INTO appointment_rollup_daily (date, service, status, total) {ROLLUP_FROM_RAW}')
+        with self._lock:
+            self.rebuilds += 1
+        return {'rows': cur.rowcount}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'default_days': self.default_days,
+                'reports': self.reports,
+                'checks': self.checks,
+                'mismatches_found': self.mismatches_found,
+                'rebuilds': self.rebuilds
+            }
@@ -0,0 +1,415 @@
+import os
+import re
+import threading
+import time as time_module
+from datetime import datetime, timedelta, date
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+MONTH_PATTERN = r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+SPECIES = ['dog', 'cat', 'puppy', 'pup', 'kitten', 'pet', 'rabbit', 'bunny', 'bird', 'parrot', 'hamster',
+           'guinea pig', 'labrador', 'lab', 'retriever', 'beagle', 'pug', 'poodle', 'shepherd', 'terrier', 'persian']
+
+SERVICES = {
+    'Vaccinations': r'vaccin|shots?\b|booster',
+    'Dental care': r'dental|teeth|tooth',
+    'Grooming': r'groom',
+    'Surgery': r'surgery|spay|neuter|operation',
+    'Pet boarding': r'boarding',
+    'General checkup': r'check\s*-?\s*up|exam(?:ination)?s?\b',
+}
+# One pass for every service; the first one mentioned wins
+SERVICE_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(f"(?P<s{i}>{pattern})" for i, pattern in enumerate(SERVICES.values())) + ')', re.I
+)
+SERVICE_NAMES = {f"s{i}": service for i, service in enumerate(SERVICES)}
+
+# Titles before an owner's name are skipped ("my name is Dr. Rao" -> "Rao")
+HONORIFIC = r"(?:(?i:dr|mr|mrs|ms|miss|mx|prof|sir|madam)\.?\s+)?"
+
+# Words that end a captured name ("my name is John and ...", "my dog Max tomorrow")
+STOPWORDS = frozenset('''
+a an and are at be been but by can could for from has have he her his i in is it its me my need needs
+not of on or our please she so that the their them then they this to too very was we who will with would
+you your today tomorrow tonight next this morning afternoon evening am pm at named called here wants needs
+is has had keeps seems got was appointment appointments book booking checkup vaccination vaccinations
+yes no ok okay sure thanks thank hi hello hey sorry what why how when where which
+'''.split()) | frozenset(WEEKDAYS)
+
+# Words that make a clause about the booking itself; a date or time elsewhere in a
+# message that has one ("my dog ate chocolate at 2pm, can I book a visit") may be
+# about something else, so the message goes to the LLM
+BOOKING_CUE = re.compile(
+    r"\b(?:book\w*|appointments?|schedul\w*|reserv\w*|come (?:in|by)|bring|visit|see (?:the|a) (?:vet|doctor)|"
+    r"slots?|check\s*-?\s*up|exam\w*|vaccin\w*|groom\w*|dental|surgery|boarding)\b", re.I
+)
+CLAUSE_BREAK = re.compile(r"[.,;:!?]+(?:\s+|$)|\s+(?:and|but|so|because|then)\s+", re.I)
+# Words a clause holding only a date or time may still contain ("tomorrow 15:00 please")
+SLOT_WORDS = frozenset('''
+a am at around by clock coming evening fine for if in is it morning next o of ok okay on or please pm possible
+that the this works would be great
+'''.split())
+
+# Messages about an existing appointment, or hedging about the time, are left to the LLM
+NOT_A_NEW_BOOKING = re.compile(r"\b(?:cancel|reschedul|postpone|move|change|instead|not|don'?t|can'?t|won'?t|either|or)\b", re.I)
+
+PROBLEM_TEXT = {
+    'unclear_request': "I wasn't sure whether this is a new booking",
+    'ambiguous_date': "I wasn't sure which date you meant",
+    'ambiguous_time': "I wasn't sure which time you meant",
+    'past': "that date and time has already passed",
+    'closed_day': "we're closed that day",
+    'outside_hours': "that time is outside our opening hours",
+    'unclear_slot': "I wasn't sure which date or time is for the appointment",
+    'invalid_date': "I couldn't read the date",
+    'invalid_time': "I couldn't read the time",
+}
+
+class ParsedAppointment:
+    """Booking fields found in one message, plus what is missing or doubtful"""
+
+    __slots__ = ('appointment', 'missing', 'problems')
+
+    REQUIRED = ('name', 'pet_name', 'date', 'time')
+
+    def __init__(self, appointment, problems):
+        self.appointment = appointment
+        self.missing = [field for field in self.REQUIRED if not appointment.get(field)]
+        self.problems = problems
+
+    @property
+    def complete(self):
+        """Safe to book without asking the LLM: every required field, nothing doubtful"""
+        return not self.missing and not self.problems
+
+    def __repr__(self):
+        return f"ParsedAppointment({self.appointment!r}, missing={self.missing!r}, problems={self.problems!r})"
+
+def title_case(text):
+    """'john smith' -> 'John Smith'; names typed with capitals are kept as written"""
+    return text.title() if text.islower() else text
+
+def leading_name(words, max_words):
+    """The first words of a capture, up to the first stopword"""
+    name = []
+    for word in words.split()[:max_words]:
+        if word.lower() in STOPWORDS:
+            break
+        name.append(word)
+    return ' '.join(name)
+
+class AppointmentParser:
+    """Rule-based extraction of booking fields from a single chat message.
+
+    Handles the common well-formed cases ("tomorrow at 2pm", "next Monday at 10",
+    "21st October 10:30", phone numbers, "my dog Max", "my name is ...") with
+    precompiled regexes in microseconds. A result is only `complete` when the
+    owner, pet, date and time were all found unambiguously and the slot is in
+    the future within opening hours; everything else is escalated to the LLM.
+    Dates are resolved against `now`: a bare weekday is its next occurrence
+    (today included), "next <weekday>" skips today; numeric dates are read
+    day-first and flagged as ambiguous when both readings are valid. When a
+    message asks for a booking, a date or time in a clause about something
+    else ("my dog ate chocolate at 2pm, can I book a visit") is not counted
+    and the message is escalated.
+    """
+
+    ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+    PHONE = re.compile(r'(?<![\w/:.-])\+?\d(?:[\s().-]{0,2}\d){9,14}(?![\w/:])')
+    TIME_AMPM = re.compile(r'\b(\d{1,2})(?:(?:[:.]|\s+)(\d{2}))?\s*([ap])\.?m\b\.?', re.I)
+    TIME_24H = re.compile(r'\b([01]?\d|2[0-3]):([0-5]\d)\b')
+    TIME_BARE = re.compile(r"\b(?:at|@|around|by)\s+(\d{1,2})(?:(?:[:.]|\s+)(\d{2}))?(?:\s*o'?clock)?\b(?!\s*(?:/|years?|yrs?|months?|weeks?|days?|kg|lbs?))", re.I)
+    TIME_NOON = re.compile(r'\b(?:noon|midday)\b', re.I)
+    RELATIVE_DAY = re.compile(r'\b(day after tomorrow|tomorrow|today|tonight)\b', re.I)
+    WEEKDAY = re.compile(r'\b(?:(this|next|coming)\s+)?(' + '|'.join(WEEKDAYS) + r')\b', re.I)
+    DAY_MONTH = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?' + MONTH_PATTERN + r'\b(?:,?\s+(\d{4}))?', re.I)
+    MONTH_DAY = re.compile(r'\b' + MONTH_PATTERN + r'\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4}))?', re.I)
+    NUMERIC_DATE = re.compile(r'\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b')
+    ORDINAL_DAY = re.compile(r'\b(?:the\s+)?(\d{1,2})(?:st|nd|rd|th)\b', re.I)
+    OWNER_NAME = re.compile(
+        r"\b(?:my name is|my name's|name is|name:)\s*" + HONORIFIC + r"([a-z][a-z'-]*(?:\s+[a-z][a-z'-]*){0,2})", re.I
+    )
+    OWNER_INTRO = re.compile(r"\b(?i:i am|i'm|this is|it's)\s+" + HONORIFIC + r"([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)\b")
+    PET_NAMED = re.compile(
+        r"\b(?:pet(?:'s)? name is|pet:|(?:he|she|it) is called|(?:he|she|it)'s called|named|called)\s+(?:(?:" +
+        '|'.join(sorted(SPECIES, key=len, reverse=True)) + r")\s+)?([a-z][a-z'-]*)", re.I
+    )
+    PET_SPECIES = re.compile(
+        r"\b(?:my|our)\s+(?:[\w-]+\s+){0,3}?(?:" + '|'.join(sorted(SPECIES, key=len, reverse=True)) +
+        r")(?:'s name is|,)?\s+([a-z][a-z'-]*)", re.I
+    )
+    PET_FOR = re.compile(r"\bfor\s+([A-Z][a-z'-]+)\b")
+    BARE_NAME = re.compile(r"\W*" + HONORIFIC + r"([a-z][a-z'-]*(?:\s+[a-z][a-z'-]*){0,2})\W*", re.I)
+
+    def __init__(self, open_hour=9, close_hour=18, open_weekdays=range(6)):
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+        self.open_weekdays = frozenset(open_weekdays)
+        self._lock = threading.Lock()
+        self.parsed = self.complete = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            open_hour=int(os.getenv('CLINIC_OPEN_HOUR', 9)),
+            close_hour=int(os.getenv('CLINIC_CLOSE_HOUR', 18)),
+            open_weekdays=[int(day) for day in os.getenv('CLINIC_OPEN_WEEKDAYS', '0,1,2,3,4,5').split(',')]
+        )
+
+    def parse(self, message, now=None, expecting=None):
+        """Fields found in message. expecting names the one field the last reply
+        asked for ('name' or 'pet_name'), so a bare answer like "Max" can fill it.
+        """
+        started = time_module.perf_counter()
+        now = now or datetime.now()
+        problems = []
+        # Dates and phone numbers are blanked out once found so their digits
+        # are not read again as times or dates
+        text = message
+        iso_dates = [self._date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                     for match in self.ISO_DATE.finditer(text)]
+        text = self.ISO_DATE.sub(' ', text)
+        phone = None
+        unphoned = message
+        for match in self.PHONE.finditer(text):
+            digits = re.sub(r'[^\d+]', '', match.group(0))
+            if 10 <= len(digits.lstrip('+')) <= 15:
+                phone = digits
+                text = text.replace(match.group(0), ' ')
+                unphoned = message.replace(match.group(0), ' ')
+                break
+
+        dates, times = self._when(text, now.date(), iso_dates, problems)
+        if BOOKING_CUE.search(message) and (dates or times):
+            # A date or time told as part of something else doesn't count toward the booking
+            clauses = CLAUSE_BREAK.split(unphoned)
+            stray = [clause for clause in clauses
+                     if not BOOKING_CUE.search(clause) and self._about_something_else(clause, now.date())]
+            if stray:
+                problems.append('unclear_slot')
+                dates, times = self._when(' ; '.join(clause for clause in clauses if clause not in stray),
+                                          now.date(), [], problems)
+        if len(dates) > 1:
+            problems.append('ambiguous_date')
+        if len(times) > 1:
+            problems.append('ambiguous_time')
+        day = dates.pop() if len(dates) == 1 else None
+        slot = times.pop() if len(times) == 1 else None
+
+        if NOT_A_NEW_BOOKING.search(message):
+            problems.append('unclear_request')
+        problems.extend(self._check_slot(day, slot, now))
+
+        service = SERVICE_PATTERN.search(message)
+        name = self._owner_name(message)
+        pet_name = self._pet_name(message, name)
+        if expecting in ('name', 'pet_name') and not (name if expecting == 'name' else pet_name):
+            answer = self.BARE_NAME.fullmatch(message)
+            if answer and leading_name(answer.group(1), 3) == answer.group(1):
+                if expecting == 'name':
+                    name = title_case(answer.group(1))
+                else:
+                    pet_name = title_case(answer.group(1).split()[0])
+        appointment = {
+            'name': name,
+            'pet_name': pet_name,
+            'phone': phone,
+            'date': day.isoformat() if day else None,
+            'time': f"{slot[0]:02d}:{slot[1]:02d}" if slot else None,
+            'service': SERVICE_NAMES[service.lastgroup] if service else None,
+            'notes': ''
+        }
+        result = ParsedAppointment(appointment, problems)
+        with self._lock:
+            self.parsed += 1
+            self.complete += result.complete
+            self.total_seconds += time_module.perf_counter() - started
+        return result
+
+    def _check_slot(self, day, slot, now):
+        """Why a date/time can't be booked: closed day, outside opening hours or in the past"""
+        problems = []
+        if day is not None and day.weekday() not in self.open_weekdays:
+            problems.append('closed_day')
+        if slot is not None and not (self.open_hour * 60 <= slot[0] * 60 + slot[1] < self.close_hour * 60):
+            problems.append('outside_hours')
+        if day is not None and (day < now.date() or (day == now.date() and slot is not None and
+                                                      (slot[0], slot[1]) <= (now.hour, now.minute))):
+            problems.append('past')
+        return problems
+
+    def check(self, appointment, now=None):
+        """Normalize a booking's date and time, wherever they came from, and check the slot.
+
+        The LLM's values are free text: dates are read as the parser reads a
+        message ("2026-10-20", "tomorrow"), times too ("14:00", "2pm", "10").
+        A value that can't be read, or names a day or time that can't be
+        booked, is dropped and its problem listed, so the reply asks again.
+        """
+        now = now or datetime.now()
+        appointment = dict(appointment)
+        problems = []
+        day = slot = None
+        if appointment.get('date'):
+            dates, _ = self._when(str(appointment['date']), now.date(), [], [])
+            day = dates.pop() if len(dates) == 1 else None
+            if day is None:
+                problems.append('invalid_date')
+        if appointment.get('time'):
+            value = str(appointment['time'])
+            _, times = self._when(value, now.date(), [], [])
+            if not times:
+                _, times = self._when(f"at {value}", now.date(), [], [])
+            slot = times.pop() if len(times) == 1 else None
+            if slot is None:
+                problems.append('invalid_time')
+        slot_problems = self._check_slot(day, slot, now)
+        if 'closed_day' in slot_problems:
+            day = None
+        if 'outside_hours' in slot_problems:
+            slot = None
+        if 'past' in slot_problems:
+            day, slot = (None, slot) if day < now.date() else (day, None)
+        appointment['date'] = day.isoformat() if day else None
+        appointment['time'] = f"{slot[0]:02d}:{slot[1]:02d}" if slot else None
+        return ParsedAppointment(appointment, problems + slot_problems)
+
+    def merge(self, slots, parsed, now=None):
+        """Combine fields collected in earlier turns with a new message's.
+
+        Values from the new message win; the date/time checks are redone on the
+        combined slot (see check), and the new message's own doubts (ambiguity,
+        changes) kept.
+        """
+        appointment = dict(slots)
+        appointment.update({field: value for field, value in parsed.appointment.items() if value})
+        checked = self.check(appointment, now)
+        problems = [problem for problem in parsed.problems
+                    if problem in ('ambiguous_date', 'ambiguous_time', 'unclear_request', 'unclear_slot')]
+        return ParsedAppointment(checked.appointment, problems + checked.problems)
+
+    def _when(self, text, today, iso_dates, problems):
+        """(dates, times) mentioned in text, as sets; ISO dates already blanked out go in iso_dates"""
+        iso_dates = iso_dates + [self._date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                                 for match in self.ISO_DATE.finditer(text)]
+        text = self.ISO_DATE.sub(' ', text)
+        times = self._times(text)
+        text = self.TIME_AMPM.sub(' ', self.TIME_24H.sub(' ', text))
+        return set(day for day in self._dates(text, today, iso_dates, problems) if day is not None), set(times)
+
+    def _about_something_else(self, clause, today):
+        """A clause with a date or time and other words too, like "my dog ate chocolate at 2pm today" """
+        if not any(self._when(clause, today, [], [])):
+            return False
+        for pattern in (self.ISO_DATE, self.TIME_AMPM, self.TIME_24H, self.TIME_BARE, self.TIME_NOON, self.RELATIVE_DAY,
+                        self.WEEKDAY, self.DAY_MONTH, self.MONTH_DAY, self.NUMERIC_DATE, self.ORDINAL_DAY):
+            clause = pattern.sub(' ', clause)
+        return bool(set(re.findall(r"[a-z]+", clause.lower())) - SLOT_WORDS)
+
+    def _times(self, text):
+        times = []
+        for match in self.TIME_AMPM.finditer(text):
+            hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            if 1 <= hour <= 12 and minute < 60:
+                times.append((hour % 12 + (12 if match.group(3).lower() == 'p' else 0), minute))
+        rest = self.TIME_AMPM.sub(' ', text)
+        for match in self.TIME_24H.finditer(rest):
+            times.append((int(match.group(1)), int(match.group(2))))
+        rest = self.TIME_24H.sub(' ', rest)
+        for match in self.TIME_BARE.finditer(rest):
+            hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            if 1 <= hour <= 12 and minute < 60:
+                # No am/pm: the reading that falls within opening hours ("at 3" is 3 PM)
+                times.append((hour + 12 if hour + 12 < self.close_hour and hour < self.open_hour else hour, minute))
+        if self.TIME_NOON.search(rest):
+            times.append((12, 0))
+        return times
+
+    def _dates(self, text, today, explicit, problems):
+        for match in self.RELATIVE_DAY.finditer(text):
+            offset = {'today': 0, 'tonight': 0, 'tomorrow': 1, 'day after tomorrow': 2}[match.group(1).lower()]
+            explicit.append(today + timedelta(days=offset))
+        for match in self.DAY_MONTH.finditer(text):
+            explicit.append(self._upcoming(today, MONTHS.index(match.group(2)[:3].lower()) + 1, int(match.group(1)), match.group(3)))
+        for match in self.MONTH_DAY.finditer(text):
+            explicit.append(self._upcoming(today, MONTHS.index(match.group(1)[:3].lower()) + 1, int(match.group(2)), match.group(3)))
+        for match in self.NUMERIC_DATE.finditer(text):
+            first, second, year = int(match.group(1)), int(match.group(2)), match.group(3)
+            if year and len(year) == 2:
+                year = '20' + year
+            if first <= 12 and second <= 12 and first != second:
+                problems.append('ambiguous_date')
+                continue
+            explicit.append(self._upcoming(today, second, first, year) if second <= 12 else self._upcoming(today, first, second, year))
+        if not explicit:
+            for match in self.ORDINAL_DAY.finditer(text):
+                day = int(match.group(1))
+                candidate = self._date(today.year, today.month, day)
+                if candidate is None or candidate < today:
+                    month = today.month % 12 + 1
+                    candidate = self._date(today.year + (month == 1), month, day)
+                explicit.append(candidate)
+
+        named = set()
+        by_weekday = []
+        for match in self.WEEKDAY.finditer(text):
+            weekday = WEEKDAYS.index(match.group(2).lower())
+            named.add(weekday)
+            ahead = (weekday - today.weekday()) % 7
+            if ahead == 0 and match.group(1) and match.group(1).lower() == 'next':
+                ahead = 7
+            by_weekday.append(today + timedelta(days=ahead))
+        # "Friday the 16th", "tomorrow (Thursday)": the weekday only confirms the date
+        if explicit and all(day is not None and day.weekday() in named for day in explicit):
+            return explicit
+        return explicit + by_weekday
+
+    @staticmethod
+    def _date(year, month, day):
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+    def _upcoming(self, today, month, day, year=None):
+        """The given day and month; without a year, the next time it comes round"""
+        if year:
+            return self._date(int(year), month, day)
+        candidate = self._date(today.year, month, day)
+        if candidate is not None and candidate < today:
+            candidate = self._date(today.year + 1, month, day)
+        return candidate
+
+    def _owner_name(self, message):
+        match = self.OWNER_NAME.search(message)
+        if match:
+            name = leading_name(match.group(1), 3)
+            if name:
+                return title_case(name)
+        match = self.OWNER_INTRO.search(message)
+        if match:
+            name = leading_name(match.group(1), 2)
+            if name and name.lower() not in SPECIES:
+                return name
+        return None
+
+    def _pet_name(self, message, owner_name):
+        for pattern in (self.PET_NAMED, self.PET_SPECIES):
+            for match in pattern.finditer(message):
+                name = leading_name(match.group(1), 1)
+                if name and name.lower() not in SPECIES:
+                    return title_case(name)
+        match = self.PET_FOR.search(message)
+        if match and match.group(1).lower() not in STOPWORDS and (not owner_name or match.group(1) not in owner_name.split()):
+            return match.group(1)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'parsed': self.parsed,
+                'complete': self.complete,
+                'escalated': self.parsed - self.complete,
+                'avg_us': round(self.total_seconds / self.parsed * 1e6, 1) if self.parsed else None
+            }
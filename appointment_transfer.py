@@ -0,0 +1,286 @@
+import csv
+import os
+import queue
+import threading
+
+import psycopg2
+
+# Columns an import may set; other appointment columns in the header (id, created_at, ...) are ignored
+IMPORT_COLUMNS = ('name', 'pet_name', 'phone', 'date', 'time', 'service', 'notes', 'status')
+REQUIRED_IMPORT_COLUMNS = ('name', 'pet_name', 'date', 'time')
+DATE_PATTERN = r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$'
+TIME_PATTERN = r'^([01]?\d|2[0-3]):[0-5]\d(:[0-5]\d)?$'
+
+class ImportRejected(ValueError):
+    """The upload as a whole can't be imported (missing or unknown header columns)"""
+
+class _ChunkWriter:
+    """File-like target for COPY ... TO STDOUT: gathers rows into chunk_bytes chunks on a bounded queue"""
+
+    def __init__(self, chunks, chunk_bytes, stopped):
+        self.chunks = chunks
+        self.chunk_bytes = chunk_bytes
+        self.stopped = stopped
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        data = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+        self._parts.append(data)
+        self._size += len(data)
+        if self._size >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.put(b''.join(self._parts))
+            self._parts, self._size = [], 0
+
+    def put(self, item):
+        # Blocks while the client is slower than the database; gives up once nobody reads
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+class AppointmentTransfer:
+    """Streams appointments out and bulk-loads migrated records in, in constant memory.
+
+    CSV exports are Postgres COPY output relayed in chunk_bytes chunks through
+    a small queue (a copy thread on the borrowed connection fills it, the
+    response drains it, so a slow client pauses the COPY rather than piling
+    rows up). JSON-lines exports page through a server-side cursor as tuples.
+    Imports COPY the request body into a temporary staging table, check every
+    row there in SQL and insert the valid ones with a single INSERT ... SELECT.
+    Slots are the availability engine's: a row is rejected outside clinic
+    hours or days, and when an active appointment, or an earlier line of the
+    file, already holds its slot window. Every rejected row is reported by
+    line, including those whose slot was booked while the import ran.
+    """
+
+    def __init__(self, statuses, availability, chunk_bytes=64 * 1024, queue_chunks=8, batch_rows=2000, max_errors=100):
+        self.statuses = list(statuses)
+        self.availability = availability
+        self.chunk_bytes = chunk_bytes
+        self.queue_chunks = queue_chunks
+        self.batch_rows = batch_rows
+        self.max_errors = max_errors
+        self._lock = threading.Lock()
+        self.exports = self.exported_rows = self.cancelled_exports = 0
+        self.imports = self.imported_rows = self.rejected_rows = 0
+
+    @classmethod
+    def from_env(cls, statuses, availability):
+        return cls(statuses, availability, max_errors=int(os.getenv('IMPORT_MAX_ERRORS', 100)))
+
+    def export_csv(self, conn, query):
+        """Chunks of CSV (with a header row) for query, a SELECT with its parameters already bound"""
+        chunks = queue.Queue(maxsize=self.queue_chunks)
+        stopped = threading.Event()
+        outcome = {}
+
+        def copy_out():
+            writer = _ChunkWriter(chunks, self.chunk_bytes, stopped)
+            try:
+                with conn.cursor() as cur:
+                    cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)', writer, size=self.chunk_bytes)
+                    outcome['rows'] = cur.rowcount
+                writer.flush()
+            except Exception as e:
+                outcome['error'] = e
+                conn.rollback()
+            finally:
+                writer.put(None)
+
+        copier = threading.Thread(target=copy_out, name='appointments-export', daemon=True)
+        copier.start()
+        finished = False
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    finished = True
+                    break
+                yield chunk
+        finally:
+            if not finished:
+                # The client went away: stop reading and have the server abort the COPY
+                stopped.set()
+                conn.driver_connection.cancel()
+            copier.join()
+            with self._lock:
+                self.exports += 1
+                self.exported_rows += max(outcome.get('rows') or 0, 0)
+                self.cancelled_exports += stopped.is_set()
+        if 'error' in outcome and not stopped.is_set():
+            print(f"Error exporting appointments: {outcome['error']}")
+            raise outcome['error']
+
+    def export_jsonl(self, conn, query, params, dumps_lines):
+        """Chunks of JSON lines for query, batch_rows rows at a time from a server-side cursor"""
+        sent = 0
+        try:
+            with conn.cursor(name='appointments_export', cursor_factory=psycopg2.extensions.cursor) as rows:
+                rows.itersize = self.batch_rows
+                rows.execute(query, params)
+                names = None
+                while True:
+                    batch = rows.fetchmany(self.batch_rows)
+                    if not batch:
+                        break
+                    names = names or [column[0] for column in rows.description]
+                    yield dumps_lines(names, batch)
+                    sent += len(batch)
+        finally:
+            with self._lock:
+                self.exports += 1
+                self.exported_rows += sent
+
+    def import_csv(self, cur, stream, known_columns):
+        """COPY a CSV upload (header row first) into appointments; returns the summary.
+
+        Runs in the caller's transaction; malformed CSV raises psycopg2.DataError
+        from the COPY and nothing is imported.
+        """
+        header = next(csv.reader([stream.readline().decode('utf-8-sig')]), [])
+        columns = [column.strip().lower() for column in header]
+        unknown = [column for column in columns if column not in known_columns]
+        if unknown:
+            raise ImportRejected(f"Unknown columns: {', '.join(unknown)}")
+        missing = [column for column in REQUIRED_IMPORT_COLUMNS if column not in columns]
+        if missing:
+            raise ImportRejected(f"Missing columns: {', '.join(missing)}")
+        if len(set(columns)) != len(columns):
+            raise ImportRejected('A column appears more than once in the header')
+
+        cur.execute(f"""CREATE TEMP TABLE appointments_import_raw (
+            line BIGSERIAL, {', '.join(f'{column} TEXT' for column in columns)}
+        ) ON COMMIT DROP""")
+        cur.copy_expert(f"COPY appointments_import_raw ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                        stream, size=self.chunk_bytes)
+
+        # One pass types and checks every row; casts only run on rows whose text passed the checks
+        field = {column: f"nullif(trim(raw.{column}), '')" if column in columns else 'NULL' for column in IMPORT_COLUMNS}
+        status = f"coalesce(lower({field['status']}), 'scheduled')"
+        minutes = f"(date_part('hour', {field['time']}::time) * 60 + date_part('minute', {field['time']}::time))::int"
+        engine = self.availability
+        cur.execute(
+            f"""CREATE TEMP TABLE appointments_import ON COMMIT DROP AS
+            SELECT line, name, pet_name, phone, service, notes, status, error,
+                CASE WHEN error IS NULL THEN date_text::date END AS slot_date,
+                CASE WHEN error IS NULL THEN time_text::time END AS slot_time,
+                -- The slot window [slot_starts, slot_ends) holding the time, as SlotBooker uses
+                CASE WHEN error IS NULL THEN time '00:00' + make_interval(mins =>
+                    %(open)s + (minutes - %(open)s) / %(slot)s * %(slot)s) END AS slot_starts,
+                CASE WHEN error IS NULL THEN time '00:00' + make_interval(mins =>
+                    %(open)s + (minutes - %(open)s) / %(slot)s * %(slot)s + %(slot)s) END AS slot_ends
+            FROM (
+                SELECT raw.line, {field['name']} AS name, {field['pet_name']} AS pet_name, {field['phone']} AS phone,
+                    {field['service']} AS service, {field['notes']} AS notes, {status} AS status,
+                    {field['date']} AS date_text, {field['time']} AS time_text,
+                    CASE
+                        WHEN {field['name']} IS NULL OR {field['pet_name']} IS NULL THEN 'name and pet_name are required'
+                        WHEN coalesce({field['date']}, '') !~ %(date_pattern)s THEN 'date must be YYYY-MM-DD'
+                        WHEN right({field['date']}, 2)::int > extract(day from
+                            (left({field['date']}, 8) || '01')::date + interval '1 month - 1 day') THEN 'date does not exist'
+                        WHEN coalesce({field['time']}, '') !~ %(time_pattern)s THEN 'time must be HH:MM'
+                        WHEN {status} <> ALL(%(statuses)s) THEN 'unknown status'
+                        WHEN extract(isodow from {field['date']}::date)::int - 1 <> ALL(%(open_weekdays)s)
+                            THEN 'the clinic is closed that day'
+                        WHEN {minutes} < %(open)s OR {minutes} >= %(close)s THEN 'outside clinic hours'
+                    END AS error,
+                    CASE WHEN {field['time']} ~ %(time_pattern)s THEN {minutes} END AS minutes
+                FROM appointments_import_raw AS raw
+            ) AS checked""",
+            {'date_pattern': DATE_PATTERN, 'time_pattern': TIME_PATTERN, 'statuses': self.statuses,
+             'open_weekdays': sorted(engine.open_weekdays), 'open': engine.open_minutes, 'slot': engine.slot_minutes,
+             'close': engine.open_minutes + engine.slots_per_day * engine.slot_minutes}
+        )
+        received = cur.rowcount
+        # Temporary tables are never auto-analyzed; the dedup joins need real row counts
+        cur.execute('ANALYZE appointments_import')
+        cur.execute(
+            """UPDATE appointments_import AS i SET error = 'slot appears earlier in the file'
+            FROM (
+                SELECT line, row_number() OVER (PARTITION BY slot_date, slot_starts ORDER BY line) AS n
+                FROM appointments_import WHERE error IS NULL AND status <> 'cancelled'
+            ) AS d
+            WHERE i.line = d.line AND d.n > 1"""
+        )
+        cur.execute(
+            """UPDATE appointments_import AS i SET error = 'slot already booked'
+            WHERE i.error IS NULL AND i.status <> 'cancelled' AND EXISTS (
+                SELECT 1 FROM appointments AS a
+                WHERE a.date = i.slot_date AND a.time >= i.slot_starts AND a.time < i.slot_ends
+                  AND a.status IS DISTINCT FROM 'cancelled'
+            )"""
+        )
+
+        # Hold off other writers (bookings included) from here to commit, and re-check the
+        # slots at insert time: rows whose slot was booked since the check above are marked
+        # rather than inserted, so the file can never double-book a slot
+        cur.execute('LOCK TABLE appointments IN SHARE ROW EXCLUSIVE MODE')
+        # One change notification for the whole load instead of one per row
+        cur.execute("SET LOCAL vet_clinic.bulk_load = 'on'")
+        cur.execute(
+            """WITH inserted AS (
+                INSERT INTO appointments (name, pet_name, phone, date, time, service, notes, status, created_at)
+                SELECT name, pet_name, phone, slot_date, slot_time, service, notes, status, now()
+                FROM appointments_import AS i
+                WHERE error IS NULL AND (status = 'cancelled' OR NOT EXISTS (
+                    SELECT 1 FROM appointments AS a
+                    WHERE a.date = i.slot_date AND a.time >= i.slot_starts AND a.time < i.slot_ends
+                      AND a.status IS DISTINCT FROM 'cancelled'
+                ))
+                ORDER BY line
+                ON CONFLICT DO NOTHING
+                RETURNING id, change_seq, date, time, status
+            ), lost AS (
+                -- Runs even though nothing reads it, like every data-modifying WITH
+                UPDATE appointments_import AS i SET error = 'slot booked during the import'
+                WHERE i.error IS NULL AND i.status <> 'cancelled' AND NOT EXISTS (
+                    SELECT 1 FROM inserted AS x
+                    WHERE x.date = i.slot_date AND x.time = i.slot_time AND x.status <> 'cancelled'
+                )
+                RETURNING line
+            )
+            SELECT count(*) AS imported, max(id) AS last_id, max(change_seq) AS last_change_seq FROM inserted"""
+        )
+        inserted = cur.fetchone()
+        cur.execute("SET LOCAL vet_clinic.bulk_load = 'off'")
+        if inserted['imported']:
+            cur.execute("SELECT pg_notify('appointment_changes', json_build_object('id', %s, 'change_seq', %s)::text)",
+                        (inserted['last_id'], inserted['last_change_seq']))
+
+        cur.execute('SELECT error, count(*) AS total FROM appointments_import WHERE error IS NOT NULL GROUP BY error')
+        by_reason = {row['error']: row['total'] for row in cur.fetchall()}
+        # Lines count the header as line 1, as an editor shows them
+        cur.execute('SELECT line + 1 AS line, error FROM appointments_import WHERE error IS NOT NULL ORDER BY line LIMIT %s',
+                    (self.max_errors,))
+        errors = cur.fetchall()
+
+        rejected = received - inserted['imported']
+        with self._lock:
+            self.imports += 1
+            self.imported_rows += inserted['imported']
+            self.rejected_rows += rejected
+        return {
+            'received': received,
+            'imported': inserted['imported'],
+            'rejected': rejected,
+            'rejected_by_reason': by_reason,
+            'errors': errors
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'exports': self.exports,
+                'exported_rows': self.exported_rows,
+                'cancelled_exports': self.cancelled_exports,
+                'imports': self.imports,
+                'imported_rows': self.imported_rows,
+                'rejected_rows': self.rejected_rows
+            }
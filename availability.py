@@ -0,0 +1,177 @@
+import os
+import threading
+import time as time_module
+from datetime import datetime, timedelta, time, date
+
+class AvailabilityEngine:
+    """Free appointment slots over a rolling horizon.
+
+    Only the requested date window is read from the database (served by the
+    (date, time) index), and each day's booked slots are kept as a bitmap so
+    repeated availability questions skip the database entirely. Bookings and
+    status changes invalidate the affected day; a short TTL bounds staleness
+    from writes made by other worker processes.
+    """
+
+    def __init__(self, connection_factory, open_hour=9, close_hour=18, slot_minutes=60,
+                 horizon_days=7, open_weekdays=range(6), cache_ttl=30):
+        self.connection_factory = connection_factory
+        self.open_minutes = open_hour * 60
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = (close_hour - open_hour) * 60 // slot_minutes
+        self.horizon_days = horizon_days
+        self.open_weekdays = frozenset(open_weekdays)
+        self.cache_ttl = cache_ttl
+        self._bitmaps = {}  # date -> (bitmap of booked slot indexes, loaded_at)
+        self._lock = threading.Lock()
+        self.queries = self.cache_hits = self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, connection_factory):
+        return cls(
+            connection_factory,
+            open_hour=int(os.getenv('CLINIC_OPEN_HOUR', 9)),
+            close_hour=int(os.getenv('CLINIC_CLOSE_HOUR', 18)),
+            slot_minutes=int(os.getenv('SLOT_MINUTES', 60)),
+            horizon_days=int(os.getenv('BOOKING_HORIZON_DAYS', 7)),
+            open_weekdays=[int(day) for day in os.getenv('CLINIC_OPEN_WEEKDAYS', '0,1,2,3,4,5').split(',')],
+            cache_ttl=int(os.getenv('AVAILABILITY_CACHE_TTL', 30))
+        )
+
+    def slot_index(self, value):
+        """Index of the slot containing a booked time (time object or 'HH:MM[:SS]')"""
+        if isinstance(value, time):
+            minutes = value.hour * 60 + value.minute
+        else:
+            hours, minutes = str(value).split(':')[:2]
+            minutes = int(hours) * 60 + int(minutes)
+        index = (minutes - self.open_minutes) // self.slot_minutes
+        return index if 0 <= index < self.slots_per_day else None
+
+    def slot_label(self, index):
+        minutes = self.open_minutes + index * self.slot_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def booked_bitmaps(self, days):
+        """Booked-slot bitmap per day, querying only the days not cached"""
+        now = time_module.monotonic()
+        with self._lock:
+            bitmaps = {}
+            missing = []
+            for day in days:
+                cached = self._bitmaps.get(day)
+                if cached and now - cached[1] < self.cache_ttl:
+                    bitmaps[day] = cached[0]
+                else:
+                    missing.append(day)
+            self.cache_hits += len(bitmaps)
+        if not missing:
+            return bitmaps
+
+        with self.connection_factory() as conn:
+            with conn.cursor() as cur:
+                loaded = self._load_bitmaps(cur, missing)
+        with self._lock:
+            self.queries += 1
+            for day, bitmap in loaded.items():
+                self._bitmaps[day] = (bitmap, now)
+        bitmaps.update(loaded)
+        return bitmaps
+
+    def _load_bitmaps(self, cur, days):
+        loaded = dict.fromkeys(days, 0)
+        cur.execute(
+            "SELECT date, time FROM appointments "
+            "WHERE date BETWEEN %s AND %s AND status IS DISTINCT FROM 'cancelled'",
+            (min(days), max(days))
+        )
+        for row in cur.fetchall():
+            booked_date, booked_time = (row['date'], row['time']) if isinstance(row, dict) else row
+            if isinstance(booked_date, str):
+                booked_date = date.fromisoformat(booked_date)
+            if booked_date in loaded and booked_time is not None:
+                index = self.slot_index(booked_time)
+                if index is not None:
+                    loaded[booked_date] |= 1 << index
+        return loaded
+
+    def slot_window(self, value):
+        """(start, end) minutes of the slot containing a time; one minute for times off the grid"""
+        hours, minutes = str(value).split(':')[:2]
+        minutes = int(hours) * 60 + int(minutes)
+        index = self.slot_index(value)
+        if index is None:
+            return minutes, minutes + 1
+        start = self.open_minutes + index * self.slot_minutes
+        return start, start + self.slot_minutes
+
+    def free_slots_after(self, cur, day, after, limit):
+        """Free slots later than a taken one, read uncached through the caller's cursor.
+
+        Used inside a booking transaction, so the result includes rows
+        committed since the bitmaps were cached.
+        """
+        after_minutes = self.slot_window(after)[0]
+        window = [day + timedelta(days=i) for i in range(self.horizon_days)]
+        open_days = [each for each in window if each.weekday() in self.open_weekdays]
+        if not open_days:
+            return []
+        bitmaps = self._load_bitmaps(cur, open_days)
+        slots = []
+        for each in open_days:
+            for index in range(self.slots_per_day):
+                if each == day and self.open_minutes + index * self.slot_minutes <= after_minutes:
+                    continue
+                if not bitmaps[each] >> index & 1:
+                    slots.append((each, self.slot_label(index)))
+                    if len(slots) >= limit:
+                        return slots
+        return slots
+
+    def available_slots(self, start=None, days=None, limit=10):
+        """Free slots from start (default tomorrow) over the horizon, earliest first"""
+        start = start or datetime.now().date() + timedelta(days=1)
+        window = [start + timedelta(days=i) for i in range(days or self.horizon_days)]
+        open_days = [day for day in window if day.weekday() in self.open_weekdays]
+        if not open_days:
+            return []
+        bitmaps = self.booked_bitmaps(open_days)
+        slots = []
+        for day in open_days:
+            bitmap = bitmaps[day]
+            for index in range(self.slots_per_day):
+                if not bitmap >> index & 1:
+                    slots.append({
+                        'date': day.strftime('%Y-%m-%d'),
+                        'time': self.slot_label(index),
+                        'day': day.strftime('%A')
+                    })
+                    if limit and len(slots) >= limit:
+                        return slots
+        return slots
+
+    def invalidate(self, day=None):
+        """Forget cached bookings for one day (or all days when day is None)"""
+        if isinstance(day, str):
+            try:
+                day = date.fromisoformat(day)
+            except ValueError:
+                day = None
+        with self._lock:
+            self.invalidations += 1
+            if day is None:
+                self._bitmaps.clear()
+            else:
+                self._bitmaps.pop(day, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached_days': len(self._bitmaps),
+                'queries': self.queries,
+                'cached_day_hits': self.cache_hits,
+                'invalidations': self.invalidations,
+                'slot_minutes': self.slot_minutes,
+                'slots_per_day': self.slots_per_day,
+                'horizon_days': self.horizon_days
+            }
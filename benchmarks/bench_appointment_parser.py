@@ -0,0 +1,94 @@
+"""Precision/recall and latency of the local appointment parser on a labeled corpus.
+
+Runs AppointmentParser over benchmarks/data/appointment_corpus.json (resolved
+against the corpus's fixed "now", offline). Per field, a found value is a
+true positive when it equals the label and a false positive otherwise;
+recall is over the labeled (non-null) values. For the booking decision,
+precision is the share of messages booked locally whose fields were all
+right, and recall the share of well-formed messages booked without the LLM.
+Exits non-zero if any local booking has a wrong field.
+
+    python benchmarks/bench_appointment_parser.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from appointment_parser import AppointmentParser  # noqa: E402
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'data', 'appointment_corpus.json')
+FIELDS = ('name', 'pet_name', 'phone', 'date', 'time')
+
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true', help='print every field mismatch')
+    args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+    now = datetime.fromisoformat(corpus['now'])
+    cases = corpus['cases']
+    appointment_parser = AppointmentParser()
+
+    counts = {field: {'tp': 0, 'fp': 0, 'labeled': 0} for field in FIELDS}
+    booked = booked_right = well_formed = well_formed_booked = 0
+    wrong_bookings = []
+    for case in cases:
+        result = appointment_parser.parse(case['message'], now)
+        mismatches = []
+        for field in FIELDS:
+            expected, found = case['expect'][field], result.appointment[field]
+            counts[field]['labeled'] += expected is not None
+            if found is not None:
+                counts[field]['tp' if found == expected else 'fp'] += 1
+            if found != expected:
+                mismatches.append(f"{field}: expected {expected!r}, got {found!r}")
+        well_formed += case['local']
+        if result.complete:
+            booked += 1
+            booked_right += not mismatches
+            well_formed_booked += case['local']
+            if mismatches:
+                wrong_bookings.append((case['message'], mismatches))
+        if args.verbose and (mismatches or result.complete != case['local']):
+            print(f"{case['message']!r}\n    local={result.complete} (labeled {case['local']}) "
+                  f"problems={result.problems} {'; '.join(mismatches)}")
+
+    print(f"{'field':<10}{'precision':>11}{'recall':>9}{'labeled':>9}")
+    for field, count in counts.items():
+        print(f"{field:<10}{ratio(count['tp'], count['tp'] + count['fp']):>11.3f}"
+              f"{ratio(count['tp'], count['labeled']):>9.3f}{count['labeled']:>9}")
+    print(f"\nbooked locally: {booked}/{len(cases)} messages, precision {ratio(booked_right, booked):.3f}, "
+          f"recall {ratio(well_formed_booked, well_formed):.3f} of {well_formed} well-formed")
+    print(f"LLM calls avoided: {booked} of {len(cases)} booking-route messages")
+
+    messages = [case['message'] for case in cases]
+    rounds = args.iterations // len(messages) or 1
+    seconds = timeit.timeit(lambda: [appointment_parser.parse(m, now) for m in messages], number=rounds)
+    per_message_us = seconds / (rounds * len(messages)) * 1e6
+    ordered = sorted(
+        timeit.timeit(lambda m=m: appointment_parser.parse(m, now), number=200) / 200 * 1e6 for m in messages
+    )
+    print(f"latency: {per_message_us:.1f} us/message mean, p50 {ordered[len(ordered) // 2]:.1f} us, "
+          f"max {ordered[-1]:.1f} us")
+
+    for message, mismatches in wrong_bookings:
+        print(f"WRONG LOCAL BOOKING {message!r}: {'; '.join(mismatches)}")
+    if wrong_bookings:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Bytes per page view and time to first byte, before and after the asset pipeline.
+
+Builds the assets (python static_assets.py), then launches `python server.py`
+twice: once with STATIC_ASSETS=off PAGE_CACHE=off (inline assets, a render
+per hit, no compression - the old serving path) and once as deployed. For
+each page it loads the HTML and every same-origin stylesheet/script the way
+a browser with Accept-Encoding: gzip, br would:
+
+  first view   every resource fetched
+  repeat view  immutable assets come from the browser cache; the rest are
+               revalidated with If-None-Match / If-Modified-Since
+
+and reports bytes on the wire (bodies only) and the median time to first
+byte of the HTML over --runs requests. Pages don't touch the database, so
+an unreachable DATABASE_URL is fine:
+
+    DATABASE_URL=postgresql://x:x@127.0.0.1:1/x python benchmarks/bench_assets.py
+"""
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ('/', '/login.html', '/profile.html')
+SUBRESOURCE = re.compile(r'<(?:link[^>]*rel="stylesheet"[^>]*href|script[^>]*src)="(/[^"]+)"')
+ACCEPT_ENCODING = 'gzip, deflate, br'
+
+
+def fetch(port, path, headers=None):
+    """(status, response headers, body bytes on the wire, seconds to the response headers)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        started = time.perf_counter()
+        connection.request('GET', path, headers={'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})})
+        response = connection.getresponse()
+        ttfb = time.perf_counter() - started
+        body = response.read()
+        return response.status, {key.lower(): value for key, value in response.getheaders()}, body, ttfb
+    finally:
+        connection.close()
+
+
+def decoded(headers, body):
+    encoding = headers.get('content-encoding')
+    if encoding == 'gzip':
+        import gzip
+        return gzip.decompress(body)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(body)
+    return body
+
+
+def page_view(port, page):
+    """Bytes of a first and a repeat view of page, with its same-origin subresources"""
+    status, headers, body, _ = fetch(port, page)
+    assert status == 200, (page, status)
+    resources = {page: headers}
+    first = len(body)
+    for path in SUBRESOURCE.findall(decoded(headers, body).decode('utf-8')):
+        status, resources[path], body, _ = fetch(port, path)
+        first += len(body)
+
+    repeat = 0
+    requests = 0
+    for path, headers in resources.items():
+        if 'immutable' in headers.get('cache-control', ''):
+            continue
+        validators = {}
+        if 'etag' in headers:
+            validators['If-None-Match'] = headers['etag']
+        if 'last-modified' in headers:
+            validators['If-Modified-Since'] = headers['last-modified']
+        _, _, body, _ = fetch(port, path, validators)
+        repeat += len(body)
+        requests += 1
+    return first, len(resources), repeat, requests
+
+
+def measure(port, runs):
+    rows = []
+    for page in PAGES:
+        first, first_requests, repeat, repeat_requests = page_view(port, page)
+        ttfbs = sorted(fetch(port, page)[3] * 1000 for _ in range(runs))
+        rows.append((page, first, first_requests, repeat, repeat_requests, ttfbs[len(ttfbs) // 2]))
+    return rows
+
+
+def launch(port, env):
+    env = dict(os.environ, PORT=str(port), FLASK_ENV='production', PYTHONDONTWRITEBYTECODE='1', **env)
+    process = subprocess.Popen([sys.executable, 'server.py'], cwd=ROOT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if fetch(port, '/live')[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise SystemExit('server did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=50, help='HTML requests per page for the TTFB median')
+    parser.add_argument('--port', type=int, default=3101)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, 'static_assets.py'], cwd=ROOT_DIR, check=True, stdout=subprocess.DEVNULL)
+    results = {}
+    for label, env in (('before', {'STATIC_ASSETS': 'off', 'PAGE_CACHE': 'off'}), ('after', {})):
+        process = launch(args.port, env)
+        try:
+            measure(args.port, 3)  # warm the render caches and the interpreter
+            results[label] = measure(args.port, args.runs)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{'page':<14}{'':<8}{'first view':>16}{'repeat view':>18}{'TTFB p50':>11}")
+    for before, after in zip(results['before'], results['after']):
+        for label, (page, first, first_requests, repeat, repeat_requests, ttfb) in (('before', before), ('after', after)):
+            print(f"{page if label == 'before' else '':<14}{label:<8}{first:>9} B/{first_requests:<2}req"
+                  f"{repeat:>11} B/{repeat_requests:<2}req{ttfb:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
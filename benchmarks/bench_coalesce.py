@@ -0,0 +1,79 @@
+"""Upstream LLM calls and latency for a burst of identical questions, with and without coalescing.
+
+Fires --burst concurrent /chat requests for the same question (lightly
+reworded, so they share a normalized cache key) against the fake OpenAI
+server, once with single-flight coalescing off and once on, clearing the
+response cache in between. The database is not touched (the warm-up retries
+in the background), so any DATABASE_URL will do:
+
+    DATABASE_URL=postgresql://x:x@127.0.0.1:1/x python benchmarks/bench_coalesce.py --burst 20 --latency 0.8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+VARIANTS = ["How should I care for a limping senior dog?", "how should i care for a limping senior dog",
+            "How should I care for a limping senior dog??", "HOW SHOULD I CARE FOR A LIMPING SENIOR DOG"]
+
+
+def burst(server, size):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    gate = threading.Barrier(size)
+
+    def ask(i):
+        client = server.app.test_client()
+        gate.wait()
+        started = time.perf_counter()
+        response = client.post('/chat', json={'message': VARIANTS[i % len(VARIANTS)]})
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--burst', type=int, default=20, help='concurrent identical questions')
+    parser.add_argument('--latency', type=float, default=0.8, help='fake OpenAI time to first token')
+    parser.add_argument('--token-delay', type=float, default=0.01)
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay).start()
+    os.environ['OPENAI_BASE_URL'] = fake.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ['SEMANTIC_CACHE'] = 'off'
+    # Leave the budget out of it: every uncoalesced request gets its own call
+    os.environ['LLM_MAX_IN_FLIGHT'] = str(args.burst)
+    import server
+
+    print(f"{'mode':<14}{'upstream':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  statuses")
+    for label, enabled in (('uncoalesced', False), ('coalesced', True)):
+        server.response_cache.clear()
+        server.llm_flights.enabled = enabled
+        before = fake.requests
+        latencies, statuses = burst(server, args.burst)
+        upstream = fake.requests - before
+        pick = lambda fraction: latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000  # noqa: E731
+        print(f"{label:<14}{upstream:>10}{pick(0.5):>10.1f}{pick(0.95):>10.1f}{latencies[-1] * 1000:>10.1f}  "
+              f"{dict((status, statuses.count(status)) for status in set(statuses))}")
+    print(f"coalescing stats: {server.llm_flights.stats()}")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Correctness corpus and micro-benchmark for the compiled intent matcher.
+
+Compares IntentMatcher with the original substring scans of get_quick_response
+and chat() on benchmarks/data/intent_corpus.json (offline, no database).
+The matcher is the slower of the two, about 2.4 us against 1-2 us per
+message; it is kept for accuracy, since substring checks match words
+inside other words ("this" as "hi") and miss most of the corpus:
+
+    python benchmarks/bench_intents.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_matcher import IntentMatcher  # noqa: E402
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'data', 'intent_corpus.json')
+
+
+def legacy_classify(message):
+    """The pre-matcher behaviour: dict rebuilt per call, substring checks, then keyword scans."""
+    message_lower = message.lower().strip()
+    quick_responses = {
+        'hello': 'greeting', 'hi': 'greeting', 'hours': 'hours', 'services': 'services',
+        'location': 'location', 'price': 'price', 'emergency': 'emergency'
+    }
+    for key, intent in quick_responses.items():
+        if key in message_lower or message_lower == key:
+            return intent
+    if any(word in message_lower for word in ['hello', 'hi', 'hey', 'good morning', 'good afternoon']):
+        return 'greeting'
+    if any(word in message_lower for word in ['appointment', 'book', 'schedule']):
+        return 'booking'
+    if any(word in message_lower for word in ['appointment', 'book', 'schedule', 'available', 'slots']):
+        return 'availability'
+    return 'chat'
+
+
+def matcher_classify(matcher):
+    def classify(message):
+        match = matcher.classify(message)
+        if match.reply_intent:
+            return match.reply_intent
+        if 'booking' in match:
+            return 'booking'
+        if 'availability' in match:
+            return 'availability'
+        if 'booking_time' in match and 'booking_verb' in match:
+            return 'booking'
+        return 'chat'
+    return classify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+    matcher = IntentMatcher.from_file(os.path.join(ROOT, 'intents.json'))
+
+    for label, classify in (('legacy substring scan', legacy_classify), ('compiled matcher', matcher_classify(matcher))):
+        failures = [(case['message'], case['expect'], classify(case['message']))
+                    for case in corpus if classify(case['message']) != case['expect']]
+        messages = [case['message'] for case in corpus]
+        seconds = timeit.timeit(lambda: [classify(m) for m in messages], number=args.iterations // len(messages) or 1)
+        per_message_us = seconds / ((args.iterations // len(messages) or 1) * len(messages)) * 1e6
+        print(f"{label:<24} accuracy {len(corpus) - len(failures)}/{len(corpus)}   {per_message_us:6.2f} us/message")
+        for message, expected, actual in failures:
+            print(f"    {message!r}: expected {expected}, got {actual}")
+
+    if any(matcher_classify(matcher)(case['message']) != case['expect'] for case in corpus):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""JSON serialization of large appointment listings, old path vs the fast paths.
+
+Encodes --rows synthetic appointment rows (every column type the table has)
+the ways /appointments can, offline:
+
+  RealDictRow + stdlib      rows as RealDictCursor builds them, one jsonify
+                            with the default() hook (the old provider)
+  RealDictRow + orjson      same rows through OrjsonProvider
+  tuples streamed, stdlib   tuples encoded APPOINTMENTS_STREAM_BATCH rows at a
+  tuples streamed, orjson   time with dumps_rows, as streamed pages are
+
+reporting time per listing and peak traced memory while it is produced and
+sent (row objects plus output held at once). Checks that every path produces
+the same appointments.
+
+    python benchmarks/bench_json.py --rows 100000
+"""
+import argparse
+import decimal
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, time as dtime, timedelta
+
+from flask import Flask
+from psycopg2.extras import RealDictRow
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_encoding import OrjsonProvider, StdlibJSONProvider, orjson  # noqa: E402
+
+COLUMNS = ['id', 'name', 'pet_name', 'phone', 'date', 'time', 'service', 'notes', 'status',
+           'created_at', 'updated_at', 'change_seq']
+BATCH = 2000
+
+
+def make_rows(count):
+    start = datetime(2025, 1, 6, 9, 0, 0, 123456)
+    return [
+        (count - i, f'Owner {i}', f'Pet {i % 97}', '555-0100', date(2025, 1, 6) + timedelta(days=i // 9),
+         dtime(9 + i % 9, 0), 'General checkup', 'Annual visit' if i % 3 else '', 'scheduled',
+         start + timedelta(minutes=i), None if i % 2 else start + timedelta(days=1), decimal.Decimal(i))
+        for i in range(count)
+    ]
+
+
+def listing(provider, rows):
+    # RealDictCursor builds these row by row before anything is encoded
+    dict_rows = [RealDictRow(zip(COLUMNS, row)) for row in rows]
+    yield provider.response({'appointments': dict_rows}).get_data()
+
+
+def streamed(provider, rows):
+    yield b'{"appointments":['
+    for start in range(0, len(rows), BATCH):
+        yield (b',' if start else b'') + provider.dumps_rows(COLUMNS, rows[start:start + BATCH])
+    yield b']}'
+
+
+def measure(label, fn, rows, runs):
+    """Chunks are dropped as they come, like a WSGI server writing them out"""
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in fn(rows))
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    sum(len(chunk) for chunk in fn(rows))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28}{best * 1000:>10.1f} ms{peak / 2 ** 20:>12.1f} MiB{size / 2 ** 20:>10.1f} MiB")
+    return b''.join(fn(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.app_context().push()
+    stdlib = StdlibJSONProvider(app)
+    rows = make_rows(args.rows)
+    print(f"{args.rows} rows\n{'path':<28}{'time':>13}{'peak memory':>16}{'output':>14}")
+    outputs = [measure('RealDictRow + stdlib', lambda r: listing(stdlib, r), rows, args.runs),
+               measure('tuples streamed, stdlib', lambda r: streamed(stdlib, r), rows, args.runs)]
+    if orjson is not None:
+        fast = OrjsonProvider(app)
+        outputs += [measure('RealDictRow + orjson', lambda r: listing(fast, r), rows, args.runs),
+                    measure('tuples streamed, orjson', lambda r: streamed(fast, r), rows, args.runs)]
+    else:
+        print('orjson is not installed; pip install orjson for the fast paths')
+
+    decoded = [json.loads(output)['appointments'] for output in outputs]
+    assert all(appointments == decoded[0] for appointments in decoded), 'paths disagree'
+    print('all paths produce the same appointments')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""LLM resilience: outage fast-fail, recovery and hedged tail latency, against a fault-injecting fake.
+
+Three scenarios, all offline against benchmarks/fake_openai.py:
+
+- normal: --requests distinct /chat questions, for baseline latency, tokens and cost.
+- outage: the fake answers every call with HTTP 500. With the circuit breaker
+  the first few requests pay for failed round trips, then the rest get the
+  local offline reply without touching the network; "no breaker" repeats it
+  with the threshold out of reach. The fake then recovers and, after the
+  cooldown, one probe closes the circuit again.
+- tail: --slow-rate of calls take --slow-latency; the same analyze calls are
+  run with hedging off and on (non-streaming calls only).
+
+The database is not touched, so any DATABASE_URL will do:
+
+    DATABASE_URL=postgresql://x:x@127.0.0.1:1/x python benchmarks/bench_llm_resilience.py --requests 40
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+
+def pick(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+def row(label, latencies, upstream, notes=''):
+    print(f"{label:<22}{len(latencies):>6}{upstream:>10}{pick(latencies, 0.5):>10.1f}{pick(latencies, 0.95):>10.1f}"
+          f"{max(latencies) * 1000:>10.1f}  {notes}")
+
+
+def chat_run(server, fake, label, count, offset):
+    client = server.app.test_client()
+    latencies, replies = [], {'answered': 0, 'offline': 0, 'error': 0}
+    before = fake.requests
+    for i in range(count):
+        started = time.perf_counter()
+        reply = client.post('/chat', json={'message': f"Question {offset + i}: is it normal for my cat to sleep all day?"}).get_json()['reply']
+        latencies.append(time.perf_counter() - started)
+        if reply == server.OFFLINE_CHAT_REPLY:
+            replies['offline'] += 1
+        elif reply == server.CHAT_ERROR_REPLY:
+            replies['error'] += 1
+        else:
+            replies['answered'] += 1
+    row(label, latencies, fake.requests - before, f"{replies} circuit={server.llm.breaker.state}")
+
+
+def analyze_run(llm, fake, count, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(count))
+    before = fake.requests
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            llm.complete('analyze', messages=[{'role': 'user', 'content': f"Can I book a checkup for Max? ({i})"}],
+                         timeout=10, response_format={'type': 'json_object'}, max_tokens=300)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, fake.requests - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=40, help='chat requests per normal/outage run')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake OpenAI time to first token')
+    parser.add_argument('--token-delay', type=float, default=0.002)
+    parser.add_argument('--cooldown', type=float, default=2, help='circuit breaker cooldown for the recovery run')
+    parser.add_argument('--tail-requests', type=int, default=200, help='analyze calls per hedging run')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--slow-latency', type=float, default=1.5, help='keep under LLM_TIMEOUT_FLOOR to compare hedging, not timeouts')
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay, seed=7).start()
+    os.environ['OPENAI_BASE_URL'] = fake.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    os.environ['SEMANTIC_CACHE'] = 'off'
+    os.environ['LLM_CIRCUIT_COOLDOWN'] = str(args.cooldown)
+    import server
+    from llm_client import ResilientLLM
+
+    print(f"{'scenario':<22}{'calls':>6}{'upstream':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  notes")
+    chat_run(server, fake, 'normal', args.requests, 0)
+
+    fake.failure_rate = 1.0
+    threshold = server.llm.breaker.failure_threshold
+    server.llm.breaker.failure_threshold = 10 ** 9
+    chat_run(server, fake, 'outage, no breaker', args.requests, 1000)
+    server.llm.breaker.failure_threshold = threshold
+    server.llm.breaker.record_success()
+    chat_run(server, fake, 'outage, breaker', args.requests, 2000)
+
+    fake.failure_rate = 0.0
+    time.sleep(args.cooldown)
+    chat_run(server, fake, 'recovered', args.requests, 3000)
+
+    fake.slow_rate, fake.slow_latency = args.slow_rate, args.slow_latency
+    for label, hedge in (('tail, hedging off', False), ('tail, hedging on', True)):
+        llm = ResilientLLM(server.get_openai_client, server.CHAT_MODEL, hedge=hedge)
+        latencies, upstream = analyze_run(llm, fake, args.tail_requests, args.concurrency)
+        stats = llm.stats()['purposes']['analyze']
+        row(label, latencies, upstream,
+            f"p99 {pick(latencies, 0.99):.1f} ms, hedged {stats['hedged']}, hedge wins {stats['hedge_wins']}, "
+            f"tokens {stats['prompt_tokens'] + stats['completion_tokens']}, cost ${stats['cost_usd']:.4f}")
+
+    print(f"\napp LLM stats: {server.llm.stats()}")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
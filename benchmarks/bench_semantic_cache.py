@@ -0,0 +1,65 @@
+"""Hit rate, false-hit rate and lookup latency of the semantic answer cache.
+
+Runs fully offline with the local hashing embedder on a recorded question set.
+Each topic's paraphrases should hit its cached question; its near misses
+(one extra word, or a negation, away) must not:
+
+    python benchmarks/bench_semantic_cache.py --threshold 0.8 --filler 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import HashingEmbedder, SemanticCache  # noqa: E402
+
+QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'semantic_questions.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threshold', type=float, default=None)
+    parser.add_argument('--filler', type=int, default=2000, help='unrelated cached questions to grow the index')
+    args = parser.parse_args()
+
+    with open(QUESTIONS) as f:
+        topics = json.load(f)
+
+    cache = SemanticCache(HashingEmbedder(), threshold=args.threshold, max_entries=args.filler + len(topics))
+    for i in range(args.filler):
+        cache.store(f"unrelated question number {i} about parrot cage size {i * 7}", 'filler')
+    for topic in topics:
+        cache.store(topic['cached'], topic['topic'])
+
+    hits = false_hits = total = 0
+    latencies = []
+    for topic in topics:
+        for question in topic['paraphrases']:
+            started = time.perf_counter()
+            match = cache.lookup(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+            total += 1
+            if match and match[0] == topic['topic']:
+                hits += 1
+            elif match:
+                false_hits += 1
+                print(f"false hit: {question!r} -> {match[2]!r} ({match[1]:.2f})")
+    near_misses = [question for topic in topics for question in topic.get('near_misses', [])]
+    near_hits = 0
+    for question in near_misses:
+        match = cache.lookup(question)
+        if match:
+            near_hits += 1
+            print(f"near-miss hit: {question!r} -> {match[2]!r} ({match[1]:.2f})")
+
+    latencies.sort()
+    print(f"threshold {cache.threshold}  index size {len(cache)}")
+    print(f"hit rate {hits / total:.1%}  false hits {false_hits}/{total}  near-miss hits {near_hits}/{len(near_misses)}")
+    print(f"lookup p50 {latencies[len(latencies) // 2]:.3f} ms  max {latencies[-1]:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Local OpenAI-compatible stand-in for benchmarks and manual testing.
+
+Serves POST /v1/chat/completions (plain, JSON mode and ``stream=True``) with
+canned replies and injectable latency and faults, so the app can be exercised
+offline. Faults: a fraction of requests can fail with an HTTP status
+(failure_rate/failure_status) or be slow (slow_rate/slow_latency); all of
+these attributes can be changed while the server runs, e.g. to script an outage:
+
+    python benchmarks/fake_openai.py --port 8765 --latency 0.8 --token-delay 0.02
+    python benchmarks/fake_openai.py --failure-rate 0.3 --slow-rate 0.05 --slow-latency 6
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python server.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Puppies usually get their first vaccines at 6-8 weeks, with boosters every "
+    "3-4 weeks until about 16 weeks old. After that, most vaccines are given yearly. "
+    "Book a checkup and we'll set up a schedule for your pet."
+)
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server speaking enough of the chat completions API for the app."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, token_delay=0.02, reply=DEFAULT_REPLY,
+                 failure_rate=0.0, failure_status=500, slow_rate=0.0, slow_latency=5.0, seed=None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.slow_responses = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def respond(self, body):
+        """Content for a chat completion request; override to script replies."""
+        if (body.get('response_format') or {}).get('type') == 'json_object':
+            user_messages = [m.get('content', '') for m in body.get('messages', []) if m.get('role') == 'user']
+            return json.dumps(self.analyze(user_messages[-1] if user_messages else ''))
+        return self.reply
+
+    def analyze(self, message):
+        """Crude stand-in for the combined intent/extraction/reply call."""
+        lower = message.lower()
+        if any(word in lower for word in ('available', 'availability', 'slots')):
+            return {'intent': 'availability', 'appointment': None, 'reply': ''}
+        if any(word in lower for word in ('book', 'appointment', 'schedule')) and re.search(r'\d|tomorrow', lower):
+            return {
+                'intent': 'booking',
+                'appointment': {
+                    'name': 'Test Owner',
+                    'pet_name': 'Max',
+                    'phone': '',
+                    'date': (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'),
+                    'time': '14:00',
+                    'service': 'General checkup',
+                    'notes': ''
+                },
+                'reply': ''
+            }
+        return {'intent': 'chat', 'appointment': None, 'reply': self.reply}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; without TCP_NODELAY, delayed
+            # ACKs add ~40 ms to every response and swamp the injected latency
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                with server._lock:
+                    server.requests += 1
+                    fail = server.random.random() < server.failure_rate
+                    slow = not fail and server.random.random() < server.slow_rate
+                    server.failures += fail
+                    server.slow_responses += slow
+                if not self.path.endswith('/chat/completions'):
+                    self._json(404, {'error': {'message': f'Unknown path {self.path}'}})
+                    return
+                time.sleep(server.slow_latency if slow else server.latency)
+                if fail:
+                    self._json(server.failure_status, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+                    return
+                content = server.respond(body)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                model = body.get('model', 'fake-model')
+                prompt_tokens = sum(len(m.get('content', '').split()) for m in body.get('messages', []))
+                completion_tokens = len(content.split())
+                usage = {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+                if body.get('stream'):
+                    include_usage = (body.get('stream_options') or {}).get('include_usage')
+                    self._stream(completion_id, model, content, usage if include_usage else None)
+                else:
+                    self._json(200, {
+                        'id': completion_id,
+                        'object': 'chat.completion',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{
+                            'index': 0,
+                            'message': {'role': 'assistant', 'content': content},
+                            'finish_reason': 'stop'
+                        }],
+                        'usage': usage
+                    })
+
+            def _stream(self, completion_id, model, content, usage=None):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                words = content.split(' ')
+                for i, word in enumerate(words):
+                    chunk = {
+                        'id': completion_id,
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{
+                            'index': 0,
+                            'delta': {'content': word if i == 0 else ' ' + word},
+                            'finish_reason': None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(server.token_delay)
+                done = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+                }
+                self.wfile.write(f"data: {json.dumps(done)}\n\n".encode())
+                if usage is not None:
+                    # stream_options.include_usage: a final chunk with no choices
+                    usage_chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                                   'model': model, 'choices': [], 'usage': usage}
+                    self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with --failure-status')
+    parser.add_argument('--failure-status', type=int, default=500)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fraction of requests delayed by --slow-latency instead')
+    parser.add_argument('--slow-latency', type=float, default=5.0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.token_delay,
+                              failure_rate=args.failure_rate, failure_status=args.failure_status,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"Fake OpenAI listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Local stand-in for the Twilio Messages API.
+
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json with injectable latency
+and failure rate, and records every accepted message, so notification delivery
+can be exercised offline:
+
+    python benchmarks/fake_twilio.py --port 8766 --latency 0.4 --failure-rate 0.2
+    TWILIO_API_BASE_URL=http://127.0.0.1:8766 TWILIO_ACCOUNT_SID=ACtest TWILIO_AUTH_TOKEN=test \
+        TWILIO_WHATSAPP_NUMBER=whatsapp:+10000000000 ADMIN_WHATSAPP_NUMBER=whatsapp:+10000000001 python server.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTwilioServer:
+    """Threaded HTTP server answering message creation like Twilio (201 or an error)."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.3, failure_rate=0.0, failure_status=503):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.requests = 0
+        self.failures = 0
+        self.messages = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; without TCP_NODELAY, delayed
+            # ACKs add ~40 ms to every response and swamp the injected latency
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                with server._lock:
+                    server.requests += 1
+                if not self.path.endswith('/Messages.json'):
+                    self._json(404, {'code': 20404, 'message': f'Unknown path {self.path}', 'status': 404})
+                    return
+                time.sleep(server.latency)
+                if random.random() < server.failure_rate:
+                    with server._lock:
+                        server.failures += 1
+                    self._json(server.failure_status, {
+                        'code': 20500 if server.failure_status >= 500 else 20429,
+                        'message': 'Injected failure',
+                        'status': server.failure_status
+                    })
+                    return
+                sid = f"SM{uuid.uuid4().hex}"
+                with server._lock:
+                    server.messages.append({'sid': sid, 'to': form.get('To'), 'from': form.get('From'), 'body': form.get('Body')})
+                self._json(201, {
+                    'sid': sid,
+                    'status': 'queued',
+                    'to': form.get('To'),
+                    'from': form.get('From'),
+                    'body': form.get('Body'),
+                    'date_created': time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime())
+                })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Twilio Messages API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--failure-status', type=int, default=503)
+    args = parser.parse_args()
+    server = FakeTwilioServer(args.host, args.port, args.latency, args.failure_rate, args.failure_status)
+    print(f"Fake Twilio listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+
+class ChangeListener:
+    """Fans Postgres NOTIFY events out to live dashboard streams.
+
+    One dedicated connection per process LISTENs on the channel (a LISTEN
+    holds its connection for good, so it must not come from the request
+    pool) and copies every notification into each subscriber's queue. The
+    thread starts with the first subscriber and reconnects with backoff.
+    Note that LISTEN needs a session-mode connection; transaction poolers
+    (e.g. Supabase port 6543) silently drop notifications, so point
+    DATABASE_LISTEN_URL at a direct or session-mode URL.
+    """
+
+    def __init__(self, dsn, channel='appointment_changes', max_subscribers=4):
+        self.dsn = dsn
+        self.channel = channel
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+        self.rejected = 0
+
+    def subscribe(self):
+        """Queue receiving change payloads, or None when the subscriber limit is reached"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            subscription = queue.Queue(maxsize=1000)
+            self._subscribers.add(subscription)
+            # Threads don't survive gunicorn's fork, so start the listener per process
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._listen_forever, name='change-listener', daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.notifications += 1
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(payload)
+            except queue.Full:
+                pass  # A stalled client re-syncs from the change feed on reconnect
+
+    def _listen_forever(self):
+        backoff = 1
+        while True:
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {self.channel}')
+                self.connected = True
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            payload = {'raw': notify.payload}
+                        self.publish(payload)
+            except Exception as e:
+                self.connected = False
+                self.reconnects += 1
+                print(f"Change listener error, reconnecting in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'connected': self.connected,
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'notifications': self.notifications,
+                'reconnects': self.reconnects,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,126 @@
+import json
+import os
+import secrets
+import threading
+from llm_cache import MemoryCache, SQLiteCache
+
+class Conversation:
+    """Booking fields collected so far and the last few turns of one chat session"""
+
+    __slots__ = ('id', 'booking_in_progress', 'slots', 'turns', 'expecting')
+
+    def __init__(self, conversation_id, booking_in_progress=False, slots=None, turns=None, expecting=None):
+        self.id = conversation_id
+        self.booking_in_progress = booking_in_progress
+        self.slots = slots or {}
+        self.turns = turns or []  # [role, text] pairs, oldest first
+        self.expecting = expecting  # the name field a bare answer would fill, if any
+
+    def remember(self, slots):
+        """Start or continue a booking; later turns overwrite earlier fields.
+
+        A booking only counts as started once at least one field is known, so
+        a request with no details does not route the next messages to booking.
+        """
+        self.slots.update({field: value for field, value in slots.items() if value and field != 'notes'})
+        if self.slots:
+            self.booking_in_progress = True
+
+    def forget(self):
+        """Drop the booking being collected (booked, abandoned or cancelled)"""
+        self.booking_in_progress = False
+        self.slots = {}
+        self.expecting = None
+
+    def booked(self):
+        self.forget()
+
+    def context(self):
+        """Turns for the model, as chat messages"""
+        return [{"role": role, "content": text} for role, text in self.turns]
+
+class ConversationStore:
+    """Server-side conversation state, keyed by an id kept in the session cookie.
+
+    Entries are small JSON documents (slots plus the last max_turns turns,
+    each cut to max_turn_chars) held in one of llm_cache's stores: the
+    in-process LRU bounds entries and bytes, the SQLite file lets every worker
+    on the host see a conversation whichever worker its next turn lands on.
+    Both expire a conversation ttl seconds after its last turn.
+    """
+
+    def __init__(self, cache, max_turns=6, max_turn_chars=300, enabled=True):
+        self.cache = cache
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.loaded = self.saved = 0
+
+    @classmethod
+    def from_env(cls):
+        ttl = int(os.getenv('CONVERSATION_TTL', 1800))
+        backend = os.getenv('CONVERSATION_BACKEND', 'memory').lower()
+        if backend == 'sqlite':
+            cache = SQLiteCache(
+                path=os.getenv('CONVERSATION_SQLITE_PATH'),
+                ttl=ttl,
+                max_entries=int(os.getenv('CONVERSATION_MAX_SESSIONS', 10000)),
+                table='conversations'
+            )
+        else:
+            if backend != 'memory':
+                print(f"Warning: unknown CONVERSATION_BACKEND '{backend}', keeping conversations in memory")
+            cache = MemoryCache(
+                ttl=ttl,
+                max_entries=int(os.getenv('CONVERSATION_MAX_SESSIONS', 10000)),
+                max_bytes=int(os.getenv('CONVERSATION_MAX_BYTES', 4 * 1024 * 1024))
+            )
+        return cls(
+            cache,
+            max_turns=int(os.getenv('CONVERSATION_MAX_TURNS', 6)),
+            max_turn_chars=int(os.getenv('CONVERSATION_MAX_TURN_CHARS', 300)),
+            enabled=os.getenv('CONVERSATION_STATE', 'on').lower() not in ('0', 'false', 'off')
+        )
+
+    @staticmethod
+    def new_id():
+        return secrets.token_hex(16)
+
+    def load(self, conversation_id):
+        """The stored conversation, or a fresh one (also when disabled or expired)"""
+        if not self.enabled or not conversation_id:
+            return Conversation(conversation_id)
+        with self._lock:
+            self.loaded += 1
+        stored = self.cache.get(conversation_id)
+        if stored is None:
+            return Conversation(conversation_id)
+        data = json.loads(stored)
+        return Conversation(conversation_id, data['booking'], data['slots'], data['turns'], data['expecting'])
+
+    def record(self, conversation, user_message, reply):
+        """Append one exchange, trim to the newest turns and save"""
+        if not self.enabled or not conversation.id:
+            return
+        conversation.turns.append(['user', user_message[:self.max_turn_chars]])
+        conversation.turns.append(['assistant', reply[:self.max_turn_chars]])
+        del conversation.turns[:-self.max_turns]
+        self.cache.set(conversation.id, json.dumps(
+            {'booking': conversation.booking_in_progress, 'slots': conversation.slots, 'turns': conversation.turns,
+             'expecting': conversation.expecting},
+            separators=(',', ':')
+        ))
+        with self._lock:
+            self.saved += 1
+
+    def stats(self):
+        with self._lock:
+            counters = {'loaded': self.loaded, 'saved': self.saved}
+        return {
+            'enabled': self.enabled,
+            'max_turns': self.max_turns,
+            'max_turn_chars': self.max_turn_chars,
+            **counters,
+            'store': self.cache.stats()
+        }
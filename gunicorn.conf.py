@@ -1,17 +1,71 @@
 import multiprocessing
 import os
 
+def available_cpus():
+    """CPUs this container may use: affinity mask, narrowed by a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def available_memory_mb():
+    """Container memory limit (cgroup v2, then v1), else physical memory"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != 'max' and int(value) < 1 << 50:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 512
+
 # Gunicorn configuration for Render deployment with PostgreSQL
 bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
-workers = 1  # Use single worker for free tier
-worker_class = "sync"
-worker_connections = 1000
-timeout = 120  # Increased for LLM requests
+
+# Requests spend most of their time waiting on OpenAI, Twilio and Postgres, so
+# concurrency comes from threads; extra processes only add CPU parallelism.
+# One worker per CPU, as many as fit in ~75% of the memory limit (each worker
+# plus its bcrypt pool is budgeted at GUNICORN_WORKER_MEMORY_MB).
+cpu_count = available_cpus()
+memory_mb = available_memory_mb()
+worker_memory_mb = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 200))
+workers = int(os.getenv('WEB_CONCURRENCY', max(1, min(cpu_count, memory_mb * 3 // 4 // worker_memory_mb))))
+# Threaded workers so a slow or streaming LLM call only occupies one thread,
+# not the whole worker; other visitors keep being served meanwhile.
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_connections = 1000  # gthread: open keep-alive connections per worker
+timeout = 120  # gthread heartbeats from its main loop, so this only catches a hung worker
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
 preload_app = True
 
+# Size the app's per-process limits for this worker model. These become
+# defaults for server.py (imported below via preload_app); explicit env wins.
+# DB_MAX_CONNECTIONS is the budget for all workers together; each worker
+# also keeps one LISTEN connection for the admin change stream.
+db_connections_per_worker = max(2, int(os.getenv('DB_MAX_CONNECTIONS', 16)) // workers - 1)
+os.environ.setdefault('DB_POOL_SIZE', str(min(threads, db_connections_per_worker)))
+os.environ.setdefault('DB_POOL_MAX_OVERFLOW', str(max(0, db_connections_per_worker - threads)))
+# Leave threads free for quick replies, logins and health checks while LLM calls are slow
+os.environ.setdefault('LLM_MAX_IN_FLIGHT', str(max(1, threads - 2)))
+# A chat's next message can land on any worker, so they share conversations through SQLite
+if workers > 1:
+    os.environ.setdefault('CONVERSATION_BACKEND', 'sqlite')
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -27,6 +81,11 @@ worker_tmp_dir = "/dev/shm"
 def when_ready(server):
     """Called when the server is ready."""
     server.log.info("Server is ready. PostgreSQL connections will be pooled.")
+    server.log.info(
+        "%s workers x %s threads (%s CPUs, %s MB); per worker: DB pool %s+%s, LLM in flight %s",
+        workers, threads, cpu_count, memory_mb, os.environ['DB_POOL_SIZE'],
+        os.environ['DB_POOL_MAX_OVERFLOW'], os.environ['LLM_MAX_IN_FLIGHT']
+    )
 
 def worker_int(worker):
     """Called when a worker receives the INT or QUIT signal."""
@@ -35,3 +94,12 @@ def worker_int(worker):
 def pre_fork(server, worker):
     """Called before a worker is forked."""
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+
+def post_fork(server, worker):
+    """Called in the worker right after fork, before it starts any threads."""
+    # Fork the bcrypt pool now, while forking is still safe (see password_hasher.py)
+    from server import password_hasher, warmup
+    if password_hasher.start():
+        worker.log.info("Password hashing pool started (%s processes)", password_hasher.workers)
+    # Connect, apply the schema and build clients in the background; see /ready
+    warmup.start()
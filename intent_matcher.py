@@ -0,0 +1,108 @@
+import json
+import re
+
+class IntentMatch:
+    """Every intent found in a message plus the quick reply to send, if any"""
+
+    __slots__ = ('intents', 'reply_intent', 'reply')
+
+    def __init__(self, intents, reply_intent=None, reply=None):
+        self.intents = intents
+        self.reply_intent = reply_intent
+        self.reply = reply
+
+    def __contains__(self, name):
+        return name in self.intents
+
+    def __repr__(self):
+        return f"IntentMatch({sorted(self.intents)!r}, reply_intent={self.reply_intent!r})"
+
+NO_INTENTS = IntentMatch(frozenset())
+
+def trie_regex(words):
+    """Compile literal phrases into a prefix-trie alternation, e.g. book(?:ed|ing)?
+
+    Python's re tries alternatives one by one, so sharing prefixes keeps the
+    number of alternatives tried at each position from growing with the
+    intent list.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        optional = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if optional:
+            return body + '?' if len(branches) == 1 and len(branches[0]) == 1 else '(?:' + '|'.join(branches) + ')?'
+        return body
+
+    return build(trie)
+
+class IntentMatcher:
+    """Classifies a message against all configured intents in one regex pass.
+
+    Literal phrases from every intent are merged into a single word-boundary
+    anchored trie pattern (so "this" no longer matches "hi"); the matched text
+    is mapped back to its intent with a dict lookup. An intent's ``regex``
+    patterns become a named group of the same pattern. Intents marked
+    ``standalone`` only count when they make up the whole message (e.g. a bare
+    greeting). Quick replies are picked in config order; booking or
+    availability requests suppress all quick replies except emergencies.
+
+    Whole-word matching is what this buys, not speed: scanning for word
+    boundaries costs more per message than the substring checks it replaced
+    (see benchmarks/bench_intents.py), a few microseconds next to a request.
+    """
+
+    ALWAYS_REPLY = frozenset(['emergency'])
+    SUPPRESSING = frozenset(['booking', 'availability'])
+
+    def __init__(self, intents):
+        self.replies = {}
+        self.order = []
+        self.phrases = {}
+        self.standalone = {}
+        regex_groups = []
+        for intent in intents:
+            name = intent['name']
+            self.order.append(name)
+            if intent.get('reply'):
+                self.replies[name] = intent['reply']
+            if intent.get('regex'):
+                regex_groups.append(f"(?P<{name}>{'|'.join(intent['regex'])})")
+            for phrase in intent.get('patterns', []):
+                self.phrases[phrase.lower()] = name
+            if intent.get('standalone'):
+                alternatives = trie_regex([p.lower() for p in intent['patterns']])
+                self.standalone[name] = re.compile(f"\\W*(?:{alternatives})\\W*")
+        alternatives = '|'.join(regex_groups + [trie_regex(self.phrases)])
+        self.pattern = re.compile(f"\\b(?:{alternatives})\\b")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['intents'])
+
+    def classify(self, message):
+        message = message.lower()
+        intents = set()
+        for match in self.pattern.finditer(message):
+            name = match.lastgroup or self.phrases[match.group()]
+            if name in self.standalone and not self.standalone[name].fullmatch(message):
+                continue
+            intents.add(name)
+        if not intents:
+            return NO_INTENTS
+        for name in self.order:
+            if name in intents and name in self.replies:
+                if name in self.ALWAYS_REPLY or not intents & self.SUPPRESSING:
+                    return IntentMatch(intents, name, self.replies[name])
+                break
+        return IntentMatch(intents)
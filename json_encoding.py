@@ -0,0 +1,100 @@
+import decimal
+import json
+import os
+from contextlib import nullcontext
+from datetime import datetime, time, date
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_default(obj):
+    """Values neither encoder handles natively: DB times, dates and decimals"""
+    if isinstance(obj, time):
+        return obj.strftime('%H:%M:%S')
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's json module plus DB types; each dumps runs inside timer(), e.g. a metrics stage"""
+
+    def __init__(self, app, timer=None):
+        super().__init__(app)
+        self.timer = timer or nullcontext
+
+    def default(self, obj):
+        return json_default(obj)
+
+    def dumps(self, obj, **kwargs):
+        with self.timer():
+            return super().dumps(obj, **kwargs)
+
+    def dumps_rows(self, columns, rows):
+        """Rows (tuples) as comma-separated JSON objects, for streamed listings"""
+        with self.timer():
+            return ','.join(json.dumps(dict(zip(columns, row)), default=json_default, separators=(',', ':'))
+                            for row in rows).encode()
+
+    def dumps_lines(self, columns, rows):
+        """Rows (tuples) as newline-terminated JSON objects, for JSON-lines exports"""
+        with self.timer():
+            return ''.join(json.dumps(dict(zip(columns, row)), default=json_default, separators=(',', ':')) + '\n'
+                           for row in rows).encode()
+
+class OrjsonProvider(JSONProvider):
+    """orjson-backed provider: datetimes, dates and times are encoded natively in C.
+
+    Responses are built from the encoded bytes directly. Keys are not sorted
+    (Flask's default provider sorts them) and non-string keys are allowed.
+    """
+
+    OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def __init__(self, app, timer=None):
+        super().__init__(app)
+        self.timer = timer or nullcontext
+
+    def _dumps(self, obj):
+        with self.timer():
+            return orjson.dumps(obj, default=json_default, option=self.OPTIONS)
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps(obj), mimetype='application/json')
+
+    def dumps_rows(self, columns, rows):
+        """Rows (tuples) as comma-separated JSON objects, for streamed listings"""
+        return self._dumps([dict(zip(columns, row)) for row in rows])[1:-1]
+
+    def dumps_lines(self, columns, rows):
+        """Rows (tuples) as newline-terminated JSON objects, for JSON-lines exports"""
+        with self.timer():
+            return b''.join(orjson.dumps(dict(zip(columns, row)), default=json_default, option=self.OPTIONS | orjson.OPT_APPEND_NEWLINE)
+                            for row in rows)
+
+def create_json_provider(app, timer=None):
+    """JSON_SERIALIZER=auto (orjson when installed), orjson or stdlib"""
+    choice = os.getenv('JSON_SERIALIZER', 'auto').lower()
+    if choice not in ('auto', 'orjson', 'stdlib'):
+        print(f"Warning: unknown JSON_SERIALIZER '{choice}', using auto")
+        choice = 'auto'
+    if choice == 'orjson' and orjson is None:
+        print("Warning: JSON_SERIALIZER=orjson but orjson is not installed; using the standard library")
+    if choice != 'stdlib' and orjson is not None:
+        return OrjsonProvider(app, timer)
+    return StdlibJSONProvider(app, timer)
@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Words that rarely change the meaning of a pet-care question. Negations,
+# modals and question words are deliberately absent: "should I", "can I" and
+# "should I not", or "how much" and "which", ask different things and must
+# never share a cache key (or a single-flight call).
+STOPWORDS = frozenset("""
+a an the and or of to in on at for with about from by is are am was were be been being
+do does did i me my we our you your it its this that these those there here
+please tell know want hi hello hey thanks thank just some any
+""".split())
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+def normalize_message(message):
+    """Lowercase, strip punctuation and stopwords and collapse whitespace"""
+    words = PUNCTUATION_PATTERN.sub(' ', message.lower()).split()
+    meaningful = [word for word in words if word not in STOPWORDS]
+    # A message made only of stopwords still needs a stable, non-empty key
+    return ' '.join(meaningful or words)
+
+def cache_key(message):
+    return hashlib.md5(normalize_message(message).encode()).hexdigest()
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with entry/byte caps and background expiry"""
+
+    backend = 'memory'
+
+    def __init__(self, ttl=300, max_entries=1000, max_bytes=5 * 1024 * 1024, sweep_interval=60):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, message):
+        key = cache_key(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, message, value):
+        self._ensure_sweeper()
+        key = cache_key(message)
+        size = len(key) + len(value.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def expire(self):
+        """Drop every expired entry; run periodically by the sweeper thread"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _ensure_sweeper(self):
+        # Threads don't survive gunicorn's fork, so start one per process lazily
+        if self._sweeper_pid == os.getpid() or not self.sweep_interval:
+            return
+        self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, name='cache-sweeper', daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.expire()
+
+class SQLiteCache:
+    """Cache shared by every worker process on the host through a local SQLite file"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path=None, ttl=300, max_entries=10000, sweep_interval=60, table='response_cache'):
+        self.path = path or os.path.join(tempfile.gettempdir(), f'vet_clinic_{table}.sqlite3')
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        with self._connection() as conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)')
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads (or forked processes)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, message):
+        key = cache_key(message)
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            with self._lock:
+                self.misses += 1
+                if row is not None:
+                    self.expirations += 1
+            if row is not None:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            return None
+        conn.execute(f'UPDATE {self.table} SET last_access = ? WHERE key = ?', (now, key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def set(self, message, value):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            f'INSERT INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, last_access = excluded.last_access',
+            (cache_key(message), value, now + self.ttl, now)
+        )
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.expire()
+        overflow = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)',
+                (overflow,)
+            )
+            with self._lock:
+                self.evictions += overflow
+
+    def clear(self):
+        self._connection().execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def expire(self):
+        deleted = self._connection().execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),)).rowcount
+        with self._lock:
+            self.expirations += deleted
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+        return {
+            'backend': self.backend,
+            'path': self.path,
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            **counters
+        }
+
+def create_cache(ttl):
+    """Build the response cache selected by CACHE_BACKEND (memory or sqlite)"""
+    backend = os.getenv('CACHE_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        return SQLiteCache(
+            path=os.getenv('CACHE_SQLITE_PATH'),
+            ttl=ttl,
+            max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+        )
+    if backend != 'memory':
+        print(f"Warning: unknown CACHE_BACKEND '{backend}', using in-memory cache")
+    return MemoryCache(
+        ttl=ttl,
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        max_bytes=int(os.getenv('CACHE_MAX_BYTES', 5 * 1024 * 1024))
+    )
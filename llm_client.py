@@ -0,0 +1,353 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class CircuitOpen(Exception):
+    """The LLM is failing; callers should take the local fallback path right away"""
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed until failure_threshold calls in a row fail, then open (every call
+    fast-fails) for cooldown seconds, then half-open: one probe call is let
+    through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_out = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """Open and still cooling down (read-only; allow() decides on probes)"""
+        with self._lock:
+            return self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self._probe_out = False
+            if self.state == 'half_open' and not self._probe_out:
+                self._probe_out = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_out = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    print(f"⚠️ LLM circuit opened after {self.failures} failures; local fallbacks for {self.cooldown:g}s")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probe_out = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'cooldown_s': self.cooldown
+            }
+
+class LatencyWindow:
+    """Latencies of the last `size` successful calls for one purpose"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction, min_samples=20):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class ResilientLLM:
+    """Chat completions with adaptive timeouts, retries, a circuit breaker,
+    optional hedging and token/cost accounting, per call purpose.
+
+    - Timeouts: each call's ceiling is the caller's fixed timeout; once a purpose
+      has enough samples it drops to timeout_multiplier x its p95 latency (never
+      below timeout_floor), so a stalled upstream is abandoned early.
+    - Retries: connection errors, 429s and 5xx are retried `retries` times with
+      jittered backoff. Timeouts are not retried (hedging covers slow tails).
+    - Circuit breaker: shared by all purposes; while open every call raises
+      CircuitOpen without touching the network.
+    - Hedging (non-streaming calls only): when the first request is still out
+      after the purpose's p95 latency, a second identical one is sent and the
+      first success wins; the loser's failure is not counted by the breaker.
+      At most hedge_ratio of calls are hedged.
+    - Accounting: prompt/completion tokens from the API's usage and their cost.
+    """
+
+    def __init__(self, client_factory, model, breaker=None, retries=1, timeout_floor=2.0, timeout_multiplier=3.0,
+                 hedge=False, hedge_ratio=0.1, input_price_per_1k=0.0005, output_price_per_1k=0.0015):
+        self.client_factory = client_factory
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.timeout_floor = timeout_floor
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self.input_price_per_1k = input_price_per_1k
+        self.output_price_per_1k = output_price_per_1k
+        self._latency = {}  # purpose -> LatencyWindow
+        self._stats = {}  # purpose -> counters
+        self._lock = threading.Lock()
+        self._hedge_pool = None
+
+    @classmethod
+    def from_env(cls, client_factory, model):
+        return cls(
+            client_factory, model,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('LLM_CIRCUIT_FAILURES', 5)),
+                cooldown=float(os.getenv('LLM_CIRCUIT_COOLDOWN', 30))
+            ),
+            retries=int(os.getenv('LLM_RETRIES', 1)),
+            timeout_floor=float(os.getenv('LLM_TIMEOUT_FLOOR', 2)),
+            timeout_multiplier=float(os.getenv('LLM_TIMEOUT_MULTIPLIER', 3)),
+            hedge=os.getenv('LLM_HEDGE', 'off').lower() in ('1', 'true', 'on'),
+            hedge_ratio=float(os.getenv('LLM_HEDGE_MAX_RATIO', 0.1)),
+            input_price_per_1k=float(os.getenv('LLM_PRICE_INPUT_PER_1K', 0.0005)),
+            output_price_per_1k=float(os.getenv('LLM_PRICE_OUTPUT_PER_1K', 0.0015))
+        )
+
+    def _purpose(self, purpose):
+        with self._lock:
+            if purpose not in self._stats:
+                self._latency[purpose] = LatencyWindow()
+                self._stats[purpose] = dict.fromkeys(
+                    ('calls', 'succeeded', 'failed', 'timeouts', 'retries', 'fast_failed', 'hedged', 'hedge_wins',
+                     'prompt_tokens', 'completion_tokens'), 0)
+                self._stats[purpose]['cost_usd'] = 0.0
+            return self._latency[purpose]
+
+    def _count(self, purpose, **amounts):
+        with self._lock:
+            stats = self._stats[purpose]
+            for key, amount in amounts.items():
+                stats[key] += amount
+
+    def timeout_for(self, purpose, ceiling):
+        p95 = self._purpose(purpose).percentile(0.95)
+        if p95 is None:
+            return ceiling
+        return min(ceiling, max(self.timeout_floor, p95 * self.timeout_multiplier))
+
+    def _account(self, purpose, usage):
+        if usage is None:
+            return
+        prompt = getattr(usage, 'prompt_tokens', 0) or 0
+        completion = getattr(usage, 'completion_tokens', 0) or 0
+        cost = prompt / 1000 * self.input_price_per_1k + completion / 1000 * self.output_price_per_1k
+        self._count(purpose, prompt_tokens=prompt, completion_tokens=completion, cost_usd=cost)
+
+    @staticmethod
+    def _classify(error):
+        """'timeout', 'retryable' (connection, 429, 5xx) or 'fatal' (other 4xx, bad input)"""
+        import openai
+        timeout_errors, connection_errors = (openai.APITimeoutError,), (openai.APIConnectionError, ConnectionError)
+        try:
+            # httpx errors surface directly when a stream breaks mid-way
+            import httpx
+            timeout_errors += (httpx.TimeoutException,)
+            connection_errors += (httpx.TransportError,)
+        except ImportError:
+            pass
+        if isinstance(error, timeout_errors):
+            return 'timeout'
+        if isinstance(error, connection_errors):
+            return 'retryable'
+        status = getattr(error, 'status_code', None)
+        if status is not None and (status == 429 or status >= 500):
+            return 'retryable'
+        return 'fatal'
+
+    def _record(self, kind):
+        """Tell the breaker how an attempt failed"""
+        if kind == 'fatal':
+            # Our request was bad; says nothing about upstream health
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _request(self, purpose, timeout, race=None, **kwargs):
+        """One upstream attempt, through the breaker; returns the SDK response.
+
+        Attempts of a hedged call collect their failures in race instead of
+        recording them, since only the race's outcome tells upstream health.
+        """
+        # Resolved first: allow() may hand out the half-open probe, which must then be sent
+        client = self.client_factory()
+        if client is None:
+            raise CircuitOpen("LLM client is not configured")
+        if not self.breaker.allow():
+            self._count(purpose, fast_failed=1)
+            raise CircuitOpen("LLM circuit is open")
+        try:
+            return client.chat.completions.create(model=self.model, timeout=timeout, **kwargs)
+        except Exception as e:
+            kind = self._classify(e)
+            if kind == 'timeout':
+                self._count(purpose, timeouts=1)
+            if race is None:
+                self._record(kind)
+            else:
+                race.append(kind)
+            raise
+
+    def _with_retries(self, purpose, timeout, race=None, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request(purpose, timeout, race, **kwargs)
+            except CircuitOpen:
+                raise
+            except Exception as e:
+                if attempt == self.retries or self._classify(e) != 'retryable':
+                    raise
+                self._count(purpose, retries=1)
+                time.sleep(random.uniform(0.1, 0.3) * (attempt + 1))
+
+    def complete(self, purpose, messages, timeout, **kwargs):
+        """Message content of a (non-streaming) completion"""
+        window = self._purpose(purpose)
+        self._count(purpose, calls=1)
+        call_timeout = self.timeout_for(purpose, timeout)
+        started = time.perf_counter()
+        try:
+            if self.hedge:
+                response = self._hedged(purpose, call_timeout, messages=messages, **kwargs)
+            else:
+                response = self._with_retries(purpose, call_timeout, messages=messages, **kwargs)
+        except Exception:
+            self._count(purpose, failed=1)
+            raise
+        self.breaker.record_success()
+        window.add(time.perf_counter() - started)
+        self._count(purpose, succeeded=1)
+        self._account(purpose, getattr(response, 'usage', None))
+        return response.choices[0].message.content
+
+    def _hedged(self, purpose, timeout, **kwargs):
+        delay = self._purpose(purpose).percentile(0.95)
+        with self._lock:
+            stats = self._stats[purpose]
+            may_hedge = delay is not None and stats['hedged'] < self.hedge_ratio * stats['calls']
+            if may_hedge and self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm-hedge')
+        if not may_hedge:
+            return self._with_retries(purpose, timeout, **kwargs)
+        race = []
+        primary = self._hedge_pool.submit(self._with_retries, purpose, timeout, race, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or self.breaker.is_open:
+            try:
+                return primary.result()
+            finally:
+                # Unhedged after all: its failures count as usual
+                for kind in race:
+                    self._record(kind)
+        self._count(purpose, hedged=1)
+        hedge = self._hedge_pool.submit(self._with_retries, purpose, timeout, race, **kwargs)
+        pending = {primary, hedge}
+        error = None
+
+        def account_loser(future):
+            # The losing request still costs tokens
+            if future.exception() is None:
+                self._account(purpose, future.result().usage)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(purpose, hedge_wins=1)
+                    for other in pending:
+                        other.add_done_callback(account_loser)
+                    # The loser's failures, now or later, are not held against the breaker
+                    return future.result()
+                error = future.exception()
+        for kind in race:
+            self._record(kind)
+        raise error
+
+    def stream(self, purpose, messages, timeout, **kwargs):
+        """Start a streaming completion; returns an iterator of content deltas.
+
+        The request (with retries) happens here, so errors before the first
+        byte raise immediately; the adaptive timeout also bounds gaps between chunks.
+        """
+        window = self._purpose(purpose)
+        self._count(purpose, calls=1)
+        started = time.perf_counter()
+        try:
+            response = self._with_retries(
+                purpose, self.timeout_for(purpose, timeout), messages=messages, stream=True,
+                stream_options={'include_usage': True}, **kwargs
+            )
+        except Exception:
+            self._count(purpose, failed=1)
+            raise
+        window.add(time.perf_counter() - started)
+        return self._deltas(purpose, response)
+
+    def _deltas(self, purpose, response):
+        try:
+            for chunk in response:
+                if getattr(chunk, 'usage', None) is not None:
+                    self._account(purpose, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            self._count(purpose, failed=1)
+            if self._classify(e) != 'fatal':
+                self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        self._count(purpose, succeeded=1)
+
+    def stats(self):
+        with self._lock:
+            purposes = {purpose: dict(stats, cost_usd=round(stats['cost_usd'], 6)) for purpose, stats in self._stats.items()}
+        for purpose in purposes:
+            p50, p95 = self._latency[purpose].percentile(0.5, 1), self._latency[purpose].percentile(0.95, 1)
+            purposes[purpose]['latency_p50_ms'] = round(p50 * 1000, 1) if p50 is not None else None
+            purposes[purpose]['latency_p95_ms'] = round(p95 * 1000, 1) if p95 is not None else None
+        return {
+            'model': self.model,
+            'circuit': self.breaker.stats(),
+            'hedging': self.hedge,
+            'purposes': purposes
+        }
@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; spans from sub-millisecond cache lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Span:
+    """Times a with-block into a histogram series"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=(), enabled=True):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.enabled = enabled
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, format_labels(self.label_names, labels), value) for labels, value in sorted(values.items())]
+
+class Histogram:
+    """Fixed-bucket histogram; an observation is one bisect and one locked list update"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS, enabled=True):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not self.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager timing its block: with STAGE_SECONDS.time('db_insert'): ..."""
+        return Span(self, labels) if self.enabled else NULL_SPAN
+
+    def snapshot(self, *labels):
+        """(count, sum) for one series"""
+        with self._lock:
+            series = self._series.get(labels)
+            return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            series_by_labels = {labels: list(series) for labels, series in self._series.items()}
+        samples = []
+        for labels, series in sorted(series_by_labels.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', format_labels(self.label_names, labels, [('le', format_value(bound))]), cumulative))
+            samples.append((f'{self.name}_sum', format_labels(self.label_names, labels), series[-1]))
+            samples.append((f'{self.name}_count', format_labels(self.label_names, labels), cumulative))
+        return samples
+
+class CallbackMetric:
+    """Gauge or counter read from application state at scrape time.
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help_text, kind, callback, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def samples(self):
+        values = self.callback()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            (self.name, format_labels(self.label_names, labels if isinstance(labels, tuple) else (labels,)), value)
+            for labels, value in values.items() if value is not None
+        ]
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Metrics are per process: with several gunicorn workers each scrape sees
+    the worker that served it, so scrape with workers=1 or aggregate by pid.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names, enabled=self.enabled)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets, enabled=self.enabled)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, callback, label_names=(), kind='gauge'):
+        metric = CallbackMetric(name, help_text, kind, callback, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                lines.append(f'# {metric.name} unavailable: {e}')
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {format_value(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
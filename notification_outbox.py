@@ -0,0 +1,238 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import Json, execute_values
+
+class PermanentNotificationError(Exception):
+    """Raised by a sender when retrying cannot help (bad number, rejected credentials)"""
+
+class NotificationOutbox:
+    """Durable queue of outbound notifications backed by the notification_outbox table.
+
+    Producers insert a row inside their own transaction (enqueue), so a
+    notification exists if and only if the booking committed. A background
+    worker claims due rows in batches with FOR UPDATE SKIP LOCKED (safe with
+    several processes), delivers them concurrently and records the outcome
+    with one UPDATE per batch. Failures are retried with exponential backoff
+    and jitter until max_attempts; a claimed row whose worker died becomes
+    due again when its lease expires. Sent and failed rows are deleted once
+    retention_days old, so the table only holds recent history; stats() counts
+    just the open rows (through the due-rows partial index), cached briefly.
+    """
+
+    def __init__(self, connection_factory, sender, batch_size=20, concurrency=4, max_attempts=8,
+                 base_delay=5, max_delay=900, poll_interval=5, lease_seconds=120,
+                 retention_days=30, prune_interval=3600, prune_batch=5000, stats_ttl=10):
+        self.connection_factory = connection_factory
+        self.sender = sender
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+        self.prune_interval = prune_interval
+        self.prune_batch = prune_batch
+        self.stats_ttl = stats_ttl
+        self._pruned_at = 0.0
+        self._queue = (0.0, None)  # (loaded_at, open rows by status)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self.enqueued = self.sent = self.retried = self.failed = self.batches = self.pruned = 0
+        self.send_seconds = 0.0
+
+    @classmethod
+    def from_env(cls, connection_factory, sender):
+        return cls(
+            connection_factory,
+            sender,
+            batch_size=int(os.getenv('NOTIFICATION_BATCH_SIZE', 20)),
+            concurrency=int(os.getenv('NOTIFICATION_CONCURRENCY', 4)),
+            max_attempts=int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', 8)),
+            base_delay=float(os.getenv('NOTIFICATION_RETRY_DELAY', 5)),
+            max_delay=float(os.getenv('NOTIFICATION_MAX_RETRY_DELAY', 900)),
+            poll_interval=float(os.getenv('NOTIFICATION_POLL_INTERVAL', 5)),
+            retention_days=float(os.getenv('NOTIFICATION_RETENTION_DAYS', 30))
+        )
+
+    def enqueue(self, cur, kind, payload):
+        """Queue a notification in the caller's transaction; call wake() after it commits"""
+        cur.execute(
+            'INSERT INTO notification_outbox (kind, payload) VALUES (%s, %s) RETURNING id',
+            (kind, Json(payload, dumps=lambda value: json.dumps(value, default=str)))
+        )
+        with self._lock:
+            self.enqueued += 1
+        return cur.fetchone()['id']
+
+    def wake(self):
+        self._wakeup.set()
+
+    def ensure_worker(self):
+        # Threads don't survive gunicorn's fork, so start one per process lazily
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+        threading.Thread(target=self.run_forever, name='notification-outbox', daemon=True).start()
+
+    def claim(self):
+        """Lease up to batch_size due notifications to this worker"""
+        with self.connection_factory() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE notification_outbox
+                    SET status = 'sending', attempts = attempts + 1,
+                        next_attempt_at = now() + make_interval(secs => %s)
+                    WHERE id IN (
+                        SELECT id FROM notification_outbox
+                        WHERE status IN ('pending', 'sending') AND next_attempt_at <= now()
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, kind, payload, attempts
+                    """,
+                    (self.lease_seconds, self.batch_size)
+                )
+                return cur.fetchall()
+
+    def retry_delay(self, attempts):
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, row):
+        started = time.perf_counter()
+        try:
+            provider_id = self.sender(row['kind'], row['payload'])
+            outcome = (row['id'], 'sent', 0.0, None, str(provider_id) if provider_id else None)
+        except PermanentNotificationError as e:
+            outcome = (row['id'], 'failed', 0.0, str(e)[:500], None)
+        except Exception as e:
+            if row['attempts'] >= self.max_attempts:
+                outcome = (row['id'], 'failed', 0.0, str(e)[:500], None)
+            else:
+                outcome = (row['id'], 'pending', self.retry_delay(row['attempts']), str(e)[:500], None)
+        with self._lock:
+            self.send_seconds += time.perf_counter() - started
+            if outcome[1] == 'sent':
+                self.sent += 1
+            elif outcome[1] == 'failed':
+                self.failed += 1
+            else:
+                self.retried += 1
+        return outcome
+
+    def process_batch(self):
+        """Claim, deliver and record one batch; returns how many notifications were handled"""
+        rows = self.claim()
+        if not rows:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(rows))) as pool:
+            outcomes = list(pool.map(self._deliver, rows))
+        with self.connection_factory() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    UPDATE notification_outbox AS o
+                    SET status = v.status,
+                        next_attempt_at = now() + make_interval(secs => v.delay),
+                        last_error = v.last_error,
+                        provider_id = COALESCE(v.provider_id, o.provider_id),
+                        sent_at = CASE WHEN v.status = 'sent' THEN now() ELSE o.sent_at END
+                    FROM (VALUES %s) AS v(id, status, delay, last_error, provider_id)
+                    WHERE o.id = v.id
+                    """,
+                    outcomes,
+                    template='(%s::bigint, %s::text, %s::float8, %s::text, %s::text)'
+                )
+        with self._lock:
+            self.batches += 1
+        return len(rows)
+
+    def prune(self):
+        """Delete sent and failed rows older than retention_days, prune_batch rows per transaction"""
+        total = 0
+        while True:
+            with self.connection_factory() as conn:
+                with conn.cursor() as cur:
+                    # SKIP LOCKED: workers in other processes pruning at the same time don't wait on each other
+                    cur.execute(
+                        """
+                        DELETE FROM notification_outbox WHERE id IN (
+                            SELECT id FROM notification_outbox
+                            WHERE status IN ('sent', 'failed')
+                              AND coalesce(sent_at, next_attempt_at) < now() - make_interval(days => %s)
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        """,
+                        (self.retention_days, self.prune_batch)
+                    )
+                    deleted = cur.rowcount
+            total += deleted
+            if deleted < self.prune_batch:
+                break
+        with self._lock:
+            self.pruned += total
+        return total
+
+    def run_forever(self):
+        while True:
+            # Clear before claiming so a wake() arriving mid-batch is not lost
+            self._wakeup.clear()
+            if self.retention_days and time.monotonic() - self._pruned_at >= self.prune_interval:
+                self._pruned_at = time.monotonic()
+                try:
+                    self.prune()
+                except Exception as e:
+                    print(f"Notification outbox prune error: {e}")
+            try:
+                # A full batch suggests a backlog, so keep draining without waiting
+                if self.process_batch() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Notification outbox error: {e}")
+            self._wakeup.wait(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                'enqueued': self.enqueued,
+                'sent': self.sent,
+                'retried': self.retried,
+                'failed': self.failed,
+                'batches': self.batches,
+                'pruned': self.pruned,
+                'retention_days': self.retention_days,
+                'avg_send_ms': round(self.send_seconds / (self.sent + self.retried + self.failed) * 1000, 1)
+                if self.sent + self.retried + self.failed else 0.0,
+                'worker_running': self._worker_pid == os.getpid()
+            }
+            loaded_at, queue = self._queue
+        if queue is None or time.monotonic() - loaded_at >= self.stats_ttl:
+            try:
+                with self.connection_factory() as conn:
+                    with conn.cursor() as cur:
+                        # Open rows only: served by the due-rows partial index, not a scan of the history
+                        cur.execute("SELECT status, count(*) AS total FROM notification_outbox "
+                                    "WHERE status IN ('pending', 'sending') GROUP BY status")
+                        queue = dict.fromkeys(('pending', 'sending'), 0)
+                        queue.update({row['status']: row['total'] for row in cur.fetchall()})
+                with self._lock:
+                    self._queue = (time.monotonic(), queue)
+            except Exception as e:
+                queue = {'error': str(e)}
+        counters['queue'] = queue
+        return counters
@@ -0,0 +1,18 @@
+"""Standalone notification outbox worker.
+
+By default each web process drains the outbox in a background thread. To keep
+Twilio calls out of the web processes entirely, run this instead:
+
+    NOTIFICATION_WORKER=off gunicorn server:app
+    python notification_worker.py
+"""
+from server import WHATSAPP_ENABLED, notification_outbox, warmup
+
+if __name__ == '__main__':
+    if not WHATSAPP_ENABLED:
+        raise SystemExit("WhatsApp notifications are disabled; nothing to deliver.")
+    # The outbox table is created by the warm-up; wait for the database first
+    warmup.start()
+    warmup.wait()
+    print("📲 Notification worker started")
+    notification_outbox.run_forever()
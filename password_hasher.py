@@ -0,0 +1,175 @@
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+class HasherBusy(Exception):
+    """The hashing pool is saturated (or too slow); the caller should answer 503 and retry later"""
+
+def _lower_priority(niceness):
+    # Hashing yields the CPU to the chat and database work in the web process
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+def _check_password(password, stored_hash):
+    return bcrypt.checkpw(password, stored_hash)
+
+def _ready():
+    return True
+
+class PasswordHasher:
+    """bcrypt hashing and verification off the request threads.
+
+    Work runs on a small, lower-priority process pool started by start(),
+    which gunicorn's post_fork hook calls while the worker is still single
+    threaded (the pool forks, and forking a threaded process is unsafe;
+    spawn/forkserver would re-import the app module in every child). Without
+    a started pool (dev server, or the pool broke) hashing runs inline on the
+    request thread, still under the same admission limit. At most workers +
+    max_pending operations are admitted at once; beyond that callers get
+    HasherBusy immediately instead of queueing behind a login burst. A
+    successful verification is remembered for verified_ttl seconds as an
+    HMAC (keyed with a per-process random secret) of the password and stored
+    hash, so a repeat login skips bcrypt. Failures are never remembered, and
+    a changed password hash invalidates the entry. workers=0 hashes inline.
+    """
+
+    def __init__(self, workers=2, max_pending=8, timeout=5, rounds=12, verified_ttl=300,
+                 max_verified=10000, niceness=5):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rounds = rounds
+        self.verified_ttl = verified_ttl
+        self.max_verified = max_verified
+        self.niceness = niceness
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_pending)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._secret = secrets.token_bytes(32)
+        self._verified = {}  # username -> (digest, expires_at)
+        self.hashed = self.verified = self.fast_path_hits = self.rejected = self.timeouts = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv('PASSWORD_HASH_WORKERS', 2)),
+            max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8)),
+            timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 5)),
+            rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+            verified_ttl=int(os.getenv('PASSWORD_VERIFIED_TTL', 300))
+        )
+
+    def start(self):
+        """Fork the hashing processes now; call before this process starts any threads"""
+        if self.workers <= 0 or 'fork' not in multiprocessing.get_all_start_methods():
+            return False
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('fork'),
+            initializer=_lower_priority, initargs=(self.niceness,)
+        )
+        # A fork-context pool forks every worker on the first submit
+        executor.submit(_ready).result()
+        with self._lock:
+            self._executor, self._executor_pid = executor, os.getpid()
+        return True
+
+    def _pool(self):
+        # A pool inherited across gunicorn's fork belongs to another process
+        with self._lock:
+            return self._executor if self._executor_pid == os.getpid() else None
+
+    def _discard_pool(self):
+        with self._lock:
+            self._executor = None
+        print("Password hashing pool broke; hashing inline until the worker restarts")
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("password hashing queue is full")
+        try:
+            pool = self._pool()
+            if pool is None:
+                try:
+                    return fn(*args)
+                finally:
+                    self._slots.release()
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard_pool()
+            self._slots.release()
+            raise HasherBusy("password hashing pool restarted")
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the work really finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise HasherBusy("password hashing timed out")
+        except BrokenProcessPool:
+            self._discard_pool()
+            raise HasherBusy("password hashing pool restarted")
+
+    def hash(self, password):
+        hashed = self._run(_hash_password, password.encode(), self.rounds)
+        with self._lock:
+            self.hashed += 1
+        return hashed
+
+    def _digest(self, password, stored_hash):
+        return hmac.new(self._secret, password.encode() + b'\0' + stored_hash.encode(), 'sha256').digest()
+
+    def verify(self, username, password, stored_hash):
+        digest = self._digest(password, stored_hash)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._verified.get(username)
+            if entry and entry[1] > now and hmac.compare_digest(entry[0], digest):
+                self.fast_path_hits += 1
+                return True
+        if not self._run(_check_password, password.encode(), stored_hash.encode()):
+            return False
+        with self._lock:
+            self.verified += 1
+            if len(self._verified) >= self.max_verified:
+                self._verified = {user: value for user, value in self._verified.items() if value[1] > now}
+                if len(self._verified) >= self.max_verified:
+                    self._verified.clear()
+            self._verified[username] = (digest, now + self.verified_ttl)
+        return True
+
+    def forget(self, username):
+        with self._lock:
+            self._verified.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pool_running': self._executor_pid == os.getpid(),
+                'max_pending': self.max_pending,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'fast_path_hits': self.fast_path_hits,
+                'rejected_busy': self.rejected,
+                'timeouts': self.timeouts,
+                'remembered_logins': len(self._verified)
+            }
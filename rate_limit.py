@@ -0,0 +1,105 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class LimitExceeded(Exception):
+    """No capacity left; the caller should answer 429 and retry later"""
+
+class RateLimiter:
+    """Token bucket per key (client IP, account name, ...).
+
+    Each key may spend `burst` requests at once and regains `rate` requests
+    per `per` seconds. Idle, full buckets are dropped once max_keys is reached.
+    """
+
+    def __init__(self, rate, per=60, burst=None, max_keys=10000):
+        self.rate = rate
+        self.per = per
+        self.burst = burst or rate
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self.allowed = self.limited = 0
+
+    def hit(self, key):
+        """Spend one token; returns 0 when allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        refill = self.rate / self.per
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * refill)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                self.allowed += 1
+                if len(self._buckets) > self.max_keys:
+                    self._prune(now, refill)
+                return 0
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            return (1 - tokens) / refill
+
+    def _prune(self, now, refill):
+        self._buckets = {
+            key: (tokens, updated_at) for key, (tokens, updated_at) in self._buckets.items()
+            if tokens + (now - updated_at) * refill < self.burst
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': f"{self.rate}/{self.per}s",
+                'burst': self.burst,
+                'tracked_keys': len(self._buckets),
+                'allowed': self.allowed,
+                'limited': self.limited
+            }
+
+class ConcurrencyLimit:
+    """Caps how many operations of one kind run at once in this process.
+
+    A caller waits up to `wait` seconds for a slot, then gets LimitExceeded,
+    so a burst sheds load instead of tying up every request thread.
+    """
+
+    def __init__(self, limit, wait=0.0):
+        self.limit = limit
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = self.peak = self.admitted = self.rejected = 0
+
+    def acquire(self):
+        acquired = self._slots.acquire(timeout=self.wait) if self.wait > 0 else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        if not self.acquire():
+            raise LimitExceeded(f"more than {self.limit} operations in flight")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'peak': self.peak,
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,212 @@
+import os
+import re
+import time
+import zlib
+import threading
+
+from llm_cache import normalize_message
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Collapse common pet-care paraphrases onto one token before embedding locally
+SYNONYMS = {
+    'frequently': 'often', 'regularly': 'often', 'usually': 'often',
+    'shot': 'vaccine', 'shots': 'vaccine', 'jab': 'vaccine', 'jabs': 'vaccine',
+    'vaccines': 'vaccine', 'vaccinate': 'vaccine', 'vaccinated': 'vaccine',
+    'vaccination': 'vaccine', 'vaccinations': 'vaccine', 'immunize': 'vaccine',
+    'puppies': 'puppy', 'pup': 'puppy', 'pups': 'puppy',
+    'kittens': 'kitten', 'dogs': 'dog', 'cats': 'cat', 'doggy': 'dog', 'kitty': 'cat',
+    'feed': 'food', 'feeding': 'food', 'eat': 'food', 'eating': 'food', 'meals': 'food',
+    'spay': 'neuter', 'spayed': 'neuter', 'spaying': 'neuter', 'neutered': 'neuter', 'neutering': 'neuter',
+    'deworm': 'worm', 'deworming': 'worm', 'worms': 'worm', 'dewormer': 'worm',
+    'fleas': 'flea', 'ticks': 'tick', 'teeth': 'dental', 'tooth': 'dental',
+    'groom': 'grooming', 'bath': 'grooming', 'bathe': 'grooming', 'baths': 'grooming',
+    'costs': 'price', 'cost': 'price', 'charge': 'price', 'fees': 'price', 'fee': 'price',
+    'sick': 'ill', 'unwell': 'ill', 'vomiting': 'vomit', 'throwing': 'vomit', 'puking': 'vomit',
+}
+# Question words that survive the cache stopword list but say little about the
+# topic; they are down-weighted rather than dropped
+LOW_WEIGHT_WORDS = frozenset('need needs get give have has much many often time times ok okay '
+                              'can could would will shall may might must should what whats which who how'.split())
+# Words that flip a question's meaning; "n't" leaves a lone "t" once punctuation is stripped
+NEGATIONS = frozenset('not no never without nor cannot dont doesnt isnt cant shouldnt wont t'.split())
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class HashingEmbedder:
+    """Offline embedding stand-in: hashed words plus character trigrams.
+
+    Deterministic and dependency-free apart from NumPy, so hit rates can be
+    measured on a recorded question set without network access. Word hashes
+    cannot tell "chicken" from "chicken bones" or "vomiting" from "not
+    vomiting", so a match must also share every topic word (signature).
+    """
+
+    name = 'local-hashing'
+    default_threshold = 0.8
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _words(self, text):
+        return [SYNONYMS.get(word, word) for word in TOKEN_PATTERN.findall(normalize_message(text))]
+
+    def signature(self, text):
+        """Topic words and negations a cached question must share with the one asked"""
+        return frozenset(word for word in self._words(text) if word not in LOW_WEIGHT_WORDS)
+
+    def _features(self, text):
+        words = self._words(text)
+        features = [(f"w:{word}", 0.5 if word in LOW_WEIGHT_WORDS else 1.0) for word in words]
+        for word in words:
+            padded = f" {word} "
+            features += [(f"c:{padded[i:i + 3]}", 0.25) for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = zlib.crc32(feature.encode())
+            sign = 1.0 if digest & 1 else -1.0
+            vector[(digest >> 1) % self.dim] += sign * weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI API (one extra, much cheaper, round trip per miss)"""
+
+    name = 'openai'
+    default_threshold = 0.92
+
+    def __init__(self, client_factory, model='text-embedding-3-small'):
+        self.client_factory = client_factory  # Called per embed, so the client can be built lazily
+        self.model = model
+
+    def signature(self, text):
+        """Negations a cached question must share with the one asked; embeddings rank them weakly"""
+        return frozenset(word for word in TOKEN_PATTERN.findall(normalize_message(text)) if word in NEGATIONS)
+
+    def embed(self, text):
+        client = self.client_factory()
+        if client is None:
+            raise RuntimeError("OpenAI client is not available")
+        response = client.embeddings.create(model=self.model, input=normalize_message(text), timeout=5)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class SemanticCache:
+    """Answer cache keyed by question meaning rather than exact text.
+
+    Unit-normalized question embeddings live in one contiguous NumPy matrix,
+    so a lookup is a single matrix-vector product. A match above the
+    threshold only counts when the embedder's signature of both questions
+    agrees; lookups refused only for that count as near misses. When full,
+    the oldest entry is overwritten (ring buffer); expired entries never match.
+    """
+
+    def __init__(self, embedder, threshold=None, max_entries=2000, ttl=3600):
+        self.embedder = embedder
+        self.threshold = threshold if threshold is not None else embedder.default_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors = None
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._answers = [None] * max_entries
+        self._questions = [None] * max_entries
+        self._signatures = [None] * max_entries
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.near_misses = 0
+        self.lookup_seconds = 0.0
+
+    def lookup(self, question):
+        """Return (answer, similarity, matched_question) or None below the threshold"""
+        started = time.perf_counter()
+        vector = self.embedder.embed(question)
+        signature = self.embedder.signature(question)
+        with self._lock:
+            result = None
+            if self._size:
+                scores = self._vectors[:self._size] @ vector
+                scores[self._expires[:self._size] <= time.time()] = -1.0
+                candidates = np.flatnonzero(scores >= self.threshold)
+                # Best-scoring candidate whose signature agrees; usually the first one
+                for index in candidates[np.argsort(-scores[candidates])]:
+                    if self._signatures[index] == signature:
+                        result = (self._answers[index], float(scores[index]), self._questions[index])
+                        break
+                self.near_misses += result is None and len(candidates) > 0
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.lookup_seconds += time.perf_counter() - started
+        return result
+
+    def store(self, question, answer):
+        vector = self.embedder.embed(question)
+        signature = self.embedder.signature(question)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._vectors[slot] = vector
+            self._expires[slot] = time.time() + self.ttl
+            self._answers[slot] = answer
+            self._questions[slot] = question
+            self._signatures[slot] = signature
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._next = 0
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'embedder': self.embedder.name,
+                'threshold': self.threshold,
+                'entries': self._size,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'near_misses': self.near_misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'avg_lookup_ms': round(self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0
+            }
+
+def create_semantic_cache(openai_client_factory=None):
+    """Build the semantic cache selected by SEMANTIC_CACHE (local, openai or off)
+
+    openai_client_factory returns the OpenAI client (or None) when first needed.
+    """
+    mode = os.getenv('SEMANTIC_CACHE', 'local').lower()
+    if mode == 'off':
+        return None
+    if np is None:
+        print("Warning: numpy not installed. Semantic answer cache disabled.")
+        return None
+    if mode == 'openai' and openai_client_factory is not None:
+        embedder = OpenAIEmbedder(openai_client_factory, os.getenv('SEMANTIC_CACHE_MODEL', 'text-embedding-3-small'))
+    else:
+        embedder = HashingEmbedder()
+    threshold = os.getenv('SEMANTIC_CACHE_THRESHOLD')
+    return SemanticCache(
+        embedder,
+        threshold=float(threshold) if threshold else None,
+        max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 2000)),
+        ttl=int(os.getenv('SEMANTIC_CACHE_TTL', 3600))
+    )
@@ -1,74 +1,134 @@
-import os
 import time as time_module
+IMPORT_STARTED = time_module.perf_counter()  # Startup budget is measured from here
+import os
 import hashlib
 import json
-import decimal
 import traceback
-import bcrypt
+import queue
+import threading
 import psycopg2
-from datetime import datetime, timedelta, time, date
-from flask import Flask, request, jsonify, session, redirect, url_for, send_from_directory, render_template
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, time, date
+from flask import Flask, Response, request, jsonify, session, redirect, render_template, stream_with_context, g, has_app_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask.json.provider import DefaultJSONProvider
-from sqlalchemy import text
-from openai import OpenAI
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
-from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
 from psycopg2.extras import RealDictCursor
-import re
-
-# Simple in-memory cache for common responses
-response_cache = {}
-CACHE_TTL = 300  # 5 minutes cache
+from llm_cache import create_cache, cache_key
+from semantic_cache import create_semantic_cache
+from intent_matcher import IntentMatcher
+from availability import AvailabilityEngine
+from slot_booking import SlotBooker, SlotUnavailable
+from appointment_transfer import AppointmentTransfer, ImportRejected
+from appointment_analytics import AppointmentAnalytics, ROLLUP_SCHEMA_STATEMENTS
+from static_assets import StaticAssets
+from json_encoding import create_json_provider
+from change_feed import ChangeListener
+from notification_outbox import NotificationOutbox, PermanentNotificationError
+from metrics import MetricsRegistry
+from password_hasher import PasswordHasher, HasherBusy
+from rate_limit import RateLimiter, ConcurrencyLimit, LimitExceeded
+from warmup import Warmup
+from single_flight import SingleFlight
+from llm_client import ResilientLLM, CircuitOpen
+from appointment_parser import AppointmentParser, PROBLEM_TEXT
+from conversation_state import Conversation, ConversationStore
 
 load_dotenv()
 
-# Initialize OpenAI client with error handling
-try:
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    client = OpenAI(api_key=openai_api_key)
-except Exception as e:
-    print(f"Warning: OpenAI client initialization failed: {e}")
-    client = None
+# Prometheus-style metrics served at /metrics; METRICS_ENABLED=false turns spans into no-ops
+metrics = MetricsRegistry(enabled=os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'off'))
+REQUEST_SECONDS = metrics.histogram(
+    'vet_clinic_http_request_duration_seconds', 'Request latency (the _count series is the per-route request counter)',
+    ['route', 'method', 'status']
+)
+STAGE_SECONDS = metrics.histogram('vet_clinic_stage_duration_seconds', 'Time spent in each hot-path stage', ['stage'])
+CHAT_MESSAGE_SECONDS = metrics.histogram('vet_clinic_chat_message_duration_seconds', 'Chat reply latency by message type', ['type'])
+LLM_CALLS = metrics.counter('vet_clinic_llm_calls_total', 'OpenAI chat completion calls', ['purpose'])
+
+# Intents and quick replies, compiled once into a single word-boundary regex
+intent_matcher = IntentMatcher.from_file(
+    os.getenv('INTENTS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intents.json'))
+)
+
+# Well-formed booking messages are parsed locally instead of costing an LLM call
+appointment_parser = AppointmentParser.from_env()
+
+# Booking details and recent turns per chat session, so a booking can be
+# completed over several messages (CONVERSATION_* settings)
+conversation_store = ConversationStore.from_env()
+
+# Bounded cache for LLM responses (in-process LRU or shared SQLite, see CACHE_BACKEND)
+CACHE_TTL = int(os.getenv('CACHE_TTL', 300))  # 5 minutes cache
+response_cache = create_cache(CACHE_TTL)
+
+# The OpenAI and Twilio clients are built on first use (or by the warm-up):
+# importing openai alone takes about a second of every cold start
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+openai_client = None
+openai_client_loaded = False
+twilio_client = None
+twilio_client_loaded = False
+clients_lock = threading.Lock()
+
+def get_openai_client():
+    """The shared OpenAI client, or None when it is not configured"""
+    global openai_client, openai_client_loaded
+    if not openai_client_loaded:
+        with clients_lock:
+            if not openai_client_loaded:
+                try:
+                    if not OPENAI_API_KEY:
+                        raise ValueError("OPENAI_API_KEY environment variable is not set")
+                    from openai import OpenAI
+                    # Retries are ResilientLLM's job, so the circuit breaker sees every failure
+                    openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+                except Exception as e:
+                    print(f"Warning: OpenAI client initialization failed: {e}")
+                openai_client_loaded = True
+    return openai_client
+
+# Answers near-duplicate questions from earlier replies (SEMANTIC_CACHE=local|openai|off)
+semantic_cache = create_semantic_cache(get_openai_client)
 
 # Twilio configuration for WhatsApp notifications
-try:
-    TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-    TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-    TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')  # Format: whatsapp:+14155238886
-    ADMIN_WHATSAPP_NUMBER = os.getenv('ADMIN_WHATSAPP_NUMBER')  # Format: whatsapp:+1234567890
-    
-    if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        WHATSAPP_ENABLED = True
-    else:
-        WHATSAPP_ENABLED = False
-        print("Warning: Twilio credentials not found. WhatsApp notifications disabled.")
-except ImportError:
-    WHATSAPP_ENABLED = False
-    print("Warning: Twilio not installed. WhatsApp notifications disabled.")
+TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
+TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
+TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')  # Format: whatsapp:+14155238886
+ADMIN_WHATSAPP_NUMBER = os.getenv('ADMIN_WHATSAPP_NUMBER')  # Format: whatsapp:+1234567890
+WHATSAPP_ENABLED = bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN)
+if not WHATSAPP_ENABLED:
+    print("Warning: Twilio credentials not found. WhatsApp notifications disabled.")
+
+def get_twilio_client():
+    """The shared Twilio client, or None when it can't be built"""
+    global twilio_client, twilio_client_loaded
+    if not twilio_client_loaded:
+        with clients_lock:
+            if not twilio_client_loaded:
+                try:
+                    from twilio.rest import Client
+                    from twilio.http.http_client import TwilioHttpClient
+                    # Bounded HTTP timeout so a hung Twilio call can't pin a notification worker thread
+                    twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=TwilioHttpClient(timeout=10))
+                    if os.getenv('TWILIO_API_BASE_URL'):
+                        # Local stand-in for testing, see benchmarks/fake_twilio.py
+                        twilio_client.api.base_url = os.getenv('TWILIO_API_BASE_URL')
+                except ImportError:
+                    print("Warning: Twilio not installed. WhatsApp notifications disabled.")
+                twilio_client_loaded = True
+    return twilio_client
 
-app = Flask(__name__, template_folder='templates', static_folder='static')
+# Hashed, precompressed assets from `python static_assets.py` (when built) and cached page renders
+static_assets = StaticAssets.from_env(os.path.dirname(os.path.abspath(__file__)))
+app = Flask(__name__, template_folder=static_assets.page_template_dir, static_folder='static')
 CORS(app, supports_credentials=True)
 app.secret_key = os.getenv('SECRET_KEY', 'supersecretkey')
 
-# Custom JSON provider to handle datetime and time objects
-class CustomJSONProvider(DefaultJSONProvider):
-    def default(self, obj):
-        if isinstance(obj, time):
-            return obj.strftime('%H:%M:%S')
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        if isinstance(obj, date):
-            return obj.isoformat()
-        if isinstance(obj, decimal.Decimal):
-            return float(obj)
-        return super().default(obj)
-
-app.json = CustomJSONProvider(app)
+# JSON with datetime/date/time/Decimal support; orjson-backed when installed (JSON_SERIALIZER)
+app.json = create_json_provider(app, timer=lambda: STAGE_SECONDS.time('json_serialization'))
 
 # Configure PostgreSQL database
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -78,122 +138,322 @@ if not DATABASE_URL:
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 10,
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 5)),  # Hard cap: pool_size + max_overflow connections
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 5)),  # Seconds to wait for a free connection
     'pool_recycle': 120,
     'pool_pre_ping': True
 }
 
 db = SQLAlchemy(app)
 
-def get_quick_response(message):
+# All routes borrow raw psycopg2 connections from the SQLAlchemy engine pool
+# configured above instead of opening a new connection per request.
+with app.app_context():
+    db_engine = db.engine
+
+pool_stats = {
+    'checkouts': 0,
+    'checkout_errors': 0,
+    'checkout_timeouts': 0,
+    'invalidated': 0,
+    'checkout_wait_total_ms': 0.0,
+    'checkout_wait_max_ms': 0.0
+}
+pool_stats_lock = threading.Lock()
+
+def get_pool_status():
+    """Snapshot of connection pool occupancy and checkout timings"""
+    pool = db_engine.pool
+    with pool_stats_lock:
+        stats = dict(pool_stats)
+    checkouts = stats['checkouts']
+    stats['checkout_wait_avg_ms'] = round(stats['checkout_wait_total_ms'] / checkouts, 3) if checkouts else 0.0
+    stats['checkout_wait_total_ms'] = round(stats['checkout_wait_total_ms'], 3)
+    stats['checkout_wait_max_ms'] = round(stats['checkout_wait_max_ms'], 3)
+    stats.update({
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'max_connections': pool.size() + app.config['SQLALCHEMY_ENGINE_OPTIONS']['max_overflow']
+    })
+    return stats
+
+def get_quick_response(message, intents=None):
     """Get instant responses for common questions without using LLM"""
-    message_lower = message.lower().strip()
-    
-    # Fast responses for common questions
-    quick_responses = {
-        'hello': "Hello! Welcome to Dr. Venky Pet Clinic! 🐾 How can I help you today?",
-        'hi': "Hi there! Welcome to Dr. Venky Pet Clinic! 🐾 How can I assist you?",
-        'hours': "🕒 **Clinic Hours**: Monday-Saturday, 9 AM - 6 PM\n\nWe're closed on Sundays. For emergencies, please call our emergency line.",
-        'services': "🏥 **Our Services**:\n• General health checkups\n• Vaccinations\n• Surgery\n• Emergency care\n• Dental care\n• Grooming\n• Pet boarding",
-        'location': "📍 We're located at Dr. Venky Pet Clinic. Please call us for exact directions and parking information.",
-        'price': "💰 For pricing information, please call us or visit in person. Costs vary based on your pet's needs.",
-        'emergency': "🚨 **Emergency**: If this is a pet emergency, please call us immediately or visit the nearest emergency vet clinic!"
-    }
-    
-    # Check for exact matches or partial matches
-    for key, response in quick_responses.items():
-        if key in message_lower or message_lower == key:
-            return response
-    
-    # Check for greeting patterns
-    if any(word in message_lower for word in ['hello', 'hi', 'hey', 'good morning', 'good afternoon']):
-        return "Hello! Welcome to Dr. Venky Pet Clinic! 🐾 How can I help you and your pet today?"
-    
-    return None
+    if intents is None:
+        intents = intent_matcher.classify(message)
+    return intents.reply
 
 def get_cached_response(message):
-    """Check if we have a cached response for similar messages"""
-    message_hash = hashlib.md5(message.lower().strip().encode()).hexdigest()
-    current_time = time_module.time()
-    
-    if message_hash in response_cache:
-        cached_data = response_cache[message_hash]
-        if current_time - cached_data['timestamp'] < CACHE_TTL:
-            return cached_data['response']
-        else:
-            # Clean expired cache
-            del response_cache[message_hash]
+    """Check if we have a cached response for similar (normalized) messages"""
+    with STAGE_SECONDS.time('cache_lookup'):
+        return response_cache.get(message)
+
+def get_semantic_cached_response(message):
+    """Find a cached answer to a differently worded question with the same meaning"""
+    if semantic_cache is None:
+        return None
+    try:
+        with STAGE_SECONDS.time('semantic_cache_lookup'):
+            match = semantic_cache.lookup(message)
+    except Exception as e:
+        print(f"Semantic cache lookup error: {e}")
+        return None
+    if match:
+        answer, similarity, cached_question = match
+        print(f"Semantic cache hit ({similarity:.2f}) for: {message[:50]} ~ {cached_question[:50]}")
+        return answer
     return None
 
 def cache_response(message, response):
     """Cache a response for future use"""
-    message_hash = hashlib.md5(message.lower().strip().encode()).hexdigest()
-    response_cache[message_hash] = {
-        'response': response,
-        'timestamp': time_module.time()
-    }
+    response_cache.set(message, response)
+    if semantic_cache is not None:
+        try:
+            semantic_cache.store(message, response)
+        except Exception as e:
+            print(f"Semantic cache store error: {e}")
+
+def connection_lost(conn, error):
+    """Whether error means the connection itself is gone, rather than one statement failing on it"""
+    driver = conn.driver_connection
+    if driver is None or driver.closed:
+        return True
+    if isinstance(error, psycopg2.InterfaceError):
+        return True
+    # Server-reported errors carry a SQLSTATE; disconnects seen by libpq do not
+    return isinstance(error, psycopg2.OperationalError) and error.pgcode is None
+
+def invalidate_connection(conn):
+    with pool_stats_lock:
+        pool_stats['invalidated'] += 1
+    conn.invalidate()
 
+@contextmanager
 def get_db_connection():
-    """Get a database connection using the Supabase connection pooler."""
+    """Borrow a pooled database connection; commits on success, rolls back on error and returns it to the pool."""
+    started = time_module.perf_counter()
     try:
-        # The DATABASE_URL should now be the connection pooler URL from Supabase
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.cursor_factory = RealDictCursor
-        return conn
+        conn = db_engine.raw_connection()
+    except PoolTimeoutError as e:
+        with pool_stats_lock:
+            pool_stats['checkout_timeouts'] += 1
+        print(f"Database pool exhausted, no connection available: {e}")
+        raise
     except psycopg2.OperationalError as e:
+        with pool_stats_lock:
+            pool_stats['checkout_errors'] += 1
         print(f"FATAL: Could not connect to the database. Error: {e}")
         print("💡 Suggestion: Check your DATABASE_URL environment variable. Ensure it is the Supabase Connection Pooler URL (port 6543).")
         raise
     except Exception as e:
+        with pool_stats_lock:
+            pool_stats['checkout_errors'] += 1
         print(f"FATAL: An unexpected error occurred during database connection. Error: {e}")
         raise
 
+    waited_ms = (time_module.perf_counter() - started) * 1000
+    with pool_stats_lock:
+        pool_stats['checkouts'] += 1
+        pool_stats['checkout_wait_total_ms'] += waited_ms
+        pool_stats['checkout_wait_max_ms'] = max(pool_stats['checkout_wait_max_ms'], waited_ms)
+
+    conn.driver_connection.cursor_factory = RealDictCursor
+    try:
+        yield conn
+        conn.commit()
+    except BaseException as e:
+        if connection_lost(conn, e):
+            # Broken connection: drop it from the pool instead of handing it out again
+            invalidate_connection(conn)
+            raise
+        # A failed statement on a live connection (query cancelled, deadlock,
+        # serialization failure): roll back and keep the connection pooled
+        try:
+            conn.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            invalidate_connection(conn)
+        raise
+    finally:
+        if conn.driver_connection is not None:
+            conn.driver_connection.cursor_factory = None
+        conn.close()
+
+# Idempotent schema additions, applied at startup by the first worker after they change (see ensure_schema)
+SCHEMA_STATEMENTS = [
+    # Availability lookups read one date window at a time
+    'CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments (date, time)',
+    # Status-filtered admin listings page through ids newest first
+    'CREATE INDEX IF NOT EXISTS idx_appointments_status_id ON appointments (status, id)',
+    # At most one active appointment per exact (date, time), whoever writes it; skipped (with a
+    # warning in the database log) while existing rows double-book a slot, until they are resolved
+    """DO $$
+    BEGIN
+        IF to_regclass('idx_appointments_active_slot') IS NULL THEN
+            IF EXISTS (SELECT 1 FROM appointments WHERE status IS DISTINCT FROM 'cancelled'
+                       GROUP BY date, time HAVING count(*) > 1) THEN
+                RAISE WARNING 'appointments double-books some slots; idx_appointments_active_slot not created';
+            ELSE
+                CREATE UNIQUE INDEX idx_appointments_active_slot ON appointments (date, time)
+                    WHERE status IS DISTINCT FROM 'cancelled';
+            END IF;
+        END IF;
+    END
+    $$""",
+    # Change feed: every insert/update stamps the row with the next change_seq
+    # and notifies live dashboards (delivered when the writing transaction commits);
+    # bulk imports set vet_clinic.bulk_load and send one notification for the whole load
+    'CREATE SEQUENCE IF NOT EXISTS appointment_change_seq',
+    'ALTER TABLE appointments ADD COLUMN IF NOT EXISTS change_seq BIGINT',
+    "UPDATE appointments SET change_seq = nextval('appointment_change_seq') WHERE change_seq IS NULL",
+    'CREATE INDEX IF NOT EXISTS idx_appointments_change_seq ON appointments (change_seq)',
+    # ...and with the writing transaction's id, which /appointments/changes compares against
+    # snapshot xmins; unlike change_seq it cannot be overtaken by a later commit
+    'ALTER TABLE appointments ADD COLUMN IF NOT EXISTS change_xid xid8',
+    "UPDATE appointments SET change_xid = pg_current_xact_id() WHERE change_xid IS NULL",
+    'CREATE INDEX IF NOT EXISTS idx_appointments_change_xid ON appointments (change_xid)',
+    """CREATE OR REPLACE FUNCTION appointments_track_change() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_seq := nextval('appointment_change_seq');
+        NEW.change_xid := pg_current_xact_id();
+        IF current_setting('vet_clinic.bulk_load', true) IS DISTINCT FROM 'on' THEN
+            PERFORM pg_notify('appointment_changes', json_build_object('id', NEW.id, 'change_seq', NEW.change_seq)::text);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS appointments_track_change ON appointments',
+    'CREATE TRIGGER appointments_track_change BEFORE INSERT OR UPDATE ON appointments '
+    'FOR EACH ROW EXECUTE FUNCTION appointments_track_change()',
+    # Outbound notifications are queued in the booking transaction and sent by a background worker
+    """CREATE TABLE IF NOT EXISTS notification_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        last_error TEXT,
+        provider_id TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        sent_at TIMESTAMPTZ
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (next_attempt_at) "
+    "WHERE status IN ('pending', 'sending')",
+    # Per-day/service/status counts kept current by triggers, for the dashboard and /appointments/analytics
+    *ROLLUP_SCHEMA_STATEMENTS,
+]
+
+# Applied schemas are recorded by a hash of SCHEMA_STATEMENTS, so the DDL (trigger swaps take
+# ACCESS EXCLUSIVE on appointments) runs once per deploy that changes it, not in every worker start
+SCHEMA_VERSION = hashlib.md5('\n'.join(SCHEMA_STATEMENTS).encode()).hexdigest()
+# Held while a worker checks and applies the schema; the others wait, then find it applied
+SCHEMA_LOCK_KEY = 20260601
+
+def ensure_schema(cur):
+    """Apply SCHEMA_STATEMENTS unless this version is already in place; True if it was applied"""
+    cur.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_KEY,))
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS schema_versions (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )"""
+    )
+    cur.execute('SELECT 1 FROM schema_versions WHERE version = %s', (SCHEMA_VERSION,))
+    if cur.fetchone():
+        return False
+    for statement in SCHEMA_STATEMENTS:
+        cur.execute(statement)
+    cur.execute('INSERT INTO schema_versions (version) VALUES (%s)', (SCHEMA_VERSION,))
+    return True
+
 def init_db():
-    """Initialize and test the database connection. The application will not start if this fails."""
-    print("Attempting to initialize database connection using the connection pooler...")
+    """Test the database connection and apply the schema additions; raises on failure"""
+    print("Attempting to initialize database connection pool...")
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1")
                 print("✅ Database connection test successful.")
+                if ensure_schema(cur):
+                    print(f"✅ Database schema {SCHEMA_VERSION[:12]} applied.")
     except Exception as e:
-        print(f"❌ Database initialization FAILED. The application cannot start. Error: {e}")
-        # Re-raise the exception to halt the application startup process.
+        print(f"❌ Database initialization FAILED, the app is not ready yet. Error: {e}")
         raise
 
-# Initialize database when the module is imported
-try:
+# Booked-slot bitmaps per day; see CLINIC_OPEN_HOUR, SLOT_MINUTES, BOOKING_HORIZON_DAYS
+availability_engine = AvailabilityEngine.from_env(get_db_connection)
+
+# Books each appointment atomically into a free slot (BOOKING_MAX_ATTEMPTS slots tried on conflicts)
+slot_booker = SlotBooker.from_env(availability_engine)
+
+# Pushes appointment change notifications to /appointments/stream subscribers
+change_listener = ChangeListener(
+    os.getenv('DATABASE_LISTEN_URL', DATABASE_URL),
+    max_subscribers=int(os.getenv('CHANGE_STREAM_MAX_SUBSCRIBERS', 4))
+)
+
+# Nothing connects at import time. The warm-up runs in the background of each
+# process (gunicorn's post_fork hook, or the first request) and gates /ready.
+warmup = Warmup.from_env(IMPORT_STARTED)
+
+@warmup.step('database', required=True)
+def warm_database():
     init_db()
     print("✅ Database is ready.")
-except Exception:
-    # The error is already printed in init_db, just re-raise to stop the app
-    raise
 
-def send_whatsapp_notification(appointment_data):
-    """Send WhatsApp notification to admin about new appointment"""
-    if not WHATSAPP_ENABLED:
-        print("WhatsApp notifications are disabled.")
-        return False
-    
-    if not ADMIN_WHATSAPP_NUMBER or not TWILIO_WHATSAPP_NUMBER:
-        print("WhatsApp numbers not configured properly.")
-        return False
-    
-    try:
-        # Safely get values with fallbacks for None/missing data
-        apt_id = appointment_data.get('id', 'Unknown')
-        name = appointment_data.get('name', 'Not provided') or 'Not provided'
-        pet_name = appointment_data.get('pet_name', 'Not provided') or 'Not provided'
-        phone = appointment_data.get('phone', 'Not provided') or 'Not provided'
-        date = appointment_data.get('date', 'Not specified') or 'Not specified'
-        time = appointment_data.get('time', 'Not specified') or 'Not specified'
-        service = appointment_data.get('service', 'General consultation') or 'General consultation'
-        notes = appointment_data.get('notes', '') or ''
-        status = appointment_data.get('status', 'scheduled') or 'scheduled'
-        created_at = appointment_data.get('created_at', 'Unknown') or 'Unknown'
-        
-        # Format the appointment message
-        message = f"""🏥 NEW APPOINTMENT REQUEST 🏥
+@warmup.step('db_pool')
+def warm_db_pool():
+    # Open a few pooled connections up front so the first requests skip the TLS handshake
+    with ExitStack() as stack:
+        for _ in range(min(int(os.getenv('WARMUP_DB_CONNECTIONS', 2)), db_engine.pool.size())):
+            with stack.enter_context(get_db_connection()).cursor() as cur:
+                cur.execute('SELECT 1')
+
+@warmup.step('openai_client')
+def warm_openai_client():
+    if OPENAI_API_KEY and get_openai_client() is None:
+        raise RuntimeError("OpenAI client could not be built")
+
+@warmup.step('twilio_client')
+def warm_twilio_client():
+    if WHATSAPP_ENABLED and get_twilio_client() is None:
+        raise RuntimeError("Twilio client could not be built")
+
+@warmup.step('availability')
+def warm_availability():
+    availability_engine.available_slots(limit=10)
+
+@warmup.step('templates')
+def warm_templates():
+    # Render (and compress) every page once so the first visitors get the cached copy
+    with app.test_request_context():
+        for template in ('index.html', 'login.html', 'admin.html', 'profile.html'):
+            static_assets.page(template, lambda: render_template(template), None)
+
+@app.before_request
+def start_warmup():
+    # Covers servers without the post_fork hook (flask run, python server.py)
+    warmup.start()
+
+def format_appointment_notification(appointment_data):
+    """WhatsApp message text for a new appointment"""
+    # Safely get values with fallbacks for None/missing data
+    apt_id = appointment_data.get('id', 'Unknown')
+    name = appointment_data.get('name', 'Not provided') or 'Not provided'
+    pet_name = appointment_data.get('pet_name', 'Not provided') or 'Not provided'
+    phone = appointment_data.get('phone', 'Not provided') or 'Not provided'
+    date = appointment_data.get('date', 'Not specified') or 'Not specified'
+    time = appointment_data.get('time', 'Not specified') or 'Not specified'
+    service = appointment_data.get('service', 'General consultation') or 'General consultation'
+    notes = appointment_data.get('notes', '') or ''
+    status = appointment_data.get('status', 'scheduled') or 'scheduled'
+    created_at = appointment_data.get('created_at', 'Unknown') or 'Unknown'
+
+    # Format the appointment message
+    return f"""🏥 NEW APPOINTMENT REQUEST 🏥
 
 📋 Appointment Details:
 • ID: #{apt_id}
@@ -210,15 +470,42 @@ def send_whatsapp_notification(appointment_data):
 
 Please review and confirm this appointment in your admin panel."""
 
-        # Send WhatsApp message using Twilio
-        message_instance = twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=ADMIN_WHATSAPP_NUMBER
-        )
-        
-        print(f"WhatsApp notification sent successfully. Message SID: {message_instance.sid}")
-        print(f"Message status: {message_instance.status}")
+def deliver_notification(kind, payload):
+    """Notification outbox sender: returns the Twilio message SID or raises so the outbox retries"""
+    if kind != 'appointment_whatsapp':
+        raise PermanentNotificationError(f"Unknown notification kind '{kind}'")
+    if not WHATSAPP_ENABLED or not ADMIN_WHATSAPP_NUMBER or not TWILIO_WHATSAPP_NUMBER:
+        raise PermanentNotificationError("WhatsApp notifications are not configured")
+    twilio = get_twilio_client()
+    if twilio is None:
+        raise PermanentNotificationError("Twilio client is not available")
+    try:
+        with STAGE_SECONDS.time('whatsapp_send'):
+            message_instance = twilio.messages.create(
+                body=format_appointment_notification(payload),
+                from_=TWILIO_WHATSAPP_NUMBER,
+                to=ADMIN_WHATSAPP_NUMBER
+            )
+    except TwilioRestException as e:
+        # Client errors other than rate limiting won't succeed on retry
+        if 400 <= e.status < 500 and e.status != 429:
+            raise PermanentNotificationError(f"Twilio rejected the message ({e.status}): {e.msg}")
+        raise
+    print(f"WhatsApp notification sent successfully. Message SID: {message_instance.sid}")
+    return message_instance.sid
+
+def send_whatsapp_notification(appointment_data):
+    """Send WhatsApp notification to admin about new appointment"""
+    if not WHATSAPP_ENABLED:
+        print("WhatsApp notifications are disabled.")
+        return False
+    
+    if not ADMIN_WHATSAPP_NUMBER or not TWILIO_WHATSAPP_NUMBER:
+        print("WhatsApp numbers not configured properly.")
+        return False
+    
+    try:
+        deliver_notification('appointment_whatsapp', appointment_data)
         print(f"To: {ADMIN_WHATSAPP_NUMBER}")
         print(f"From: {TWILIO_WHATSAPP_NUMBER}")
         return True
@@ -229,77 +516,195 @@ Please review and confirm this appointment in your admin panel."""
         traceback.print_exc()  # Print full error details for debugging
         return False
 
-def extract_appointment_info(message):
-    """Extract appointment information from user message using AI with optimization"""
+# Booking notifications go through a Postgres outbox so bookings never wait on Twilio
+notification_outbox = NotificationOutbox.from_env(get_db_connection, deliver_notification)
+NOTIFICATION_WORKER = os.getenv('NOTIFICATION_WORKER', 'thread').lower()  # "off" when notification_worker.py runs separately
+
+@app.before_request
+def start_notification_worker():
+    # Also drains rows left pending by a previous process, not just new bookings
+    if WHATSAPP_ENABLED and NOTIFICATION_WORKER == 'thread':
+        notification_outbox.ensure_worker()
+
+CHAT_MODEL = "gpt-3.5-turbo-0125"  # Faster variant
+
+# Every chat completion goes through this: adaptive timeouts, retries, a circuit
+# breaker that sends traffic to the local fallbacks during outages, optional
+# hedging and per-purpose token/cost accounting (LLM_* settings)
+llm = ResilientLLM.from_env(get_openai_client, CHAT_MODEL)
+
+CHAT_SYSTEM_PROMPT = """You are Dr. Venky Pet Clinic assistant. Answer pet care questions briefly and professionally.
+
+Services: General checkups, Vaccinations, Surgery, Emergency care, Dental care, Grooming, Pet boarding
+Hours: Mon-Sat, 9 AM - 6 PM
+
+For appointments: Ask for name, pet name, preferred date/time."""
+
+OFFLINE_CHAT_REPLY = """Hello! Welcome to Dr. Venky Pet Clinic. 
+                    
+I'm here to help with your pet care needs. Our services include:
+- General health checkups
+- Vaccinations  
+- Surgery
+- Emergency care
+- Dental care
+- Grooming
+- Pet boarding
+
+Clinic hours: Monday-Saturday, 9 AM - 6 PM
+
+For appointments, please provide your name, pet's name, and preferred date/time."""
+
+CHAT_ERROR_REPLY = "Sorry, I couldn't process your request right now. Please try again or call us directly."
+
+BOOKING_DETAILS_REPLY = """I'd be happy to book an appointment for you. Please send your name, your pet's name and the date and time you'd like (we're open Monday-Saturday, 9 AM - 6 PM), or call us directly."""
+
+BOOKING_CANCELLED_REPLY = "No problem, I've dropped that booking. Let me know if you'd like to book another time or have any questions."
+
+SLOT_TAKEN_REPLY = """Sorry, that time has just been booked by someone else and we couldn't find a free slot right after it. Please send another date and time (we're open Monday-Saturday, 9 AM - 6 PM), or call us directly."""
+
+LLM_BUSY_REPLY = "We're answering a lot of questions right now. Please try again in a few seconds."
+
+# In-flight LLM calls per process. Past the budget /chat answers 429 rather than
+# parking another request thread on OpenAI; gunicorn.conf.py derives the default
+# from the thread count so quick replies and health checks always get a thread.
+llm_budget = ConcurrencyLimit(int(os.getenv('LLM_MAX_IN_FLIGHT', 6)), wait=float(os.getenv('LLM_QUEUE_WAIT', 0.5)))
+
+def llm_busy():
+    """429 telling the client to come back after about one average LLM call"""
+    count, total = STAGE_SECONDS.snapshot('llm_chat')
+    retry_after = min(10, max(1, round(total / count))) if count else 2
+    return jsonify({'reply': LLM_BUSY_REPLY}), 429, {'Retry-After': str(retry_after)}
+
+ANALYZE_SYSTEM_PROMPT = """You are Dr. Venky Pet Clinic assistant. Classify the user's message, extract booking details and write the reply in one step. Respond ONLY with JSON:
+{"intent": "booking" | "availability" | "chat", "appointment": {"name": "owner name", "pet_name": "pet name", "phone": "phone if provided", "date": "YYYY-MM-DD", "time": "HH:MM", "service": "service type", "notes": "additional info"} or null, "reply": "reply to the user"}
+
+- booking: the user wants an appointment and gave a date and time. Leave unknown fields as "".
+- availability: the user asks which slots are free.
+- chat: anything else. Answer pet care questions briefly and professionally. If the user wants to book but the date or time is missing, ask for name, pet name, preferred date/time.
+
+Services: General checkups, Vaccinations, Surgery, Emergency care, Dental care, Grooming, Pet boarding
+Hours: Mon-Sat, 9 AM - 6 PM"""
+
+message_stats = {}
+message_stats_lock = threading.Lock()
+
+def count_llm_call(purpose):
+    """Count an upstream LLM round trip against the current request"""
+    LLM_CALLS.inc(purpose)
+    if has_app_context():
+        g.llm_calls = g.get('llm_calls', 0) + 1
+
+def record_message_stats(message_type, elapsed_ms):
+    """Aggregate latency and LLM call counts per message type for /performance"""
+    llm_calls = g.get('llm_calls', 0) if has_app_context() else 0
+    CHAT_MESSAGE_SECONDS.observe(elapsed_ms / 1000, message_type)
+    with message_stats_lock:
+        stats = message_stats.setdefault(message_type, {'count': 0, 'llm_calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['llm_calls'] += llm_calls
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+def get_message_stats():
+    with message_stats_lock:
+        return {
+            message_type: {
+                'count': stats['count'],
+                'llm_calls': stats['llm_calls'],
+                'llm_calls_per_message': round(stats['llm_calls'] / stats['count'], 3),
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                'max_ms': round(stats['max_ms'], 2)
+            }
+            for message_type, stats in message_stats.items()
+        }
+
+def preclassify_message(intents):
+    """Cheap rule-based routing: only messages that may be bookings pay for extraction.
+
+    Returns 'booking' (needs the combined LLM call), 'availability' (answered locally)
+    or 'chat' (a plain chat completion, no extraction).
+    """
+    if 'booking' in intents:
+        return 'booking'
+    if 'availability' in intents:
+        return 'availability'
+    # A day or time alone ("is the clinic open today?", "he ate at 5pm") is not a booking
+    if 'booking_time' in intents and 'booking_verb' in intents:
+        return 'booking'
+    return 'chat'
+
+BOOKING_FIELD_LABELS = {'name': "your name", 'pet_name': "your pet's name", 'date': "the date", 'time': "the time"}
+
+def booking_details_reply(parsed):
+    """Ask for what the local parser could not find or was unsure about"""
+    if parsed is None or (len(parsed.missing) == len(BOOKING_FIELD_LABELS) and not parsed.problems):
+        return BOOKING_DETAILS_REPLY
+    reply = ""
+    if parsed.problems:
+        reply += f"I couldn't book that yet: {'; '.join(PROBLEM_TEXT[problem] for problem in parsed.problems)}. "
+    if parsed.missing:
+        labels = [BOOKING_FIELD_LABELS[field] for field in parsed.missing]
+        reply += f"Please send {', '.join(labels[:-1]) + ' and ' if len(labels) > 1 else ''}{labels[-1]} for the appointment "
+    else:
+        reply += "Please send the date and time you'd like "
+    return reply + "(we're open Monday-Saturday, 9 AM - 6 PM), or call us directly."
+
+def fallback_analysis(message, parsed=None):
+    """Rule-based stand-in for analyze_message when the LLM is unavailable.
+
+    Never books on a guess: a booking request gets asked for its details instead.
+    """
+    if 'booking' in intent_matcher.classify(message):
+        return {"intent": "chat", "appointment": None, "reply": booking_details_reply(parsed)}
+    return {"intent": "chat", "appointment": None, "reply": None}
+
+def analyze_message(message, parsed=None, conversation=None):
+    """Classify intent, extract booking fields and draft the reply in a single LLM call.
+
+    parsed is the local parser's result, used to word the reply if the LLM is
+    unavailable; the conversation's collected fields and trimmed recent turns
+    are sent along so the model doesn't ask for them again.
+    """
+    if get_openai_client() is None:
+        print("OpenAI client not available, using fallback appointment detection")
+        return fallback_analysis(message, parsed)
+    if llm.breaker.is_open:
+        return fallback_analysis(message, parsed)
     try:
-        if client is None:
-            print("OpenAI client not available, using fallback appointment detection")
-            # Enhanced fallback appointment detection
-            if any(word in message.lower() for word in ['appointment', 'book', 'schedule']):
-                return {"appointment": True, "name": "Not provided", "pet_name": "Not provided", 
-                       "date": "2025-07-27", "time": "10:00", "service": "general checkup", "notes": message}
-            return {"appointment": False}
-            
-        # Use faster gpt-3.5-turbo-0125 model with optimized settings
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",  # Faster variant
-            messages=[
-                {"role": "system", "content": """Extract appointment details from user messages. Respond ONLY with JSON.
-If booking: {"appointment": true, "name": "owner name", "pet_name": "pet name", "phone": "phone if provided", "date": "YYYY-MM-DD", "time": "HH:MM", "service": "service type", "notes": "additional info"}
-If not booking: {"appointment": false}
-
-Examples:
-"book appointment for dog Max tomorrow 2pm, John Smith" -> {"appointment": true, "name": "John Smith", "pet_name": "Max", "date": "2025-07-28", "time": "14:00", "service": "general checkup", "notes": ""}
-"hello" -> {"appointment": false}"""},
-                {"role": "user", "content": message}
-            ],
-            max_tokens=150,  # Limit tokens for faster response
-            temperature=0.1,  # Lower temperature for consistency
-            timeout=10  # 10 second timeout
-        )
-        
-        result = response.choices[0].message.content.strip()
-        return json.loads(result)
+        today = datetime.now()
+        messages = [{"role": "system", "content": f"{ANALYZE_SYSTEM_PROMPT}\nToday is {today.strftime('%A, %Y-%m-%d')}."}]
+        if conversation is not None:
+            if conversation.booking_in_progress:
+                messages.append({"role": "system", "content": f"Booking details so far: {json.dumps(conversation.slots)}"})
+            messages.extend(conversation.context())
+        messages.append({"role": "user", "content": message})
+        count_llm_call('analyze')
+        with llm_budget.slot(), STAGE_SECONDS.time('llm_extraction'):
+            content = llm.complete(
+                'analyze',
+                messages=messages,
+                timeout=10,  # Ceiling; the adaptive timeout is usually much lower
+                response_format={"type": "json_object"},
+                max_tokens=300,  # Booking fields plus a short reply
+                temperature=0.1  # Lower temperature for consistency
+            )
+        result = json.loads(content.strip())
+        if result.get('intent') not in ('booking', 'availability', 'chat'):
+            result['intent'] = 'chat'
+        if not isinstance(result.get('appointment'), dict):
+            result['appointment'] = None
+        return result
+    except LimitExceeded:
+        raise
     except Exception as e:
         print(f"AI extraction error: {e}")
-        # Enhanced fallback for common patterns
-        message_lower = message.lower()
-        if any(word in message_lower for word in ['appointment', 'book', 'schedule']):
-            return {
-                "appointment": True, 
-                "name": "Not provided", 
-                "pet_name": "Not provided", 
-                "date": (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'), 
-                "time": "10:00", 
-                "service": "General Consultation", 
-                "notes": message
-            }
-        return {"appointment": False}
+        return fallback_analysis(message, parsed)
 
 def generate_available_slots():
-    """Generate available appointment slots for the next 7 days"""
-    available_slots = []
-    base_date = datetime.now().date() + timedelta(days=1)  # Start from tomorrow
-    
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute('SELECT date, time FROM appointments')
-            appointments = cur.fetchall()
-            booked = set((apt['date'], apt['time']) for apt in appointments)
-    
-    for i in range(7):  # Next 7 days
-        current_date = base_date + timedelta(days=i)
-        if current_date.weekday() < 6:  # Monday to Saturday (0-5)
-            for hour in range(9, 18):  # 9 AM to 5 PM
-                slot_time = f"{hour:02d}:00"
-                if (current_date, slot_time) not in booked:
-                    available_slots.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
-                        'time': slot_time,
-                        'day': current_date.strftime('%A')
-                    })
-    
-    return available_slots[:10]  # Return first 10 available slots
+    """Generate available appointment slots over the booking horizon (first 10)"""
+    with STAGE_SECONDS.time('slot_generation'):
+        return availability_engine.available_slots(limit=10)
 
 def is_admin():
     return session.get('user') and session['user'].get('role') == 'admin'
@@ -307,6 +712,26 @@ def is_admin():
 def is_logged_in():
     return 'user' in session
 
+# bcrypt runs on a bounded, lower-priority process pool so a login burst can't starve chat
+password_hasher = PasswordHasher.from_env()
+# Attempts per minute, per client IP and per account name
+auth_ip_limiter = RateLimiter(int(os.getenv('AUTH_RATE_PER_IP', 20)), per=60)
+login_account_limiter = RateLimiter(int(os.getenv('LOGIN_RATE_PER_ACCOUNT', 10)), per=60)
+TRUST_PROXY_HEADERS = os.getenv('TRUST_PROXY_HEADERS', 'true').lower() not in ('0', 'false', 'off')
+
+def client_ip():
+    # Render terminates connections at its proxy, which sets X-Forwarded-For
+    if TRUST_PROXY_HEADERS and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+def too_many_attempts(retry_after):
+    seconds = max(1, int(retry_after + 0.999))
+    return jsonify({'success': False, 'message': f'Too many attempts. Please try again in {seconds} seconds.'}), 429, {'Retry-After': str(seconds)}
+
+def auth_busy():
+    return jsonify({'success': False, 'message': 'Sign-in is busy right now. Please try again in a moment.'}), 503, {'Retry-After': '2'}
+
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -314,6 +739,10 @@ def login():
     password = data.get('password')
     if not username_or_email or not password:
         return jsonify({'success': False, 'message': 'Username/email and password are required.'}), 400
+    retry_after = auth_ip_limiter.hit(client_ip()) or login_account_limiter.hit(username_or_email.lower())
+    if retry_after:
+        return too_many_attempts(retry_after)
+    # Don't hold a pooled connection while bcrypt runs
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
@@ -321,15 +750,19 @@ def login():
                 (username_or_email, username_or_email)
             )
             user = cur.fetchone()
-            if user and bcrypt.checkpw(password.encode(), user['password'].encode()):
-                session['user'] = {
-                    'username': user['username'],
-                    'email': user['email'],
-                    'role': user['role']
-                }
-                return jsonify({'success': True, 'role': user['role'], 'username': user['username']})
-            else:
-                return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    try:
+        valid = user is not None and password_hasher.verify(user['username'], password, user['password'])
+    except HasherBusy:
+        return auth_busy()
+    if valid:
+        session['user'] = {
+            'username': user['username'],
+            'email': user['email'],
+            'role': user['role']
+        }
+        return jsonify({'success': True, 'role': user['role'], 'username': user['username']})
+    else:
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
 @app.route('/logout', methods=['POST'])
 def logout():
@@ -347,12 +780,19 @@ def register():
         return jsonify({'success': False, 'message': 'Username, email, and password are required.'}), 400
     if role == 'admin' and (not is_logged_in() or not is_admin()):
         return jsonify({'success': False, 'message': 'Only admin can create admin users.'}), 403
+    retry_after = auth_ip_limiter.hit(client_ip())
+    if retry_after:
+        return too_many_attempts(retry_after)
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return auth_busy()
     with get_db_connection() as conn:
         try:
             with conn.cursor() as cur:
                 cur.execute(
                     'INSERT INTO users (username, email, password, role) VALUES (%s, %s, %s, %s)',
-                    (username, email, bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode(), role)
+                    (username, email, password_hash, role)
                 )
                 conn.commit()
                 return jsonify({'success': True}), 201
@@ -369,85 +809,84 @@ def get_user():
         return jsonify({'logged_in': True, 'user': session['user']})
     return jsonify({'logged_in': False})
 
+def serve_page(template):
+    """A page from the render cache, compressed when the client accepts it, or 304 if unchanged"""
+    status, headers, body = static_assets.page(
+        template, lambda: render_template(template),
+        request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(body, status, headers)
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Content-hashed build output: cached by browsers for a year, never revalidated"""
+    served = static_assets.asset(filename, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+    if served is None:
+        return jsonify({'error': 'Not found'}), 404
+    status, headers, body = served
+    return Response(body, status, headers)
+
 @app.route('/admin.html')
 def serve_admin():
     if not is_logged_in() or not is_admin():
         return redirect('/login.html')
-    return render_template('admin.html')
+    return serve_page('admin.html')
 
 @app.route('/login.html')
 def serve_login():
-    return render_template('login.html')
+    return serve_page('login.html')
 
 @app.route('/profile.html')
 def serve_profile():
-    return render_template('profile.html')
+    return serve_page('profile.html')
 
 @app.route('/')
 def serve_root():
-    return render_template('index.html')
+    return serve_page('index.html')
 
 @app.route('/index.html')
 def serve_index():
-    return render_template('index.html')
+    return serve_page('index.html')
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    data = request.get_json()
-    user_message = data.get('message', '')
-    if not user_message:
-        return jsonify({'reply': "Please enter a message."}), 400
-    
-    # First, check for instant quick responses
-    quick_reply = get_quick_response(user_message)
-    if quick_reply:
-        print(f"Quick response for: {user_message}")
-        return jsonify({'reply': quick_reply})
-    
-    # Check cache for non-appointment messages
-    if not any(word in user_message.lower() for word in ['appointment', 'book', 'schedule']):
-        cached_reply = get_cached_response(user_message)
-        if cached_reply:
-            print(f"Cache hit for: {user_message[:50]}...")
-            return jsonify({'reply': cached_reply})
-    
-    appointment_info = extract_appointment_info(user_message)
-    if appointment_info.get('appointment'):
-        try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        'INSERT INTO appointments (name, pet_name, phone, date, time, service, notes, status, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id',
-                        (
-                            appointment_info.get('name', 'Not provided'),
-                            appointment_info.get('pet_name', 'Not provided'),
-                            appointment_info.get('phone', 'Not provided'),
-                            appointment_info.get('date'),
-                            appointment_info.get('time'),
-                            appointment_info.get('service', 'General consultation'),
-                            appointment_info.get('notes', ''),
-                            'scheduled',
-                            datetime.now().isoformat()
-                        )
-                    )
-                    apt_id = cur.fetchone()['id']
-                    conn.commit()
-                    
-                    cur.execute('SELECT * FROM appointments WHERE id = %s', (apt_id,))
-                    new_appointment = cur.fetchone()
-                    notification_sent = send_whatsapp_notification(dict(new_appointment))
-                    notification_status = "✅ Admin notified via WhatsApp" if notification_sent else "⚠️ Admin notification failed"
-                    reply = f"""✅ Appointment booked successfully!\n\n📋 **Appointment Details:**\n- **ID:** #{apt_id}\n- **Pet Owner:** {new_appointment['name']}\n- **Pet Name:** {new_appointment['pet_name']}\n- **Date:** {new_appointment['date']}\n- **Time:** {new_appointment['time']}\n- **Service:** {new_appointment['service']}\n\n📞 We'll call you if we need to confirm any details.\n{notification_status}\nThank you for choosing Dr. Venky Pet Clinic!"""
-        except Exception as e:
-            print("Appointment booking error:", str(e))
-            return jsonify({'reply': f"Sorry, there was an error booking your appointment: {str(e)}. Please try again or call us directly."}), 500
+def book_appointment(appointment_info):
+    """Insert a booked appointment, queue the admin notification and return the confirmation reply"""
+    with STAGE_SECONDS.time('db_insert'), get_db_connection() as conn:
+        with conn.cursor() as cur:
+            # Raises SlotUnavailable when the slot and the next free ones were all taken meanwhile
+            new_appointment, moved = slot_booker.book(cur, {
+                'name': appointment_info.get('name') or 'Not provided',
+                'pet_name': appointment_info.get('pet_name') or 'Not provided',
+                'phone': appointment_info.get('phone') or 'Not provided',
+                'date': appointment_info.get('date'),
+                'time': appointment_info.get('time'),
+                'service': appointment_info.get('service') or 'General consultation',
+                'notes': appointment_info.get('notes') or '',
+                'status': 'scheduled',
+                'created_at': datetime.now().isoformat()
+            })
+            apt_id = new_appointment['id']
+            if WHATSAPP_ENABLED:
+                # Same transaction as the booking: the notification is queued if and only if the booking commits
+                notification_outbox.enqueue(cur, 'appointment_whatsapp', dict(new_appointment))
+            conn.commit()
+    availability_engine.invalidate(appointment_info.get('date'))
+    if moved:
+        availability_engine.invalidate(new_appointment['date'])
+    if WHATSAPP_ENABLED:
+        notification_outbox.wake()
+        notification_status = "📲 Admin will be notified via WhatsApp"
     else:
-        # Regular chat - check if asking about appointments or availability
-        if any(word in user_message.lower() for word in ['appointment', 'book', 'schedule', 'available', 'slots']):
-            available_slots = generate_available_slots()
-            if available_slots:
-                slots_text = "\n".join([f"• {slot['day']}, {slot['date']} at {slot['time']}" for slot in available_slots[:5]])
-                reply = f"""📅 **Available Appointment Slots:**
+        notification_status = "⚠️ Admin notifications are disabled"
+    moved_note = (f"⚠️ {appointment_info.get('date')} at {appointment_info.get('time')} was just taken, "
+                  "so you have the next free slot instead.\n\n") if moved else ""
+    return f"""✅ Appointment booked successfully!\n\n{moved_note}📋 **Appointment Details:**\n- **ID:** #{apt_id}\n- **Pet Owner:** {new_appointment['name']}\n- **Pet Name:** {new_appointment['pet_name']}\n- **Date:** {new_appointment['date']}\n- **Time:** {new_appointment['time']}\n- **Service:** {new_appointment['service']}\n\n📞 We'll call you if we need to confirm any details.\n{notification_status}\nThank you for choosing Dr. Venky Pet Clinic!"""
+
+def availability_reply():
+    available_slots = generate_available_slots()
+    if not available_slots:
+        return "Sorry, no slots available in the next week. Please call us directly to schedule."
+    slots_text = "\n".join([f"• {slot['day']}, {slot['date']} at {slot['time']}" for slot in available_slots[:5]])
+    return f"""📅 **Available Appointment Slots:**
 
 {slots_text}
 
@@ -459,79 +898,626 @@ To book an appointment, please provide:
 
 Example: "I want to book an appointment for my dog Max tomorrow at 2pm, my name is John Smith"
                 """
-            else:
-                reply = "Sorry, no slots available in the next week. Please call us directly to schedule."
-        else:
-            # Regular veterinary chat with optimizations
-            try:
-                if client is None:
-                    reply = """Hello! Welcome to Dr. Venky Pet Clinic. 
-                    
-I'm here to help with your pet care needs. Our services include:
-- General health checkups
-- Vaccinations  
-- Surgery
-- Emergency care
-- Dental care
-- Grooming
-- Pet boarding
 
-Clinic hours: Monday-Saturday, 9 AM - 6 PM
+def current_conversation():
+    """This browser session's conversation; its id lives in the signed session cookie"""
+    if not conversation_store.enabled:
+        return None
+    if 'conversation_id' not in session:
+        session['conversation_id'] = conversation_store.new_id()
+    return conversation_store.load(session['conversation_id'])
 
-For appointments, please provide your name, pet's name, and preferred date/time."""
-                else:
-                    # Use faster model and optimized settings
-                    response = client.chat.completions.create(
-                        model="gpt-3.5-turbo-0125",  # Faster variant
-                        messages=[
-                            {"role": "system", "content": """You are Dr. Venky Pet Clinic assistant. Answer pet care questions briefly and professionally.
+def resolve_booking(user_message, intents, conversation):
+    """Book, or ask for what is still missing, using the fields collected over the conversation"""
+    requested = 'booking' in intents or conversation.booking_in_progress
+    with STAGE_SECONDS.time('booking_parse'):
+        parsed = appointment_parser.parse(user_message, expecting=conversation.expecting)
+        combined = appointment_parser.merge(conversation.slots, parsed)
+    found_new = any(value for field, value in parsed.appointment.items() if field != 'notes')
+    if combined.complete:
+        # Everything is known and checked: book without the LLM
+        conversation.remember(parsed.appointment)
+        analysis = {"intent": "booking", "appointment": None, "reply": None}
+    elif requested and found_new and not {'unclear_request', 'unclear_slot'} & set(combined.problems):
+        # Progress on a booking: ask for the rest without the LLM
+        conversation.remember(parsed.appointment)
+        analysis = {"intent": "chat", "appointment": None, "reply": booking_details_reply(combined)}
+    else:
+        analysis = analyze_message(user_message, combined, conversation)
+        extracted = analysis.get('appointment') or {}
+        if analysis['intent'] == 'chat' and analysis.get('reply') and 'booking' not in intents and not found_new \
+                and not any(value for field, value in extracted.items() if field != 'notes'):
+            # The model answered a plain question: the user has moved on from the unfinished booking
+            conversation.forget()
+        elif requested or analysis['intent'] == 'booking':
+            conversation.remember(parsed.appointment)
+            conversation.remember(extracted)
 
-Services: General checkups, Vaccinations, Surgery, Emergency care, Dental care, Grooming, Pet boarding
-Hours: Mon-Sat, 9 AM - 6 PM
+    # The LLM's date and time are free text: normalize them and check the slot as a local parse is
+    checked = appointment_parser.check(conversation.slots)
+    conversation.slots = {field: value for field, value in checked.appointment.items() if value}
+    appointment_info = conversation.slots
+    if analysis['intent'] == 'booking' and checked.problems:
+        conversation.expecting = None
+        return booking_details_reply(checked), 200, 'booking_followup'
+    if analysis['intent'] == 'booking' and appointment_info.get('date') and appointment_info.get('time'):
+        try:
+            reply = book_appointment(appointment_info)
+        except SlotUnavailable:
+            # Keep the rest of the booking; only a new time is needed
+            conversation.slots.pop('time', None)
+            conversation.expecting = None
+            return SLOT_TAKEN_REPLY, 200, 'slot_taken'
+        except Exception as e:
+            print("Appointment booking error:", str(e))
+            return "Sorry, there was an error booking your appointment. Please try again or call us directly.", 500, 'error'
+        conversation.booked()
+        return reply, 200, 'booking'
+    if analysis['intent'] == 'availability':
+        return availability_reply(), 200, 'availability'
 
-For appointments: Ask for name, pet name, preferred date/time."""},
-                            {"role": "user", "content": user_message}
-                        ],
-                        max_tokens=200,  # Limit response length
-                        temperature=0.3,  # Lower for consistency
-                        timeout=8  # 8 second timeout
-                    )
-                    reply = response.choices[0].message.content.strip()
-                    
-                    # Cache the response for future use
-                    cache_response(user_message, reply)
-            except Exception as e:
-                print("OpenAI API error:", str(e))
-                reply = "Sorry, I couldn't process your request right now. Please try again or call us directly."
+    reply = (analysis.get('reply') or '').strip()
+    if not reply:
+        return (OFFLINE_CHAT_REPLY if get_openai_client() is None else CHAT_ERROR_REPLY), 200, 'offline'
+    if analysis['intent'] == 'chat' and not requested:
+        cache_response(user_message, reply)
+    # Replies ask for missing fields in this order, so a bare answer ("Max") fills the first
+    missing = [field for field in ('name', 'pet_name', 'date', 'time') if not appointment_info.get(field)]
+    conversation.expecting = missing[0] if conversation.booking_in_progress and missing and \
+        missing[0] in ('name', 'pet_name') else None
+    return reply, 200, 'booking_followup'
+
+def resolve_reply(user_message, conversation=None):
+    """Answer a message without a streamed chat completion where possible.
+
+    Returns (reply, status_code, message_type), or None when the message should
+    get a plain LLM chat reply. conversation carries booking details between
+    messages; without one every message stands alone.
+    """
+    # Classify once; every routing decision below reuses the result
+    with STAGE_SECONDS.time('quick_match'):
+        intents = intent_matcher.classify(user_message)
+
+    if 'cancel' in intents and conversation is not None and conversation.booking_in_progress:
+        # "never mind" / "cancel" while a booking is being collected abandons it
+        conversation.forget()
+        reply = get_quick_response(user_message, intents) or BOOKING_CANCELLED_REPLY
+        conversation_store.record(conversation, user_message, reply)
+        return reply, 200, 'booking_cancelled'
+
+    # First, check for instant quick responses
+    quick_reply = get_quick_response(user_message, intents)
+    if quick_reply:
+        print(f"Quick response for: {user_message}")
+        return quick_reply, 200, 'quick'
+    
+    # Check cache for non-appointment messages (follow-ups to a booking need its context)
+    if 'booking' not in intents and not (conversation is not None and conversation.booking_in_progress):
+        cached_reply = get_cached_response(user_message)
+        if cached_reply:
+            print(f"Cache hit for: {user_message[:50]}...")
+            return cached_reply, 200, 'cached'
+        semantic_reply = get_semantic_cached_response(user_message)
+        if semantic_reply:
+            return semantic_reply, 200, 'semantic_cached'
+    
+    route = preclassify_message(intents)
+    if route == 'chat' and conversation is not None and conversation.booking_in_progress:
+        # Most likely a follow-up ("it's for Max", "Priya") to an unfinished booking
+        route = 'booking'
+    if route == 'availability':
+        return availability_reply(), 200, 'availability'
+    if route == 'chat':
+        if get_openai_client() is None or llm.breaker.is_open:
+            return OFFLINE_CHAT_REPLY, 200, 'offline'
+        return None
+
+    # Possible booking: parsed locally where possible, otherwise one LLM call
+    # classifies, extracts and drafts the reply
+    if conversation is None:
+        conversation = Conversation(None)
+    resolved = resolve_booking(user_message, intents, conversation)
+    conversation_store.record(conversation, user_message, resolved[0])
+    return resolved
+
+def create_chat_completion(user_message):
+    """Regular veterinary chat completion with optimized settings; yields reply deltas"""
+    count_llm_call('chat')
+    # Times the wait for the response headers, not the whole stream
+    with STAGE_SECONDS.time('llm_chat'):
+        return llm.stream(
+            'chat',
+            messages=[
+                {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            timeout=8,  # Ceiling; the adaptive timeout is usually much lower
+            max_tokens=200,  # Limit response length
+            temperature=0.3  # Lower for consistency
+        )
+
+# The response cache is only filled once a reply is complete, so identical
+# questions arriving together would each pay for a call. Concurrent chat
+# replies with the same cache key share one upstream stream instead.
+llm_flights = SingleFlight(
+    timeout=float(os.getenv('LLM_COALESCE_TIMEOUT', 30)),
+    enabled=os.getenv('LLM_COALESCE', 'on').lower() not in ('0', 'false', 'off')
+)
+
+def admit_llm_call():
+    """Take an in-flight LLM slot for a new upstream call; returns its release"""
+    if not llm_budget.acquire():
+        raise LimitExceeded(f"more than {llm_budget.limit} LLM calls in flight")
+    return llm_budget.release
+
+def stream_llm_chat_reply(user_message):
+    """Reply tokens as the model produces them, shared by concurrent identical questions.
+
+    Raises LimitExceeded right away when a new call is over the LLM budget;
+    upstream errors surface while iterating.
+    """
+    def produce():
+        parts = []
+        for delta in create_chat_completion(user_message):
+            parts.append(delta)
+            yield delta
+        reply = ''.join(parts).strip()
+        if reply:
+            cache_response(user_message, reply)
+
+    deltas, started = llm_flights.stream(cache_key(user_message), produce, admit=admit_llm_call)
+    if started and has_app_context():
+        # The call itself runs on the flight's thread, outside this request's context
+        g.llm_calls = g.get('llm_calls', 0) + 1
+    return deltas
+
+def llm_chat_reply(user_message):
+    """Full chat reply for the blocking /chat endpoint"""
+    try:
+        return ''.join(stream_llm_chat_reply(user_message)).strip() or CHAT_ERROR_REPLY
+    except LimitExceeded:
+        raise
+    except CircuitOpen:
+        return OFFLINE_CHAT_REPLY
+    except Exception as e:
+        print("OpenAI API error:", str(e))
+        return CHAT_ERROR_REPLY
+
+def sse_event(payload, event=None):
+    """Format a server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    data = request.get_json()
+    user_message = data.get('message', '')
+    if not user_message:
+        return jsonify({'reply': "Please enter a message."}), 400
+    
+    started = time_module.perf_counter()
+    try:
+        resolved = resolve_reply(user_message, current_conversation())
+        if resolved:
+            reply, status_code, message_type = resolved
+        else:
+            reply, status_code, message_type = llm_chat_reply(user_message), 200, 'chat'
+    except LimitExceeded:
+        record_message_stats('busy', (time_module.perf_counter() - started) * 1000)
+        return llm_busy()
+    record_message_stats(message_type, (time_module.perf_counter() - started) * 1000)
+    if status_code != 200:
+        return jsonify({'reply': reply}), status_code
     
     print("Reply:", reply[:100] + "..." if len(reply) > 100 else reply)
     return jsonify({'reply': reply})
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming chat: forwards model tokens to the browser as server-sent events"""
+    data = request.get_json()
+    user_message = data.get('message', '')
+    if not user_message:
+        return jsonify({'reply': "Please enter a message."}), 400
+
+    # Resolve before the first byte so an over-budget request can still get a 429
+    started = time_module.perf_counter()
+    try:
+        resolved = resolve_reply(user_message, current_conversation())
+        deltas = None if resolved else stream_llm_chat_reply(user_message)
+    except LimitExceeded:
+        record_message_stats('busy', (time_module.perf_counter() - started) * 1000)
+        return llm_busy()
+
+    def generate():
+        if resolved:
+            reply, status_code, message_type = resolved
+            yield sse_event({'delta': reply})
+            yield sse_event({'done': True, 'status': status_code})
+            record_message_stats(message_type, (time_module.perf_counter() - started) * 1000)
+            return
+        message_type = 'chat'
+        sent_any = False
+        try:
+            for delta in deltas:
+                sent_any = True
+                yield sse_event({'delta': delta})
+        except CircuitOpen:
+            message_type = 'offline'
+            yield sse_event({'delta': ('\n\n' if sent_any else '') + OFFLINE_CHAT_REPLY})
+        except Exception as e:
+            print("OpenAI streaming error:", str(e))
+            message_type = 'error'
+            yield sse_event({'delta': ('\n\n' if sent_any else '') + CHAT_ERROR_REPLY}, event='error')
+        yield sse_event({'done': True, 'status': 200})
+        record_message_stats(message_type, (time_module.perf_counter() - started) * 1000)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+    })
+
+APPOINTMENT_COLUMNS = ['id', 'name', 'pet_name', 'phone', 'date', 'time', 'service', 'notes', 'status', 'created_at', 'updated_at', 'change_seq']
+APPOINTMENTS_PAGE_SIZE = 50
+APPOINTMENTS_MAX_PAGE_SIZE = 500
+# Larger pages (up to this many rows) are streamed from a server-side cursor as tuples
+APPOINTMENTS_MAX_STREAMED_PAGE_SIZE = int(os.getenv('APPOINTMENTS_MAX_STREAMED_PAGE_SIZE', 100000))
+APPOINTMENTS_STREAM_BATCH = 2000
+# Filtered totals are counted exactly up to this many rows, then reported as "at least"
+APPOINTMENTS_COUNT_CAP = 10000
+
+def appointment_filters(args):
+    """Build a WHERE clause from status, date_from, date_to and q (pet/owner search) query args"""
+    clauses, params = [], []
+    statuses = [value for value in args.get('status', '').split(',') if value]
+    if statuses:
+        clauses.append('status = ANY(%s)')
+        params.append(statuses)
+    for arg, operator in (('date_from', '>='), ('date_to', '<=')):
+        if args.get(arg):
+            try:
+                params.append(date.fromisoformat(args[arg]))
+            except ValueError:
+                raise ValueError(f"{arg} must be a YYYY-MM-DD date")
+            clauses.append(f'date {operator} %s')
+    if args.get('q'):
+        pattern = '%' + args['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append('(pet_name ILIKE %s OR name ILIKE %s)')
+        params.extend([pattern, pattern])
+    return clauses, params
+
+def appointment_columns(args):
+    """Column projection from the fields query arg; id is always included for paging"""
+    if not args.get('fields'):
+        return '*'
+    fields = [field for field in args['fields'].split(',') if field]
+    unknown = [field for field in fields if field not in APPOINTMENT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ', '.join(['id'] + [field for field in fields if field != 'id'])
+
+def count_appointments(cur, clauses, params, mode):
+    """Total for the listing: planner estimate when unfiltered, capped exact count when filtered"""
+    if mode == 'none':
+        return None, False
+    if not clauses and mode != 'exact':
+        cur.execute("SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = 'appointments'::regclass")
+        row = cur.fetchone()
+        if row and row['estimate'] >= 0:
+            return row['estimate'], True
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    if mode == 'exact':
+        cur.execute(f'SELECT count(*) AS total FROM appointments {where}', params)
+        return cur.fetchone()['total'], False
+    cur.execute(
+        f'SELECT count(*) AS total FROM (SELECT 1 FROM appointments {where} LIMIT %s) AS capped',
+        params + [APPOINTMENTS_COUNT_CAP + 1]
+    )
+    total = cur.fetchone()['total']
+    return min(total, APPOINTMENTS_COUNT_CAP), total > APPOINTMENTS_COUNT_CAP
+
 @app.route('/appointments', methods=['GET'])
 def get_appointments():
-    """Get all appointments - for clinic admin"""
+    """List appointments newest first - for clinic admin.
+
+    Keyset pagination: pass the returned next_cursor as ?cursor= to get the next page.
+    Optional: limit, status (comma list), date_from, date_to, q, fields, count=estimate|exact|none.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', APPOINTMENTS_PAGE_SIZE)), 1), APPOINTMENTS_MAX_STREAMED_PAGE_SIZE)
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        columns = appointment_columns(args)
+        clauses, params = appointment_filters(args)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'appointments': [], 'total': 0}), 400
+    if limit > APPOINTMENTS_MAX_PAGE_SIZE:
+        return stream_appointments_page(args, limit, cursor, columns, clauses, params)
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute('SELECT * FROM appointments ORDER BY created_at DESC')
+                page_clauses, page_params = list(clauses), list(params)
+                if cursor is not None:
+                    page_clauses.append('id < %s')
+                    page_params.append(cursor)
+                where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ''
+                # Read the feed position first so changes racing this page are replayed by /appointments/changes
+                change_cursor = change_watermark(cur) if cursor is None else None
+                # Fetch one extra row to know whether another page exists
+                cur.execute(f'SELECT {columns} FROM appointments {where} ORDER BY id DESC LIMIT %s', page_params + [limit + 1])
                 appointments = cur.fetchall()
-                appointments_list = []
-                for apt in appointments:
-                    apt_dict = dict(apt)
-                    # Convert problematic types to strings
-                    for key, value in apt_dict.items():
-                        if isinstance(value, time):
-                            apt_dict[key] = value.strftime('%H:%M:%S')
-                        elif isinstance(value, datetime):
-                            apt_dict[key] = value.isoformat()
-                        elif isinstance(value, date):
-                            apt_dict[key] = value.isoformat()
-                    appointments_list.append(apt_dict)
-                return jsonify({'appointments': appointments_list, 'total': len(appointments_list)})
+                has_more = len(appointments) > limit
+                appointments = appointments[:limit]
+                total, total_is_estimate = (None, False) if cursor is not None else count_appointments(cur, clauses, params, args.get('count', 'estimate'))
+                return jsonify({
+                    'appointments': appointments,
+                    'total': total,
+                    'total_is_estimate': total_is_estimate,
+                    'next_cursor': appointments[-1]['id'] if has_more else None,
+                    'change_cursor': change_cursor,
+                    'limit': limit
+                })
     except Exception as e:
         print(f"Error in get_appointments: {e}")
         return jsonify({'error': str(e), 'appointments': [], 'total': 0}), 500
 
+def stream_appointments_page(args, limit, cursor, columns, clauses, params):
+    """A large /appointments page streamed as it is read: same JSON as a normal page, in another key order.
+
+    Rows come from a server-side cursor as tuples and are encoded batch by
+    batch, so no list of row dicts is built; next_cursor comes last. An error
+    after the first byte can only cut the response short.
+    """
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(get_db_connection())
+        with conn.cursor() as cur:
+            change_cursor = change_watermark(cur) if cursor is None else None
+            total, total_is_estimate = (None, False) if cursor is not None else count_appointments(cur, clauses, params, args.get('count', 'estimate'))
+    except Exception as e:
+        stack.close()
+        print(f"Error in get_appointments: {e}")
+        return jsonify({'error': str(e), 'appointments': [], 'total': 0}), 500
+
+    page_clauses, page_params = list(clauses), list(params)
+    if cursor is not None:
+        page_clauses.append('id < %s')
+        page_params.append(cursor)
+    where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ''
+
+    def generate():
+        header = app.json.dumps({'total': total, 'total_is_estimate': total_is_estimate,
+                                 'change_cursor': change_cursor, 'limit': limit})
+        yield header[:-1].encode() + b',"appointments":['
+        sent, last_id, has_more = 0, None, False
+        try:
+            with conn.cursor(name='appointments_page', cursor_factory=psycopg2.extensions.cursor) as rows:
+                rows.itersize = APPOINTMENTS_STREAM_BATCH
+                rows.execute(f'SELECT {columns} FROM appointments {where} ORDER BY id DESC LIMIT %s', page_params + [limit + 1])
+                names = id_index = None
+                while not has_more:
+                    batch = rows.fetchmany(APPOINTMENTS_STREAM_BATCH)
+                    if not batch:
+                        break
+                    if names is None:
+                        names = [column[0] for column in rows.description]
+                        id_index = names.index('id')
+                    page = batch[:limit - sent]
+                    # Rows past the limit (the one extra row) mean another page follows
+                    has_more = len(batch) > len(page)
+                    if page:
+                        yield (b',' if sent else b'') + app.json.dumps_rows(names, page)
+                        sent += len(page)
+                        last_id = page[-1][id_index]
+        except Exception as e:
+            print(f"Error streaming appointments: {e}")
+            raise
+        yield b'],"next_cursor":' + app.json.dumps(last_id if has_more else None).encode() + b'}'
+
+    response = Response(generate(), mimetype='application/json')
+    response.call_on_close(stack.close)
+    return response
+
+# Dashboard statistics from the trigger-maintained rollups (ANALYTICS_DEFAULT_DAYS per report)
+appointment_analytics = AppointmentAnalytics.from_env()
+
+@app.route('/appointments/summary', methods=['GET'])
+def appointments_summary():
+    """Counts for the admin dashboard cards.
+
+    Optional: date_from, date_to (default: the last ANALYTICS_DEFAULT_DAYS days
+    up to today), so the cost stays bounded like the other reports.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    today = datetime.now().date()
+    try:
+        first, last = appointment_analytics.window(request.args.get('date_from'), request.args.get('date_to'), today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                return jsonify(appointment_analytics.summary(cur, first, last, today))
+    except Exception as e:
+        print(f"Error in appointments_summary: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/appointments/analytics', methods=['GET'])
+def appointments_analytics():
+    """Bookings per day and per service, status mix and no-show rate from the rollups.
+
+    Optional: date_from, date_to (default: the last ANALYTICS_DEFAULT_DAYS days
+    up to today). Reads scale with the days asked for, not with history.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    today = datetime.now().date()
+    try:
+        first, last = appointment_analytics.window(request.args.get('date_from'), request.args.get('date_to'), today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with STAGE_SECONDS.time('db_analytics'), get_db_connection() as conn:
+            with conn.cursor() as cur:
+                return jsonify(appointment_analytics.report(cur, first, last, today))
+    except Exception as e:
+        print(f"Error in appointments_analytics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/appointments/analytics/check', methods=['GET'])
+def appointments_analytics_check():
+    """Recompute the rollups from raw appointments and report any counts that differ (a full scan)"""
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                result = appointment_analytics.check(cur)
+    except Exception as e:
+        print(f"Error in appointments_analytics_check: {e}")
+        return jsonify({'error': str(e)}), 500
+    if not result['consistent']:
+        print(f"⚠️ Appointment rollups differ from raw rows in {result['mismatches']} groups")
+    return jsonify(result)
+
+@app.route('/appointments/analytics/rebuild', methods=['POST'])
+def appointments_analytics_rebuild():
+    """Rewrite the rollups from raw appointments; writes to appointments wait while it runs"""
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                return jsonify(appointment_analytics.rebuild(cur))
+    except Exception as e:
+        print(f"Error in appointments_analytics_rebuild: {e}")
+        return jsonify({'error': str(e)}), 500
+
+APPOINTMENT_CHANGES_LIMIT = 500
+CHANGE_STREAM_MAX_SECONDS = int(os.getenv('CHANGE_STREAM_MAX_SECONDS', 300))
+CHANGE_STREAM_KEEPALIVE = 15
+
+# Change cursors are snapshot xmins: every transaction that had not finished when
+# the cursor was taken has an xid at or above it, so whatever commits later, in any
+# order, is read again from that cursor. Rows already sent may be replayed (clients
+# upsert by id), for as long as the oldest transaction open at the time runs.
+def change_watermark(cur):
+    cur.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin')
+    return cur.fetchone()['xmin']
+
+def changes_etag(cur, floor):
+    """ETag of the rows changed from floor on; any later commit adds a row or gives one a new change_seq"""
+    cur.execute(
+        'SELECT count(*) AS changes, COALESCE(sum(change_seq), 0) AS seq_sum FROM appointments WHERE change_xid >= %s::xid8',
+        (floor,)
+    )
+    row = cur.fetchone()
+    return f"changes-{floor}-{row['changes']}-{row['seq_sum']}"
+
+@app.route('/appointments/changes', methods=['GET'])
+def appointment_changes():
+    """Appointments inserted or updated since ?cursor= (a change_cursor from a previous response).
+
+    The cursor is a transaction watermark (see change_watermark), so a change
+    that commits after a later one was already read is still returned. While
+    has_more is set the cursor also carries the position within the current
+    read. The ETag covers every row changed from the cursor on, so a poll with
+    If-None-Match returns 304 without a body when nothing changed.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        # floor[:after_seq:next_floor]
+        parts = [int(part) for part in request.args.get('cursor', '0').split(':')]
+        if len(parts) == 1:
+            floor, after_seq, next_floor = parts[0], 0, None
+        elif len(parts) == 3:
+            floor, after_seq, next_floor = parts
+        else:
+            raise ValueError
+        limit = min(max(int(request.args.get('limit', APPOINTMENT_CHANGES_LIMIT)), 1), APPOINTMENT_CHANGES_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'cursor must be a change_cursor and limit an integer', 'changes': []}), 400
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                etag = None
+                if next_floor is None:
+                    if request.if_none_match:
+                        current = changes_etag(cur, floor)
+                        if request.if_none_match.contains(current):
+                            return Response(status=304, headers={'ETag': f'"{current}"', 'Cache-Control': 'no-cache'})
+                    # Watermark, then its ETag, then the rows: a commit racing this read is
+                    # at worst sent now and again on the next poll, never skipped
+                    next_floor = int(change_watermark(cur))
+                    etag = changes_etag(cur, next_floor)
+                cur.execute(
+                    'SELECT * FROM appointments WHERE change_xid >= %s::xid8 AND change_seq > %s ORDER BY change_seq LIMIT %s',
+                    (floor, after_seq, limit + 1)
+                )
+                changes = cur.fetchall()
+                has_more = len(changes) > limit
+                changes = changes[:limit]
+                next_cursor = f"{floor}:{changes[-1]['change_seq']}:{next_floor}" if has_more else str(next_floor)
+                response = jsonify({'changes': changes, 'cursor': next_cursor, 'has_more': has_more})
+                response.headers['Cache-Control'] = 'no-cache'
+                # A read split over pages may have skipped a change committed between them, so
+                # its last page sets no ETag and the next poll reads from next_floor in full
+                if etag and not has_more:
+                    response.set_etag(etag)
+                return response
+    except Exception as e:
+        print(f"Error in appointment_changes: {e}")
+        return jsonify({'error': str(e), 'changes': []}), 500
+
+@app.route('/appointments/stream', methods=['GET'])
+def appointment_stream():
+    """Push channel for the admin dashboard: one SSE 'change' event per committed insert/update.
+
+    Events only carry {id, change_seq}; clients fetch rows from /appointments/changes.
+    Each stream holds a worker thread, so streams are capped per process and closed
+    after CHANGE_STREAM_MAX_SECONDS (EventSource reconnects on its own).
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    subscription = change_listener.subscribe()
+    if subscription is None:
+        return jsonify({'error': 'Too many live dashboards; poll /appointments/changes instead'}), 503, {'Retry-After': '30'}
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            deadline = time_module.monotonic() + CHANGE_STREAM_MAX_SECONDS
+            while time_module.monotonic() < deadline:
+                try:
+                    payload = subscription.get(timeout=CHANGE_STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # Comment line: keeps proxies from timing out and detects closed clients
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(payload, event='change')
+        finally:
+            change_listener.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/live', methods=['GET'])
+def liveness():
+    """Liveness: the process is up and serving; never touches the database"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    """Readiness: the warm-up finished (database reachable, schema applied, clients built)"""
+    stats = warmup.stats()
+    if not stats['ready']:
+        return jsonify({'status': 'starting', **stats}), 503, {'Retry-After': '1'}
+    return jsonify({'status': 'ready', **stats})
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify database connectivity"""
@@ -554,6 +1540,7 @@ def health_check():
                     'status': 'healthy',
                     'database': 'connected',
                     'tables': table_names,
+                    'db_pool': get_pool_status(),
                     'database_url_host': DATABASE_URL.split('@')[1].split(':')[0] if '@' in DATABASE_URL else 'unknown',
                     'environment': os.getenv('RENDER') and 'render' or 'local',
                     'timestamp': datetime.now().isoformat()
@@ -590,30 +1577,402 @@ def update_appointment(apt_id):
     with get_db_connection() as conn:
         try:
             with conn.cursor() as cur:
-                cur.execute('UPDATE appointments SET status = %s, updated_at = %s WHERE id = %s',
+                cur.execute('UPDATE appointments SET status = %s, updated_at = %s WHERE id = %s RETURNING date',
                            (status, datetime.now().isoformat(), apt_id))
+                updated = cur.fetchone()
                 conn.commit()
-                if cur.rowcount:
+                if updated:
+                    # A cancelled (or restored) appointment frees or takes its slot
+                    availability_engine.invalidate(updated['date'])
                     return jsonify({'message': 'Appointment updated successfully'})
                 else:
                     return jsonify({'error': 'Appointment not found'}), 404
+        except psycopg2.errors.UniqueViolation:
+            # Restoring a cancelled appointment into a slot that has been booked since
+            conn.rollback()
+            return jsonify({'error': 'That slot is already booked by another appointment'}), 409
         except Exception as e:
             conn.rollback()
             return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+APPOINTMENT_STATUSES = ('scheduled', 'confirmed', 'completed', 'cancelled')
+APPOINTMENTS_MAX_BATCH = int(os.getenv('APPOINTMENTS_MAX_BATCH', 500))
+
+def parse_batch_updates(data):
+    """[(id, changes or error message)] in request order from a batch body; raises ValueError if malformed"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    if 'updates' in data:
+        updates = data['updates']
+    else:
+        # One change applied to many appointments: {"ids": [...], "status": "completed"}
+        shared = {field: data[field] for field in ('status', 'date', 'time') if field in data}
+        updates = [dict(shared, id=apt_id) for apt_id in data.get('ids') or []] if isinstance(data.get('ids'), list) else None
+    if not isinstance(updates, list) or not updates:
+        raise ValueError('Send "updates": [{"id", "status" and/or "date"+"time"}] or "ids" with the fields to set')
+    if len(updates) > APPOINTMENTS_MAX_BATCH:
+        raise ValueError(f'At most {APPOINTMENTS_MAX_BATCH} appointments per batch')
+    parsed = []
+    seen = set()
+    for update in updates:
+        apt_id = update.get('id') if isinstance(update, dict) else None
+        if not isinstance(apt_id, int) or isinstance(apt_id, bool):
+            raise ValueError('Every update needs an integer id')
+        if apt_id in seen:
+            raise ValueError(f'Appointment {apt_id} appears more than once in the batch')
+        seen.add(apt_id)
+        status = update.get('status')
+        if status is not None and status not in APPOINTMENT_STATUSES:
+            parsed.append((apt_id, f"Status must be one of {', '.join(APPOINTMENT_STATUSES)}"))
+            continue
+        if ('date' in update) != ('time' in update):
+            parsed.append((apt_id, 'Reschedule with both date and time'))
+            continue
+        changes = {'status': status}
+        if 'date' in update:
+            try:
+                changes['date'] = date.fromisoformat(update['date'])
+                changes['time'] = time.fromisoformat(update['time'])
+            except (TypeError, ValueError):
+                parsed.append((apt_id, 'date must be YYYY-MM-DD and time HH:MM'))
+                continue
+            if changes['date'].weekday() not in availability_engine.open_weekdays or \
+                    availability_engine.slot_index(changes['time']) is None:
+                parsed.append((apt_id, 'The clinic is closed at that date and time'))
+                continue
+        elif status is None:
+            parsed.append((apt_id, 'Nothing to change: send a status and/or date and time'))
+            continue
+        parsed.append((apt_id, changes))
+    return parsed
+
+@app.route('/appointments/batch', methods=['POST'])
+def batch_update_appointments():
+    """Change the status of, reschedule or cancel many appointments in one transaction.
+
+    Body: {"updates": [{"id": 1, "status": "completed"}, {"id": 2, "date": "2025-07-28", "time": "15:00"}]}
+    or {"ids": [1, 2, 3], "status": "cancelled"}. The rows are locked, target
+    slots claimed like new bookings, and every valid change applied by one
+    UPDATE; results come back per id, in request order.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        parsed = parse_batch_updates(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = {apt_id: {'id': apt_id, 'ok': False, 'error': changes} for apt_id, changes in parsed if isinstance(changes, str)}
+    wanted = {apt_id: changes for apt_id, changes in parsed if not isinstance(changes, str)}
+    touched_dates = set()
+    try:
+        with STAGE_SECONDS.time('db_batch_update'), get_db_connection() as conn:
+            with conn.cursor() as cur:
+                if wanted:
+                    cur.execute('SELECT id, date, time, status FROM appointments WHERE id = ANY(%s) ORDER BY id FOR UPDATE',
+                                (list(wanted),))
+                    current = {row['id']: row for row in cur.fetchall()}
+                else:
+                    current = {}
+                final, moves = {}, []
+                for apt_id, changes in wanted.items():
+                    row = current.get(apt_id)
+                    if row is None:
+                        results[apt_id] = {'id': apt_id, 'ok': False, 'error': 'Appointment not found'}
+                        continue
+                    target = {
+                        'status': changes['status'] or row['status'],
+                        'date': changes.get('date', row['date']),
+                        'time': changes.get('time', row['time'])
+                    }
+                    final[apt_id] = target
+                    # Moving, or restoring a cancelled appointment, needs the slot to be free
+                    if target['status'] != 'cancelled' and target['date'] is not None and target['time'] is not None and (
+                            (target['date'], target['time']) != (row['date'], row['time']) or row['status'] == 'cancelled'):
+                        moves.append((apt_id, target['date'], target['time']))
+                for apt_id in slot_booker.claim_slots(cur, moves):
+                    del final[apt_id]
+                    results[apt_id] = {'id': apt_id, 'ok': False, 'error': 'That slot is already booked by another appointment'}
+                if final:
+                    ids = list(final)
+                    cur.execute(
+                        """UPDATE appointments AS a
+                        SET status = v.status, date = v.date, time = v.time, updated_at = %s
+                        FROM unnest(%s::int[], %s::text[], %s::date[], %s::time[]) AS v(id, status, date, time)
+                        WHERE a.id = v.id
+                        RETURNING a.id, a.status, a.date, a.time""",
+                        (datetime.now().isoformat(), ids, [final[i]['status'] for i in ids],
+                         [final[i]['date'] for i in ids], [final[i]['time'] for i in ids])
+                    )
+                    for row in cur.fetchall():
+                        results[row['id']] = {'id': row['id'], 'ok': True, 'status': row['status'],
+                                              'date': row['date'], 'time': row['time']}
+                        touched_dates.update(day for day in (row['date'], current[row['id']]['date']) if day)
+                conn.commit()
+    except psycopg2.errors.UniqueViolation:
+        # A writer that skipped the slot locks took one of the slots meanwhile
+        return jsonify({'error': 'A slot in the batch was booked meanwhile; nothing was changed'}), 409
+    except Exception as e:
+        print(f"Error in batch_update_appointments: {e}")
+        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
+    for day in touched_dates:
+        availability_engine.invalidate(day)
+    ordered = [results[apt_id] for apt_id, _ in parsed]
+    return jsonify({'results': ordered, 'updated': sum(result['ok'] for result in ordered)})
+
+# Streaming CSV/JSON-lines export and CSV bulk import (IMPORT_MAX_ERRORS rejected lines reported)
+appointment_transfer = AppointmentTransfer.from_env(APPOINTMENT_STATUSES, availability_engine)
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+@app.route('/appointments/export', methods=['GET'])
+def export_appointments():
+    """Every matching appointment, oldest first, streamed as it is read.
+
+    Optional: format=csv (default, Postgres COPY) or jsonl, and the /appointments
+    filters status, date_from, date_to, q and fields. Memory use doesn't grow
+    with the table; an error after the first byte can only cut the file short.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    args = request.args
+    export_format = args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        columns = appointment_columns(args)
+        clauses, params = appointment_filters(args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if columns == '*':
+        columns = ', '.join(APPOINTMENT_COLUMNS)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    query = f'SELECT {columns} FROM appointments {where} ORDER BY id'
+
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(get_db_connection())
+        if export_format == 'csv':
+            # COPY takes no parameters, so bind them into the query text first
+            with conn.cursor() as cur:
+                chunks = appointment_transfer.export_csv(conn, cur.mogrify(query, params).decode())
+        else:
+            chunks = appointment_transfer.export_jsonl(conn, query, params, app.json.dumps_lines)
+    except Exception as e:
+        stack.close()
+        print(f"Error in export_appointments: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    response = Response(chunks, mimetype=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename="appointments.{export_format}"',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(stack.close)
+    return response
+
+@app.route('/appointments/import', methods=['POST'])
+def import_appointments():
+    """Load migrated appointments from a CSV request body in one transaction.
+
+    The header row names the columns (name, pet_name, date, time required;
+    phone, service, notes, status optional; other appointment columns, as
+    in an export, are ignored). Rows failing validation or landing on a slot
+    that is already booked are skipped and reported by line; the rest are
+    imported. A malformed file imports nothing.
+    """
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        with STAGE_SECONDS.time('db_import'), get_db_connection() as conn:
+            with conn.cursor() as cur:
+                summary = appointment_transfer.import_csv(cur, request.stream, APPOINTMENT_COLUMNS)
+    except ImportRejected as e:
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.DataError as e:
+        # COPY could not parse the file (wrong column count, bad quoting, bad encoding)
+        return jsonify({'error': f'Malformed CSV: {str(e).strip()}'}), 400
+    except Exception as e:
+        print(f"Error in import_appointments: {e}")
+        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
+    if summary['imported']:
+        availability_engine.invalidate()
+    return jsonify(summary)
+
+@app.route('/notifications', methods=['GET'])
+def list_notifications():
+    """Recent outbound notifications and their delivery status (optional: status, limit)"""
+    if not is_logged_in() or not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer', 'notifications': []}), 400
+    status = request.args.get('status')
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    'SELECT id, kind, status, attempts, next_attempt_at, last_error, provider_id, created_at, sent_at, '
+                    "payload->>'id' AS appointment_id FROM notification_outbox "
+                    + ('WHERE status = %s ' if status else '') + 'ORDER BY id DESC LIMIT %s',
+                    ([status] if status else []) + [limit]
+                )
+                return jsonify({'notifications': cur.fetchall()})
+    except Exception as e:
+        print(f"Error in list_notifications: {e}")
+        return jsonify({'error': str(e), 'notifications': []}), 500
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time_module.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        # The URL rule keeps label cardinality bounded (/appointments/<int:apt_id>, not every id)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time_module.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
+
+def pool_connections():
+    pool = db_engine.pool
+    return {('checked_out',): pool.checkedout(), ('idle',): pool.checkedin(), ('overflow',): max(pool.overflow(), 0)}
+
+def pool_events():
+    with pool_stats_lock:
+        return {(event,): pool_stats[event] for event in ('checkouts', 'checkout_timeouts', 'checkout_errors', 'invalidated')}
+
+def cache_lookups():
+    lookups = {}
+    for name, cache in (('response', response_cache), ('semantic', semantic_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            lookups[(name, 'hit')] = stats['hits']
+            lookups[(name, 'miss')] = stats['misses']
+    return lookups
+
+metrics.gauge('vet_clinic_db_pool_connections', 'Pooled database connections by state', pool_connections, ['state'])
+metrics.gauge('vet_clinic_db_pool_events_total', 'Connection pool checkouts and failures', pool_events, ['event'], kind='counter')
+metrics.gauge('vet_clinic_db_pool_checkout_wait_seconds_max', 'Longest wait for a pooled connection',
+              lambda: pool_stats['checkout_wait_max_ms'] / 1000)
+metrics.gauge('vet_clinic_cache_entries', 'Entries held by each answer cache',
+              lambda: {('response',): len(response_cache), ('semantic',): len(semantic_cache) if semantic_cache is not None else None},
+              ['cache'])
+metrics.gauge('vet_clinic_cache_lookups_total', 'Answer cache lookups by result', cache_lookups, ['cache', 'result'], kind='counter')
+metrics.gauge('vet_clinic_availability_cached_days', 'Days with a cached booked-slot bitmap',
+              lambda: availability_engine.stats()['cached_days'])
+metrics.gauge('vet_clinic_change_stream_subscribers', 'Open /appointments/stream connections',
+              lambda: change_listener.stats()['subscribers'])
+metrics.gauge('vet_clinic_notifications_total', 'Notification delivery attempts handled by this process',
+              lambda: {(outcome,): getattr(notification_outbox, outcome) for outcome in ('enqueued', 'sent', 'retried', 'failed')},
+              ['outcome'], kind='counter')
+
+metrics.gauge('vet_clinic_llm_in_flight', 'LLM calls currently in flight in this process', lambda: llm_budget.in_flight)
+metrics.gauge('vet_clinic_llm_rejected_total', 'Chat requests answered 429 because the in-flight LLM budget was full',
+              lambda: llm_budget.rejected, kind='counter')
+
+metrics.gauge('vet_clinic_llm_coalesced_total', 'Chat replies served by joining an identical in-flight LLM call',
+              lambda: llm_flights.coalesced, kind='counter')
+
+def llm_purpose_counters(*names):
+    return {
+        (purpose, name): stats[name]
+        for purpose, stats in llm.stats()['purposes'].items() for name in names
+    }
+
+metrics.gauge('vet_clinic_llm_call_outcomes_total', 'Chat completion calls by purpose and outcome',
+              lambda: llm_purpose_counters('succeeded', 'failed', 'timeouts', 'retries', 'fast_failed', 'hedged', 'hedge_wins'),
+              ['purpose', 'outcome'], kind='counter')
+metrics.gauge('vet_clinic_llm_tokens_total', 'Tokens billed by purpose and kind',
+              lambda: llm_purpose_counters('prompt_tokens', 'completion_tokens'), ['purpose', 'kind'], kind='counter')
+metrics.gauge('vet_clinic_llm_cost_usd_total', 'Estimated LLM spend by purpose (LLM_PRICE_* per 1k tokens)',
+              lambda: {(purpose,): stats['cost_usd'] for purpose, stats in llm.stats()['purposes'].items()},
+              ['purpose'], kind='counter')
+metrics.gauge('vet_clinic_llm_circuit_open', 'Whether the LLM circuit breaker is fast-failing calls', lambda: llm.breaker.is_open)
+
+metrics.gauge('vet_clinic_slot_bookings_total', 'Booking attempts by outcome (conflict: slot found taken)',
+              lambda: {(outcome,): value for outcome, value in slot_booker.stats().items() if outcome != 'max_attempts'},
+              ['outcome'], kind='counter')
+
+metrics.gauge('vet_clinic_appointment_transfer_rows_total', 'Appointment rows exported, imported and rejected on import',
+              lambda: {(kind,): appointment_transfer.stats()[f'{kind}_rows'] for kind in ('exported', 'imported', 'rejected')},
+              ['kind'], kind='counter')
+
+metrics.gauge('vet_clinic_booking_parser_total', 'Booking-route messages parsed locally, by outcome',
+              lambda: {('local',): appointment_parser.complete, ('escalated',): appointment_parser.parsed - appointment_parser.complete},
+              ['outcome'], kind='counter')
+
+metrics.gauge('vet_clinic_auth_events_total', 'Password hashing outcomes and rate-limited auth attempts',
+              lambda: {
+                  **{(event,): value for event, value in password_hasher.stats().items()
+                     if event in ('hashed', 'verified', 'fast_path_hits', 'rejected_busy', 'timeouts')},
+                  ('rate_limited',): auth_ip_limiter.limited + login_account_limiter.limited
+              },
+              ['event'], kind='counter')
+
+metrics.gauge('vet_clinic_ready', 'Whether the startup warm-up has finished in this process', lambda: warmup.ready)
+metrics.gauge('vet_clinic_startup_seconds', 'Module import plus warm-up time of this process',
+              lambda: warmup.stats()['startup_seconds'])
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Metrics for Prometheus scraping (text exposition format)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/performance', methods=['GET'])
 def performance_stats():
     """Get performance statistics"""
     return jsonify({
         'cache_size': len(response_cache),
-        'cache_items': list(response_cache.keys()),
+        'cache': response_cache.stats(),
+        'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        'availability': availability_engine.stats(),
+        'slot_booking': slot_booker.stats(),
+        'appointment_transfer': appointment_transfer.stats(),
+        'analytics': appointment_analytics.stats(),
+        'db_pool': get_pool_status(),
+        'change_stream': change_listener.stats(),
+        'notifications': notification_outbox.stats(),
+        'llm_budget': llm_budget.stats(),
+        'llm_coalescing': llm_flights.stats(),
+        'llm': llm.stats(),
+        'appointment_parser': appointment_parser.stats(),
+        'conversations': conversation_store.stats(),
+        'static_assets': static_assets.stats(),
+        'startup': warmup.stats(),
+        'auth': {
+            'password_hasher': password_hasher.stats(),
+            'ip_rate_limit': auth_ip_limiter.stats(),
+            'account_rate_limit': login_account_limiter.stats()
+        },
+        'message_types': get_message_stats(),
         'optimizations': [
-            'Quick pattern responses for common questions',
-            'LLM response caching (5 min TTL)',
+            'Precompiled word-boundary intent matcher for quick responses and routing',
+            'Bounded LLM response cache with normalized keys',
+            'Semantic answer cache for near-duplicate questions',
+            'Windowed, indexed availability query with per-day slot bitmaps',
             'Faster GPT-3.5-turbo-0125 model',
             'Reduced token limits',
             'Request timeouts',
-            'Lower temperature for consistency'
+            'Lower temperature for consistency',
+            'Pooled database connections with pre-ping and recycling',
+            'Single LLM call for intent, booking extraction and reply',
+            'Rule-based pre-classifier skips extraction for non-booking messages',
+            'Incremental admin sync: change feed with ETag/304 and LISTEN/NOTIFY push',
+            'WhatsApp notifications sent from a durable outbox, off the booking path',
+            'Per-stage timing histograms exported at /metrics',
+            'bcrypt on a bounded process pool with per-IP/per-account rate limits',
+            'Worker/thread/pool sizes derived from CPU and memory; in-flight LLM budget with 429 backpressure',
+            'Lazy OpenAI/Twilio clients and background DB warm-up; /live and /ready probes',
+            'Concurrent identical chat questions share one in-flight LLM call',
+            'Adaptive LLM timeouts, retries, circuit breaker to local fallbacks, optional hedging and token/cost accounting',
+            'Local parser books well-formed appointment requests without an LLM call',
+            'Per-session booking state across turns; only collected fields and a trimmed context go to the LLM',
+            'Atomic slot booking: per-slot advisory lock, conditional INSERT ... RETURNING, retry into the next free slot',
+            'Minified, content-hashed, precompressed assets with immutable caching; cached page renders with ETag/304',
+            'orjson-backed JSON responses; large listings streamed from a server-side cursor as tuples',
+            'Set-based batch status/reschedule/cancel endpoint: one transaction and one UPDATE per batch',
+            'Constant-memory CSV (COPY) / JSON-lines export; bulk import via COPY into a validated, deduplicated staging table',
+            'Dashboard statistics from per-day rollups maintained by statement-level triggers, with a raw-row consistency check'
         ],
         'timestamp': datetime.now().isoformat()
     })
@@ -719,8 +2078,10 @@ def debug_environment():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+warmup.imported()
+
 if __name__ == '__main__':
-    init_db()
+    warmup.start()
     port = int(os.getenv('PORT', 3001))
     debug_mode = os.getenv('FLASK_ENV') != 'production'
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
\ No newline at end of file
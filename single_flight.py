@@ -0,0 +1,133 @@
+import threading
+
+class FlightTimeout(Exception):
+    """A shared call produced nothing new within the timeout"""
+
+class SharedStream:
+    """Items produced once by a background thread, replayable by any number of readers"""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.readers = 0  # callers iterating it right now
+        self._changed = threading.Condition()
+
+    def append(self, item):
+        with self._changed:
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    def iterate(self, timeout):
+        """Replay everything produced so far, then follow until done; producer errors are re-raised"""
+        index = 0
+        while True:
+            with self._changed:
+                if index == len(self.items) and not self.done:
+                    self._changed.wait_for(lambda: index < len(self.items) or self.done, timeout)
+                    if index == len(self.items) and not self.done:
+                        raise FlightTimeout(f"no new data within {timeout:g}s")
+                pending = self.items[index:]
+                done, error = self.done, self.error
+            for item in pending:
+                yield item
+            index += len(pending)
+            if done and index == len(self.items):
+                if error is not None:
+                    raise error
+                return
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one upstream call.
+
+    The first caller for a key starts the flight: a background thread drains
+    produce() into a SharedStream that every caller with the same key
+    (including the first) iterates, so a late joiner still gets the whole
+    result and an error reaches everyone waiting. The flight ends when produce
+    does, even if every reader has gone, so the result can still be cached.
+    Readers give up with FlightTimeout after `timeout` seconds without new data.
+    With enabled=False every caller gets its own flight (for comparisons).
+    """
+
+    def __init__(self, timeout=30, enabled=True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._flights = {}  # key -> SharedStream
+        self._lock = threading.Lock()
+        self.started = self.coalesced = self.failed = self.timeouts = 0
+
+    def stream(self, key, produce, admit=None):
+        """Iterator over the flight for key, and whether this caller started it.
+
+        admit runs in the caller's thread only when a new flight would start; it
+        may raise to refuse (nothing starts) and returns a callable run once the
+        flight ends, e.g. to release a concurrency slot.
+        """
+        with self._lock:
+            shared = self._flights.get(key) if self.enabled else None
+            if shared is not None:
+                self.coalesced += 1
+                return self._follow(shared), False
+            shared = SharedStream()
+            if self.enabled:
+                self._flights[key] = shared
+        try:
+            on_finish = admit() if admit else None
+        except BaseException as e:
+            self._end(key, shared, e)
+            raise
+        with self._lock:
+            self.started += 1
+        threading.Thread(target=self._drain, args=(key, shared, produce, on_finish), daemon=True).start()
+        return self._follow(shared), True
+
+    def _drain(self, key, shared, produce, on_finish):
+        error = None
+        try:
+            for item in produce():
+                shared.append(item)
+        except Exception as e:
+            error = e
+        finally:
+            if on_finish is not None:
+                on_finish()
+            self._end(key, shared, error)
+
+    def _end(self, key, shared, error):
+        with self._lock:
+            if self._flights.get(key) is shared:
+                del self._flights[key]
+            if error is not None:
+                self.failed += 1
+        shared.finish(error)
+
+    def _follow(self, shared):
+        with self._lock:
+            shared.readers += 1
+        try:
+            yield from shared.iterate(self.timeout)
+        except FlightTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        finally:
+            # Done, failed, timed out or abandoned (the client went away)
+            with self._lock:
+                shared.readers -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'callers_in_flight': sum(shared.readers for shared in self._flights.values()),
+                'upstream_calls': self.started,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'timeouts': self.timeouts
+            }
@@ -0,0 +1,131 @@
+import os
+import threading
+from datetime import date
+
+# First key of the two-key advisory locks taken per (date, slot); the second is the slot itself
+SLOT_LOCK_CLASS = 20260518
+
+class SlotUnavailable(Exception):
+    """The requested slot and every retried alternative were already booked"""
+
+class SlotBooker:
+    """Books an appointment into a slot nobody else holds, in one statement per attempt.
+
+    Each attempt takes a transaction-scoped advisory lock on the slot and
+    inserts only if no active (not cancelled) appointment falls inside the
+    slot, returning the full row. Concurrent bookings of one slot therefore
+    queue on the lock and all but the first find it taken; those move on to
+    the next free slots, read fresh inside the same transaction, up to
+    max_attempts slots in total. ON CONFLICT DO NOTHING also covers the unique
+    (date, time) index against writers that skip the lock.
+    """
+
+    def __init__(self, availability, max_attempts=3):
+        self.availability = availability
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self.booked = self.conflicts = self.moved = self.exhausted = 0
+
+    @classmethod
+    def from_env(cls, availability):
+        return cls(availability, max_attempts=int(os.getenv('BOOKING_MAX_ATTEMPTS', 3)))
+
+    def lock_key(self, day, start_minutes):
+        return (day.toordinal() * 1440 + start_minutes) % 2 ** 31
+
+    def try_slot(self, cur, values, day, slot_time):
+        """Insert into one slot; the new row, or None when the slot is taken"""
+        start, end = self.availability.slot_window(slot_time)
+        row = dict(values, date=day.isoformat(), time=slot_time)
+        columns = ', '.join(row)
+        placeholders = ', '.join(['%s'] * len(row))
+        cur.execute(
+            f"""SELECT pg_advisory_xact_lock(%s, %s);
+            INSERT INTO appointments ({columns})
+            SELECT {placeholders}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM appointments
+                WHERE date = %s AND time >= %s AND time < %s AND status IS DISTINCT FROM 'cancelled'
+            )
+            ON CONFLICT DO NOTHING
+            RETURNING *""",
+            (SLOT_LOCK_CLASS, self.lock_key(day, start), *row.values(),
+             day, f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}")
+        )
+        return cur.fetchone()
+
+    def book(self, cur, values):
+        """Insert values (a column -> value dict with 'date' and 'time') into the
+        requested slot or the next free one; returns (row, moved).
+
+        Runs in the caller's transaction: slot locks are held until it ends.
+        Raises SlotUnavailable when max_attempts slots were all taken.
+        """
+        values = dict(values)
+        day = values.pop('date')
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        slot_time = str(values.pop('time'))
+        candidates = [(day, slot_time)]
+        attempt = 0
+        while attempt < len(candidates):
+            candidate_day, candidate_time = candidates[attempt]
+            row = self.try_slot(cur, values, candidate_day, candidate_time)
+            attempt += 1
+            if row is not None:
+                with self._lock:
+                    self.booked += 1
+                    self.moved += attempt > 1
+                return row, attempt > 1
+            with self._lock:
+                self.conflicts += 1
+            if attempt == 1 and self.max_attempts > 1:
+                candidates.extend(self.availability.free_slots_after(cur, day, slot_time, self.max_attempts - 1))
+        with self._lock:
+            self.exhausted += 1
+        raise SlotUnavailable(f"{day.isoformat()} at {slot_time} is already booked")
+
+    def claim_slots(self, cur, moves):
+        """Lock the slots existing appointments move into; returns the ids that can't have theirs.
+
+        moves is [(id, date, time)] in request order, for rescheduled or
+        restored appointments. A move is refused when an active appointment
+        other than the one moving holds the slot (including one leaving it in
+        the same batch), or an earlier move claimed it. Locks are taken in key
+        order, so concurrent batches can't deadlock on each other.
+        """
+        if not moves:
+            return set()
+        windows = [(apt_id, day) + self.availability.slot_window(slot_time) for apt_id, day, slot_time in moves]
+        cur.execute('SELECT pg_advisory_xact_lock(%s, key) FROM unnest(%s::int[]) AS key',
+                    (SLOT_LOCK_CLASS, sorted({self.lock_key(day, start) for _, day, start, _ in windows})))
+        cur.execute(
+            """SELECT m.id FROM unnest(%s::int[], %s::date[], %s::time[], %s::time[]) AS m(id, date, starts, ends)
+            WHERE EXISTS (
+                SELECT 1 FROM appointments
+                WHERE id <> m.id AND date = m.date AND time >= m.starts AND time < m.ends
+                  AND status IS DISTINCT FROM 'cancelled'
+            )""",
+            ([apt_id for apt_id, _, _, _ in windows], [day for _, day, _, _ in windows],
+             [f"{start // 60:02d}:{start % 60:02d}" for _, _, start, _ in windows],
+             [f"{end // 60:02d}:{end % 60:02d}" for _, _, _, end in windows])
+        )
+        refused = {row['id'] if isinstance(row, dict) else row[0] for row in cur.fetchall()}
+        claimed = set()
+        for apt_id, day, start, _ in windows:
+            if apt_id in refused or (day, start) in claimed:
+                refused.add(apt_id)
+            else:
+                claimed.add((day, start))
+        with self._lock:
+            self.conflicts += len(refused)
+        return refused
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_attempts': self.max_attempts,
+                'booked': self.booked,
+                'conflicts': self.conflicts,
+                'moved_to_next_slot': self.moved,
+                'exhausted': self.exhausted
+            }
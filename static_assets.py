@@ -0,0 +1,268 @@
+"""Fingerprinted, precompressed static assets and cached page renders.
+
+Build step (run once per deploy, after pip install):
+
+    python static_assets.py
+
+moves the inline <style>/<script> blocks of every template into minified,
+content-hashed files next to a hashed copy of static/style.css, writes gzip
+and brotli variants of each, and saves the rewritten templates plus a
+manifest under ASSETS_BUILD_DIR (default build/). The server then serves
+/assets/<name> from memory with an immutable Cache-Control and renders pages
+from the rewritten templates.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+PAGES = ('index.html', 'login.html', 'admin.html', 'profile.html')
+SHARED_STYLESHEET = 'style.css'
+STYLESHEET_REF = "{{ url_for('static', filename='style.css') }}"
+# Inline blocks without attributes; blocks containing Jinja stay inline
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.S)
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};,])\s*')
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8'
+}
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # Without rcssmin: drop comments and the whitespace around braces, semicolons and commas
+    return CSS_SPACE.sub(r'\1', CSS_COMMENT.sub('', text)).strip()
+
+def minify_js(text):
+    # Without rjsmin scripts ship as written (still compressed)
+    return rjsmin.jsmin(text) if rjsmin is not None else text.strip()
+
+def compress(body):
+    """Precompressed variants of body, keeping only those smaller than it"""
+    variants = {'gzip': gzip.compress(body, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def choose_encoding(accept_encoding, available):
+    """The best of available ('br' first) that an Accept-Encoding header allows, or None"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return None
+
+def source_hashes(template_dir, static_dir):
+    paths = [os.path.join(template_dir, page) for page in PAGES] + [os.path.join(static_dir, SHARED_STYLESHEET)]
+    hashes = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            hashes[os.path.relpath(path, os.path.dirname(template_dir))] = fingerprint(f.read())
+    return hashes
+
+def build(template_dir, static_dir, out_dir):
+    """Write hashed, minified, precompressed assets and rewritten templates; returns the manifest"""
+    assets_dir = os.path.join(out_dir, 'assets')
+    templates_out = os.path.join(out_dir, 'templates')
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(assets_dir)
+    os.makedirs(templates_out)
+    assets = {}
+
+    def emit(stem, extension, text):
+        data = text.encode('utf-8')
+        name = f"{stem}.{fingerprint(data)}{extension}"
+        with open(os.path.join(assets_dir, name), 'wb') as f:
+            f.write(data)
+        for encoding, compressed in compress(data).items():
+            with open(os.path.join(assets_dir, name + ENCODING_SUFFIXES[encoding]), 'wb') as f:
+                f.write(compressed)
+        assets[name] = len(data)
+        return f"/assets/{name}"
+
+    with open(os.path.join(static_dir, SHARED_STYLESHEET), encoding='utf-8') as f:
+        stylesheet_url = emit('style', '.css', minify_css(f.read()))
+
+    for page in PAGES:
+        with open(os.path.join(template_dir, page), encoding='utf-8') as f:
+            html = f.read()
+        stem = page.rsplit('.', 1)[0]
+        counter = iter(range(1, 100))
+
+        def extract(match):
+            kind, body = match.group(1), match.group(2)
+            if '{{' in body or '{%' in body:
+                return match.group(0)
+            if kind == 'style':
+                return f'<link rel="stylesheet" href="{emit(f"{stem}-{next(counter)}", ".css", minify_css(body))}">'
+            return f'<script src="{emit(f"{stem}-{next(counter)}", ".js", minify_js(body))}"></script>'
+
+        html = INLINE_BLOCK.sub(extract, html).replace(STYLESHEET_REF, stylesheet_url)
+        with open(os.path.join(templates_out, page), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    manifest = {'sources': source_hashes(template_dir, static_dir), 'assets': assets}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+class StaticAssets:
+    """Serves built assets from memory and caches each rendered page with its ETag.
+
+    Assets are loaded only when the build matches the current templates and
+    stylesheet (a stale build is ignored with a warning, so an edited
+    template is never hidden behind an old one). Pages are rendered once per
+    process, since they take no per-request context, and kept with their
+    gzip/brotli variants; requests carrying the ETag get 304.
+    """
+
+    def __init__(self, build_dir, template_dir, static_dir, use_build=True, cache_pages=True):
+        self.build_dir = build_dir
+        self.template_dir = template_dir
+        self.static_dir = static_dir
+        self.cache_pages = cache_pages
+        self._assets = {}  # name -> {encoding or None: bytes}
+        self._pages = {}  # template -> (etag, {encoding or None: bytes})
+        self._lock = threading.Lock()
+        self.asset_hits = self.page_renders = self.page_hits = self.not_modified = 0
+        self.built = use_build and self._load()
+
+    @classmethod
+    def from_env(cls, root):
+        return cls(
+            os.getenv('ASSETS_BUILD_DIR', os.path.join(root, 'build')),
+            os.path.join(root, 'templates'),
+            os.path.join(root, 'static'),
+            use_build=os.getenv('STATIC_ASSETS', 'on').lower() not in ('0', 'false', 'off'),
+            cache_pages=os.getenv('PAGE_CACHE', 'on').lower() not in ('0', 'false', 'off')
+        )
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.build_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return False
+        if manifest['sources'] != source_hashes(self.template_dir, self.static_dir):
+            print("Warning: asset build is older than the templates; serving unbuilt pages "
+                  "(run python static_assets.py)")
+            return False
+        assets_dir = os.path.join(self.build_dir, 'assets')
+        for name in manifest['assets']:
+            variants = {}
+            for encoding, suffix in [(None, '')] + list(ENCODING_SUFFIXES.items()):
+                path = os.path.join(assets_dir, name + suffix)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        variants[encoding] = f.read()
+            self._assets[name] = variants
+        return True
+
+    @property
+    def page_template_dir(self):
+        """Where pages are rendered from: the rewritten templates once built"""
+        return os.path.join(self.build_dir, 'templates') if self.built else self.template_dir
+
+    @staticmethod
+    def _variant(variants, accept_encoding):
+        encoding = choose_encoding(accept_encoding, variants)
+        headers = {'Vary': 'Accept-Encoding'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return variants[encoding], headers
+
+    def asset(self, name, accept_encoding, if_none_match=None):
+        """(status, headers, body) for /assets/<name>, or None if unknown"""
+        variants = self._assets.get(name)
+        if variants is None:
+            return None
+        etag = f'"{name.rsplit(".", 2)[-2]}"'
+        with self._lock:
+            self.asset_hits += 1
+        headers = {'Cache-Control': IMMUTABLE, 'ETag': etag, 'Vary': 'Accept-Encoding',
+                   'Content-Type': CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')}
+        if if_none_match and etag in if_none_match:
+            return 304, headers, b''
+        body, encoding_headers = self._variant(variants, accept_encoding)
+        headers.update(encoding_headers)
+        return 200, headers, body
+
+    def page(self, template, render, accept_encoding, if_none_match=None):
+        """(status, headers, body) for a page; render() produces its HTML on a cache miss"""
+        if not self.cache_pages:
+            with self._lock:
+                self.page_renders += 1
+            return 200, {'Content-Type': CONTENT_TYPES['.html']}, render().encode('utf-8')
+        with self._lock:
+            cached = self._pages.get(template)
+        if cached is None:
+            html = render().encode('utf-8')
+            cached = (f'W/"{fingerprint(html)}"', {None: html, **compress(html)})
+            with self._lock:
+                self.page_renders += 1
+                self._pages[template] = cached
+        else:
+            with self._lock:
+                self.page_hits += 1
+        etag, variants = cached
+        # Pages always revalidate, so a deploy's new asset names are picked up at once
+        headers = {'Cache-Control': 'no-cache', 'ETag': etag, 'Content-Type': CONTENT_TYPES['.html']}
+        if if_none_match and etag.removeprefix('W/') in if_none_match.replace('W/', ''):
+            with self._lock:
+                self.not_modified += 1
+            return 304, headers, b''
+        body, encoding_headers = self._variant(variants, accept_encoding)
+        headers.update(encoding_headers)
+        return 200, headers, body
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self.built,
+                'assets': len(self._assets),
+                'brotli': brotli is not None,
+                'cached_pages': len(self._pages),
+                'asset_hits': self.asset_hits,
+                'page_renders': self.page_renders,
+                'page_hits': self.page_hits,
+                'not_modified': self.not_modified
+            }
+
+if __name__ == '__main__':
+    root = os.path.dirname(os.path.abspath(__file__))
+    out_dir = os.getenv('ASSETS_BUILD_DIR', os.path.join(root, 'build'))
+    manifest = build(os.path.join(root, 'templates'), os.path.join(root, 'static'), out_dir)
+    for name, size in sorted(manifest['assets'].items()):
+        print(f"{name:<40} {size:>8} bytes")
+    print(f"✅ Built {len(manifest['assets'])} assets into {out_dir}"
+          + ('' if rjsmin and rcssmin else ' (install rjsmin/rcssmin for full minification)')
+          + ('' if brotli else ' (install brotli for .br variants)'))
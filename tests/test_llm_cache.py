@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm_cache import cache_key, normalize_message  # noqa: E402
+
+# Questions that differ only in a modal, question word or negation ask
+# different things, so they must never share a response cache entry
+DISTINCT_PAIRS = [
+    ('Should I feed my dog chocolate?', 'Can I feed my dog chocolate?'),
+    ('Should I feed my dog chocolate?', 'Should I not feed my dog chocolate?'),
+    ('Must my cat be vaccinated?', 'May my cat be vaccinated?'),
+    ("How should I brush my dog's teeth?", "Should I brush my dog's teeth?"),
+    ('What can my puppy eat?', 'How much can my puppy eat?'),
+    ('How often should I deworm my kitten?', 'Should I deworm my kitten often?'),
+    ('Who can groom my dog?', 'How can I groom my dog?'),
+    ('Will my dog need a cone after neutering?', "My dog won't need a cone after neutering?"),
+    ('Is it normal if my cat is eating grass?', 'Is it normal if my cat is not eating grass?'),
+]
+
+# Filler, case and punctuation alone never change the key
+SAME_PAIRS = [
+    ('How often should I feed my puppy?', 'how often should i feed my puppy'),
+    ('Hi! Can you tell me the price of a bath?', 'can the price of a bath please'),
+]
+
+
+class CacheKeyTest(unittest.TestCase):
+    def test_different_questions_get_different_keys(self):
+        for first, second in DISTINCT_PAIRS:
+            with self.subTest(first=first, second=second):
+                self.assertNotEqual(cache_key(first), cache_key(second))
+
+    def test_rephrasings_share_a_key(self):
+        for first, second in SAME_PAIRS:
+            with self.subTest(first=first, second=second):
+                self.assertEqual(cache_key(first), cache_key(second))
+
+    def test_stopword_only_message_keeps_its_words(self):
+        self.assertEqual(normalize_message('Hi there!'), 'hi there')
+
+
+if __name__ == '__main__':
+    unittest.main()
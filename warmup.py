@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+
+class Warmup:
+    """Startup work done in the background instead of at import time.
+
+    Steps run once, in registration order, on a daemon thread. A failing
+    required step (the database) is retried with exponential backoff, so a
+    paused database leaves the process alive but not ready instead of
+    crash-looping it; a failing optional step is logged and skipped. The
+    process is ready once every step has run and every required one succeeded.
+    """
+
+    def __init__(self, started_at, budget=10.0, retry_delay=1.0, max_retry_delay=30.0):
+        self.started_at = started_at  # time.perf_counter() when the app module began importing
+        self.budget = budget
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.import_seconds = None
+        self._steps = []  # (name, fn, required)
+        self._results = {}  # name -> {'status', 'attempts', 'seconds', 'error'}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._warmup_started = None
+        self.warmup_seconds = None
+
+    @classmethod
+    def from_env(cls, started_at):
+        return cls(
+            started_at,
+            budget=float(os.getenv('STARTUP_BUDGET_SECONDS', 10)),
+            retry_delay=float(os.getenv('STARTUP_RETRY_DELAY', 1)),
+            max_retry_delay=float(os.getenv('STARTUP_MAX_RETRY_DELAY', 30))
+        )
+
+    def step(self, name, required=False):
+        """Decorator registering a warm-up step"""
+        def register(fn):
+            self._steps.append((name, fn, required))
+            self._results[name] = {'status': 'pending', 'attempts': 0, 'seconds': None, 'error': None}
+            return fn
+        return register
+
+    def imported(self):
+        """Mark the end of the app module import"""
+        self.import_seconds = time.perf_counter() - self.started_at
+
+    def start(self):
+        """Run the steps in the background; once per process, as threads don't survive fork"""
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            # A forked child redoes the work: connections and clients belong to one process
+            self._ready.clear()
+            self.warmup_seconds = None
+            for name in self._results:
+                self._results[name] = {'status': 'pending', 'attempts': 0, 'seconds': None, 'error': None}
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def run(self):
+        self._warmup_started = time.perf_counter()
+        for name, fn, required in self._steps:
+            delay = self.retry_delay
+            while True:
+                self._update(name, status='running')
+                started = time.perf_counter()
+                try:
+                    fn()
+                except Exception as e:
+                    self._update(name, status='retrying' if required else 'failed',
+                                 seconds=round(time.perf_counter() - started, 3), error=str(e)[:200], attempt=True)
+                    if not required:
+                        print(f"Warm-up step '{name}' failed (skipped): {e}")
+                        break
+                    print(f"Warm-up step '{name}' failed, retrying in {delay:g}s: {e}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+                    continue
+                self._update(name, status='done', seconds=round(time.perf_counter() - started, 3), error=None, attempt=True)
+                break
+        self.warmup_seconds = time.perf_counter() - self._warmup_started
+        self._ready.set()
+        total = (self.import_seconds or 0) + self.warmup_seconds
+        print(f"✅ Ready in {total:.2f}s (import {self.import_seconds or 0:.2f}s, warm-up {self.warmup_seconds:.2f}s)")
+        if total > self.budget:
+            print(f"⚠️ Startup took {total:.2f}s, over the {self.budget:g}s budget; see /ready for per-step timings")
+
+    def _update(self, name, attempt=False, **fields):
+        with self._lock:
+            result = self._results[name]
+            result.update(fields)
+            if attempt:
+                result['attempts'] += 1
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            steps = {name: dict(result) for name, result in self._results.items()}
+        startup_seconds = None
+        if self.warmup_seconds is not None:
+            startup_seconds = round((self.import_seconds or 0) + self.warmup_seconds, 3)
+        return {
+            'ready': self.ready,
+            'import_seconds': round(self.import_seconds, 3) if self.import_seconds is not None else None,
+            'warmup_seconds': round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            'startup_seconds': startup_seconds,
+            'budget_seconds': self.budget,
+            'within_budget': startup_seconds <= self.budget if startup_seconds is not None else None,
+            'steps': steps
+        }